@@ -1,16 +1,12 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 from datetime import datetime, timedelta
 import pandas as pd
-import matplotlib.pyplot as plt
-import sqlite3  # ADD THIS IMPORT
-import os
 from database import *
-from pdf_generator import generate_pdf_report, generate_category_pdf_report
-import io
-
-# Ensure DB exists when app starts
-if not os.path.exists("expense_tracker.db"):
-    initialize_database()
+import reports
+from utils import calculate_vat
+import json
+import instrumentation
 
 # Initialize session state
 if 'vat_rate' not in st.session_state:
@@ -52,6 +48,8 @@ def record_expense_page(edit_mode=False):
             default_date = expense_date_val
             default_category = get_category_name(expense['category_id'])
             default_subcategory = get_category_name(expense['subcategory_id'])
+            default_subsubcategory = get_category_name(expense['subsubcategory_id'])
+            default_subsubsubcategory = get_category_name(expense['subsubsubcategory_id'])
             default_description = expense['description']
             default_amount = expense['amount_before_vat']
             default_entered_by = expense['entered_by']
@@ -63,6 +61,8 @@ def record_expense_page(edit_mode=False):
         default_date = datetime.today()
         default_category = None
         default_subcategory = None
+        default_subsubcategory = None
+        default_subsubsubcategory = None
         default_description = ""
         default_amount = 0.0
         default_entered_by = st.session_state.current_user if st.session_state.current_user else "Hassan Bhatti"
@@ -91,7 +91,7 @@ def record_expense_page(edit_mode=False):
         
         # Subcategory (only show if main category selected)
         if main_category:
-            main_cat_id = get_category_id(main_category)
+            main_cat_id = resolve_category_ids(main_category)[0]
             subcategories = get_categories(level=2, parent_id=main_cat_id)
             subcategory = st.selectbox(
                 "Subcategory",
@@ -107,6 +107,7 @@ def record_expense_page(edit_mode=False):
                     subsubcategory = st.selectbox(
                         "Sub-Subcategory",
                         [""] + subsubcategories,
+                        index=([""] + subsubcategories).index(default_subsubcategory) if default_subsubcategory in subsubcategories else 0,
                         key='subsubcategory_select'
                     )
                 else:
@@ -139,8 +140,7 @@ def record_expense_page(edit_mode=False):
             )
         
         # Calculate VAT
-        vat_amount = round(amount_before_vat * vat_rate, 4)
-        total_amount = round(amount_before_vat + vat_amount, 4)
+        vat_amount, total_amount = calculate_vat(amount_before_vat, vat_rate)
         
         # Display calculated amounts
         st.subheader("Calculated Amounts")
@@ -168,11 +168,15 @@ def record_expense_page(edit_mode=False):
                 st.error("Please fill all required fields (*)")
             else:
                 if edit_mode and st.session_state.get("edit_id"):
+                    # The form has no fourth level: keep the expense's own while
+                    # the three levels above it are unchanged, otherwise clear it
+                    category_path = (main_category, subcategory or None, subsubcategory or None)
+                    unchanged = category_path == (default_category, default_subcategory,
+                                                  default_subsubcategory)
                     updates = {
                         "date": expense_date.strftime("%Y-%m-%d"),
-                        "category_id": get_category_id(main_category),
-                        "subcategory_id": get_category_id(subcategory) if subcategory else None,
-                        "subsubcategory_id": get_category_id(subsubcategory) if subsubcategory else None,
+                        "category_path": category_path + (
+                            default_subsubsubcategory if unchanged else None,),
                         "description": description,
                         "amount_before_vat": amount_before_vat,
                         "vat_amount": vat_amount,
@@ -199,11 +203,200 @@ def record_expense_page(edit_mode=False):
                     st.success("✅ Expense recorded successfully!")
                     st.rerun()
 
+def rerun_section():
+    """Rerun just the enclosing fragment, or the whole app outside of one"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+@st.fragment
+def lazy_section(label, key, render, *args):
+    """Expander whose contents are only built while it is open.
+
+    It runs as a fragment, so opening it or using the widgets inside reruns
+    this section alone rather than the whole page.
+    """
+    with st.expander(label, key=key, on_change="rerun") as section:
+        if section.open:
+            render(*args)
+
 def load_expense_for_editing(expense_id):
     """Simply set the edit ID - the form will handle the rest"""
     st.session_state.edit_id = expense_id
     return True
 
+def expense_pager(key, start_date=None, end_date=None, entered_by=None):
+    """Show previous/next controls and return the current page of expenses.
+
+    The cursor lives in session state under key and resets when the filters change.
+    """
+    filters = (start_date, end_date, entered_by)
+    state = st.session_state.get(key)
+    if state is None or state["filters"] != filters:
+        state = {"filters": filters, "after": None, "before": None, "page_no": 1}
+        st.session_state[key] = state
+
+    page = get_expenses_page(start_date, end_date, entered_by,
+                             after=state["after"], before=state["before"])
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=page.prev_cursor is None):
+            state.update(after=None, before=page.prev_cursor, page_no=state["page_no"] - 1)
+            rerun_section()
+    with col2:
+        if st.button("Next ▶", key=f"{key}_next", disabled=page.next_cursor is None):
+            state.update(after=page.next_cursor, before=None, page_no=state["page_no"] + 1)
+            rerun_section()
+    col3.caption(f"Page {state['page_no']}")
+    return page.rows, state["page_no"]
+
+def search_pager(key, query, start_date=None, end_date=None, entered_by=None):
+    """Show ranked search results one page at a time with previous/next controls"""
+    filters = (query, start_date, end_date, entered_by)
+    state = st.session_state.get(key)
+    if state is None or state["filters"] != filters:
+        state = {"filters": filters, "offset": 0}
+        st.session_state[key] = state
+
+    result = search_expenses(query, start_date, end_date, entered_by, offset=state["offset"])
+    page_size = EXPENSE_PAGE_SIZE
+    has_next = state["offset"] + page_size < result.total
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=state["offset"] == 0):
+            state["offset"] = max(0, state["offset"] - page_size)
+            rerun_section()
+    with col2:
+        if st.button("Next ▶", key=f"{key}_next", disabled=not has_next):
+            state["offset"] += page_size
+            rerun_section()
+    col3.caption(f"{result.total} matches for \"{query}\"")
+    return result.rows.drop(columns="rank", errors="ignore"), f"search_{state['offset']}"
+
+def expense_rows(key, search, start_date=None, end_date=None, entered_by=None):
+    """Current page of rows: search results when there is a query, else the keyset pager"""
+    if search.strip():
+        return search_pager(f"{key}_search", search, start_date, end_date, entered_by)
+    return expense_pager(f"{key}_page", start_date, end_date, entered_by)
+
+def split_archived(rows):
+    """Split a page into live rows and archived rows, which are read-only"""
+    archived = rows["id"].isin(get_archived_expense_ids(rows["id"]))
+    return rows[~archived].reset_index(drop=True), rows[archived].reset_index(drop=True)
+
+def archived_rows_table(rows):
+    """Locked table of the archived rows on a page; they can't be selected or edited"""
+    if rows.empty:
+        return
+    st.caption(f"🔒 {len(rows)} archived expenses on this page are read-only")
+    st.dataframe(rows, hide_index=True, width="stretch")
+
+def changed_rows(original, edited, columns):
+    """id plus columns for the rows whose columns differ, NaN-aware and vectorized"""
+    before = original[columns].to_numpy()
+    after = edited[columns].to_numpy()
+    differs = (before != after) & ~(pd.isna(before) & pd.isna(after))
+    return edited.loc[differs.any(axis=1), ["id"] + columns]
+
+def category_path_picker(key):
+    """Cascading category selectboxes; returns the chosen names as a path tuple"""
+    category = st.selectbox("Category", get_categories(level=1), key=f"{key}_cat")
+    category_id = resolve_category_ids(category)[0]
+    subcategory = st.selectbox("Subcategory", [""] + get_categories(level=2, parent_id=category_id),
+                               key=f"{key}_sub")
+    subsubcategory = None
+    if subcategory:
+        subcategory_id = get_category_id(subcategory, parent_id=category_id)
+        subsubcategories = get_categories(level=3, parent_id=subcategory_id)
+        if subsubcategories:
+            subsubcategory = st.selectbox("Sub-Subcategory", [""] + subsubcategories,
+                                          key=f"{key}_subsub")
+    return (category, subcategory or None, subsubcategory or None)
+
+def expense_batch_actions(key, original, edited, editable=()):
+    """Save in-table edits and apply one action to every ticked row, each in one transaction"""
+    if edited.empty:
+        st.caption("No editable expenses on this page.")
+        return
+    if editable:
+        changes = changed_rows(original, edited, list(editable))
+        if not changes.empty and st.button(f"💾 Save {len(changes)} edited rows", key=f"{key}_save"):
+            update_expense_fields(changes)
+            st.success(f"Saved {len(changes)} expenses.")
+            st.rerun()
+
+    selected = edited.loc[edited["select"].fillna(False).astype(bool), "id"].astype(int).tolist()
+    if not selected:
+        st.caption("Tick rows to delete, edit or update several expenses at once.")
+        return
+
+    actions = ["Delete", "Change date", "Re-categorise", "Change VAT rate"]
+    if len(selected) == 1:
+        actions.insert(0, "Edit")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        action = st.selectbox(f"Action for {len(selected)} selected", actions, key=f"{key}_action")
+    with col2:
+        if action == "Change date":
+            new_date = st.date_input("New date", key=f"{key}_date")
+        elif action == "Re-categorise":
+            category_path = category_path_picker(f"{key}_category")
+        elif action == "Change VAT rate":
+            vat_rate = st.number_input("VAT rate", min_value=0.0, max_value=1.0, value=0.15,
+                                       step=0.01, format="%.2f", key=f"{key}_vat")
+
+    if action == "Edit":
+        if st.button(f"✏️ Edit Expense #{selected[0]}", key=f"{key}_edit"):
+            st.session_state.edit_id = selected[0]
+            st.session_state.current_page = "Record Expense"
+            st.rerun()
+    elif st.button(f"Apply to {len(selected)} expenses", key=f"{key}_apply"):
+        if action == "Delete":
+            count = delete_expenses(selected)
+        elif action == "Change date":
+            count = update_expenses(selected, date=new_date)
+        elif action == "Re-categorise":
+            count = update_expenses(selected, category_path=category_path)
+        else:
+            count = update_expenses(selected, vat_rate=vat_rate)
+        st.success(f"{action}: {count} expenses updated.")
+        st.rerun()
+
+def report_download(label, file_name, report_type, width="content",
+                    mime="application/pdf", **params):
+    """Download button for a report that is only rendered once the user asks for it.
+
+    Rendering happens in the background (see reports.py); finished reports are
+    cached for every session until the data changes.
+    """
+    key = reports.report_key(report_type, **params)
+    status = reports.report_status(key)
+    widget_key = f"report_{report_type}_{abs(hash(key))}"
+
+    if status == "ready":
+        st.download_button(
+            label,
+            data=reports.get_report(key),
+            file_name=file_name,
+            mime=mime,
+            width=width,
+            key=f"{widget_key}_download"
+        )
+    elif status == "running":
+        st.info("⏳ Preparing report...")
+        if st.button("🔄 Check again", key=f"{widget_key}_poll"):
+            rerun_section()
+    else:
+        if status == "failed":
+            st.error(f"Report failed: {reports.report_error(key)}")
+        if st.button(f"🛠️ Prepare: {label}", key=f"{widget_key}_prepare",
+                     width=width):
+            reports.request_report(report_type, **params)
+            rerun_section()
+
 def employee_view_page():
     st.header("👨‍💼 Employee Expense View")
 
@@ -213,25 +406,31 @@ def employee_view_page():
 
     st.subheader(f"Expenses entered by {st.session_state.current_user}")
 
-    # Get expenses for this employee from DB
-    expenses = get_expenses_by_user(st.session_state.current_user)
-    if expenses.empty:
+    # Totals come from an aggregate query; only one page of rows is loaded
+    totals = get_expense_totals(entered_by=st.session_state.current_user)
+    if totals["count"] == 0:
         st.info("No expenses recorded by you.")
         return
 
-    # Add action column
-    action_options = ["Select action", "Edit", "Delete"]
-    expenses['action'] = "Select action"
+    col1, col2 = st.columns(2)
+    col1.metric("Your Expenses", totals["count"])
+    col2.metric("Your Total", f"SAR {totals['total_amount']:,.4f}")
+
+    search = st.text_input("🔍 Search descriptions and categories", key="employee_search")
+    expenses, page_no = expense_rows("employee_expenses", search,
+                                     entered_by=st.session_state.current_user)
+    expenses, archived = split_archived(expenses)
+
+    # Selection column for batch actions
+    expenses.insert(0, "select", False)
 
     # Editable table
     edited_df = st.data_editor(
         expenses,
         column_config={
-            "action": st.column_config.SelectboxColumn(
-                "Action",
-                help="Choose what to do with this expense",
-                options=action_options,
-                required=True,
+            "select": st.column_config.CheckboxColumn(
+                "Select",
+                help="Tick expenses to act on them together",
                 width="small"
             )
         },
@@ -239,26 +438,12 @@ def employee_view_page():
                   "description", "amount_before_vat", "vat_amount", "total_amount", "entered_by"],
         hide_index=True,
         num_rows="fixed",
-        key="employee_expenses_editor"
+        key=f"employee_expenses_editor_{page_no}"
     )
+    archived_rows_table(archived)
 
     # Handle actions
-    for index, row in edited_df.iterrows():
-        if row['action'] == "Delete":
-            if st.button(f"🗑️ Confirm Delete #{row['id']}", key=f"confirm_delete_{index}"):
-                conn = get_connection()
-                c = conn.cursor()
-                c.execute("DELETE FROM expenses WHERE id=?", (row['id'],))
-                conn.commit()
-                conn.close()
-                st.success("Expense deleted successfully!")
-                st.rerun()
-
-        elif row['action'] == "Edit":
-            if st.button(f"✏️ Edit Expense #{row['id']}", key=f"edit_btn_{index}"):
-                st.session_state.edit_id = row['id']
-                st.session_state.current_page = "Record Expense"
-                st.rerun()
+    expense_batch_actions("employee_batch", expenses, edited_df)
 
     # Download buttons
     st.divider()
@@ -266,72 +451,303 @@ def employee_view_page():
 
     col1, col2 = st.columns(2)
     with col1:
-        # CSV Download
-        csv = expenses.to_csv(index=False).encode('utf-8')
-        st.download_button(
+        # CSV Download, built on request like the PDF
+        report_download(
             "📥 Download My Expenses (CSV)",
-            csv,
             f"expenses_{st.session_state.current_user}_{datetime.now().date()}.csv",
-            "text/csv",
-            use_container_width=True
+            "expenses_csv",
+            width="stretch",
+            mime="text/csv",
+            entered_by=st.session_state.current_user
         )
     with col2:
-        # PDF Download
-        pdf_bytes = generate_pdf_report(
-            expenses,
-            f"Expenses for {st.session_state.current_user}"
-        )
-        st.download_button(
+        # PDF Download, rendered on request
+        report_download(
             "📥 Download My Expenses (PDF)",
-            data=pdf_bytes,
-            file_name=f"expenses_{st.session_state.current_user}_{datetime.now().date()}.pdf",
-            mime="application/pdf",
-            use_container_width=True
+            f"expenses_{st.session_state.current_user}_{datetime.now().date()}.pdf",
+            "expenses",
+            width="stretch",
+            title=f"Expenses for {st.session_state.current_user}",
+            entered_by=st.session_state.current_user
+        )
+
+def import_expenses_page():
+    st.header("📤 Import Expenses")
+    st.write("Upload a CSV or Excel file with the columns: Date, Category, Subcategory, "
+             "Subsubcategory, Description, Amount Before VAT, and optionally VAT Rate, "
+             "VAT Amount and Entered By. Category names must match the category list. "
+             "Dates must be Excel date cells or written as YYYY-MM-DD.")
+
+    employee_names = ["Hassan Bhatti", "Accounts", "Ismail Asas"]
+    default_user = st.session_state.current_user
+    entered_by = st.selectbox(
+        "Entered By (used when a row has none)*",
+        employee_names,
+        index=employee_names.index(default_user) if default_user in employee_names else 0
+    )
+    uploaded = st.file_uploader("Expense file", type=["csv", "xlsx"])
+
+    if uploaded is not None and st.button("📥 Import"):
+        with st.spinner("Importing expenses..."):
+            result = import_expenses_file(uploaded, uploaded.name, entered_by=entered_by)
+        st.success(f"✅ Imported {result.inserted} expenses.")
+        if not result.rejected.empty:
+            st.warning(f"{len(result.rejected)} rows were rejected (row numbers refer to the file).")
+            st.dataframe(result.rejected, width="stretch")
+            st.download_button(
+                "📥 Download Rejected Rows (CSV)",
+                result.rejected.to_csv(index_label="row").encode('utf-8'),
+                f"rejected_{uploaded.name}.csv",
+                "text/csv"
+            )
+
+def category_drilldown(start_date, end_date):
+    """Expandable category tree with subtree totals at every level"""
+    path = st.session_state.setdefault("drill_path", [])
+    parent_id = path[-1] if path else None
+
+    crumbs = ["All categories"] + [get_category_name(cat_id) for cat_id in path]
+    st.caption(" › ".join(crumbs))
+
+    children = get_category_drilldown(parent_id, start_date, end_date)
+    if children.empty:
+        st.info("No expenses under this category for the selected date range.")
+    else:
+        st.dataframe(
+            children[["name", "expense_count", "total_amount"]],
+            hide_index=True,
+            width="stretch"
+        )
+
+    expandable = children[children["has_children"]]
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        choice = st.selectbox("Expand category", [""] + expandable["name"].tolist(),
+                              key=f"drill_choice_{parent_id}")
+    with col2:
+        if st.button("🔎 Expand", disabled=not choice):
+            path.append(int(expandable.loc[expandable["name"] == choice, "id"].iloc[0]))
+            rerun_section()
+    with col3:
+        if st.button("⬆️ Up", disabled=not path):
+            path.pop()
+            rerun_section()
+
+# Breakdown choices for the period analysis, as get_period_totals "by" tuples
+PERIOD_BREAKDOWNS = {
+    "Category": ("category",),
+    "Employee": ("entered_by",),
+    "Category and employee": ("category", "entered_by"),
+    "Total only": (),
+}
+
+def period_analysis(start_date, end_date):
+    """Totals per dekad, month or quarter with the change from the previous period"""
+    col1, col2 = st.columns(2)
+    with col1:
+        grain = st.selectbox("Period", ["dekad", "month", "quarter"], index=1,
+                             format_func=str.capitalize, key="period_grain")
+    with col2:
+        breakdown = st.selectbox("Compare by", list(PERIOD_BREAKDOWNS), key="period_breakdown")
+    by = PERIOD_BREAKDOWNS[breakdown]
+
+    periods = get_period_totals(grain, start_date, end_date, by)
+    if periods.empty:
+        st.info("No expenses found for the selected date range.")
+        return
+
+    series = periods.assign(series=periods[list(by)].astype(str).agg(" / ".join, axis=1)
+                            if by else "Total")
+    chart = series.pivot_table(index="period", columns="series", values="total_amount",
+                               aggfunc="sum", sort=False)
+    st.bar_chart(chart, width="stretch")
+
+    st.dataframe(
+        periods[["period"] + list(by) + ["expense_count", "total_amount",
+                                         "previous_total", "delta", "pct_change"]],
+        column_config={"pct_change": st.column_config.NumberColumn("change %", format="%.1f%%")},
+        hide_index=True,
+        width="stretch"
+    )
+
+# Pivot axes offered on the dashboard, as pivot_expenses dimension tuples
+PIVOT_ROWS = {
+    "Category": ("category",),
+    "Category and subcategory": ("category", "subcategory"),
+    "Employee": ("entered_by",),
+    "Employee and category": ("entered_by", "category"),
+}
+PIVOT_COLUMNS = {
+    "Employee": ("entered_by",),
+    "Category": ("category",),
+    "Dekad": ("dekad",),
+    "Month": ("month",),
+    "Quarter": ("quarter",),
+    "Total only": (),
+}
+
+def spending_pivot(start_date, end_date):
+    """Who spent what on which category, per period, with subtotals and grand totals"""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        rows_label = st.selectbox("Rows", list(PIVOT_ROWS), key="pivot_rows")
+    with col2:
+        columns_label = st.selectbox("Columns", list(PIVOT_COLUMNS), key="pivot_columns")
+    with col3:
+        values = st.selectbox("Values", ["total_amount", "expense_count"], key="pivot_values",
+                              format_func=lambda v: v.replace("_", " ").capitalize())
+    rows, columns = PIVOT_ROWS[rows_label], PIVOT_COLUMNS[columns_label]
+    if set(rows) & set(columns):
+        st.info("Pick different dimensions for rows and columns.")
+        return
+
+    pivot = pivot_expenses(rows, columns, values,
+                           {"start_date": start_date, "end_date": end_date})
+    st.dataframe(pivot, hide_index=True, width="stretch")
+
+    report_download(
+        "📊 Download Pivot (PDF)",
+        f"pivot_{start_date}_to_{end_date}.pdf",
+        "pivot",
+        title=f"{rows_label} by {columns_label} {start_date} to {end_date}",
+        rows=rows,
+        columns=columns,
+        values=values,
+        start_date=start_date,
+        end_date=end_date
+    )
+
+def manager_login():
+    """Password gate for manager pages; True once the manager has signed in"""
+    if st.session_state.get('manager_authenticated'):
+        return True
+    password = st.text_input("Enter manager password", type="password")
+    if password == "manager123":
+        st.session_state.manager_authenticated = True
+        st.rerun()
+    elif password:
+        st.error("Incorrect password")
+    return False
+
+def archive_months_panel():
+    """Archive closed months out of the live table; they stay in every report"""
+    st.write("Archiving moves a closed month's expenses into a read-only archive file. "
+             "Archived months still appear in reports and exports but no longer slow "
+             "down the live table.")
+    archivable = get_archivable_months()
+    if archivable.empty:
+        st.info("No closed months left to archive.")
+    else:
+        st.dataframe(archivable, hide_index=True, width="stretch")
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            month = st.selectbox("Month to archive", archivable["month"])
+        with col2:
+            if st.button("🗄️ Archive Month"):
+                with st.spinner(f"Archiving {month}..."):
+                    count = archive_month(month)
+                st.success(f"Archived {count} expenses for {month}.")
+                st.rerun()
+
+    archived = get_archived_months()
+    if not archived.empty:
+        st.caption("Archived months")
+        st.dataframe(archived, hide_index=True, width="stretch")
+
+@st.fragment
+def manager_expense_records(start_date, end_date):
+    """Searchable, paged expense table; paging and editing rerun only this fragment"""
+    st.subheader("All Expense Records")
+
+    search = st.text_input("🔍 Search descriptions and categories", key="manager_search")
+    display_df, page_no = expense_rows("manager_expenses", search, start_date, end_date)
+    display_df, archived = split_archived(display_df)
+    display_df.insert(0, "select", False)
+
+    edited_df = st.data_editor(
+        display_df,
+        column_config={
+            "select": st.column_config.CheckboxColumn(
+                "Select",
+                help="Tick expenses to act on them together",
+                width="small"
+            )
+        },
+        disabled=["id", "date", "category", "subcategory", "subsubcategory",
+                 "amount_before_vat", "vat_amount", "total_amount", "entered_by"],
+        hide_index=True,
+        width="stretch",
+        key=f"manager_expenses_editor_{page_no}"
+    )
+    archived_rows_table(archived)
+
+    # Saving or applying an action reruns the whole page, so the totals update too
+    expense_batch_actions("manager_batch", display_df, edited_df, editable=["description"])
+
+def category_analysis(start_date, end_date):
+    """Category totals chart and table; one pivot query gives both and the subtotals"""
+    filters = {"start_date": start_date, "end_date": end_date}
+    category_pivot = pivot_expenses(("category", "subcategory"), filters=filters)
+    if category_pivot.empty:
+        st.info("No expenses found for the selected date range.")
+        return
+
+    category_totals = category_pivot[(category_pivot["subcategory"] == PIVOT_TOTAL)
+                                     & (category_pivot["category"] != PIVOT_TOTAL)]
+    st.bar_chart(
+        category_totals.set_index('category')[PIVOT_TOTAL],
+        width="stretch"
+    )
+    st.dataframe(category_pivot, hide_index=True, width="stretch")
+
+def manager_downloads(start_date, end_date):
+    """PDF reports for the selected date range, rendered on request"""
+    col1, col2 = st.columns(2)
+    with col1:
+        report_download(
+            "📄 Download All Expenses (PDF)",
+            f"expenses_{start_date}_to_{end_date}.pdf",
+            "expenses",
+            width="stretch",
+            title=f"Expense Report {start_date} to {end_date}",
+            start_date=start_date,
+            end_date=end_date
         )
+    with col2:
+        report_download(
+            "📊 Download Category Summary (PDF)",
+            f"category_summary_{start_date}_to_{end_date}.pdf",
+            "category_summary",
+            width="stretch",
+            title=f"Category Summary {start_date} to {end_date}",
+            start_date=start_date,
+            end_date=end_date
+        )
+
+# Dashboard sections below the summary: (label, expander key, render function).
+# Each is a lazy_section, so nothing in it is queried until it is opened.
+MANAGER_SECTIONS = [
+    ("📊 Expense Analysis by Category", "manager_category_section", category_analysis),
+    ("🌳 Category Drill-down", "manager_drilldown_section", category_drilldown),
+    ("📅 Period Analysis", "manager_period_section", period_analysis),
+    ("🧮 Spending Pivot", "manager_pivot_section", spending_pivot),
+    ("📥 Downloads", "manager_downloads_section", manager_downloads),
+]
 
 def manager_view_page():
     st.header("👔 Manager Expense Dashboard")
 
     # Password protection
-    if 'manager_authenticated' not in st.session_state:
-        password = st.text_input("Enter manager password", type="password")
-        if password == "manager123":
-            st.session_state.manager_authenticated = True
-            st.rerun()
-        elif password:
-            st.error("Incorrect password")
+    if not manager_login():
         return
 
-    # Database maintenance section
-    with st.expander("⚠️ Database Maintenance", expanded=False):
-        st.warning("This will permanently delete ALL expenses from the database")
-        if st.button("🗑️ Clear All Expenses (Start New Month)"):
-            st.session_state.clear_confirmed = True
-            st.rerun()
-
-        if st.session_state.get('clear_confirmed'):
-            st.error("Are you sure you want to delete ALL expenses? This cannot be undone!")
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("✅ Yes, Clear Everything"):
-                    conn = get_connection()
-                    c = conn.cursor()
-                    c.execute("DELETE FROM expenses")
-                    conn.commit()
-                    conn.close()
-                    st.success("All expenses have been cleared. Database is now empty.")
-                    st.session_state.clear_confirmed = False
-                    st.rerun()
-            with col2:
-                if st.button("❌ No, Cancel"):
-                    st.session_state.clear_confirmed = False
-                    st.rerun()
+    lazy_section("🗄️ Archive Closed Months", "manager_archive_section", archive_months_panel)
 
     # Refresh button
     if st.button("🔄 Refresh Data"):
         st.rerun()
 
-    # Date range filter
+    # Date range filter; changing it reruns the page, and with it every open section
     st.subheader("Filters")
     col1, col2 = st.columns(2)
     with col1:
@@ -339,101 +755,100 @@ def manager_view_page():
     with col2:
         end_date = st.date_input("End Date", datetime.today())
 
-    # Get filtered expenses
-    filtered_expenses = get_expenses(custom_dates=(start_date, end_date))
-
-    if not filtered_expenses.empty:
-        # Summary statistics
-        st.subheader("Summary Statistics")
-        total_expenses = filtered_expenses['total_amount'].sum()
-        avg_expense = filtered_expenses['total_amount'].mean()
-        num_expenses = len(filtered_expenses)
-
-        col1, col2, col3 = st.columns(3)
-        col1.metric("Total Expenses", f"SAR {total_expenses:,.4f}")
-        col2.metric("Average Expense", f"SAR {avg_expense:,.4f}")
-        col3.metric("Number of Expenses", num_expenses)
-
-        # Display all expenses with edit functionality
-        st.subheader("All Expense Records")
-
-        display_df = filtered_expenses.copy()
-        action_options = ["Select action", "Edit", "Delete"]
-        display_df["action"] = "Select action"
-
-        edited_df = st.data_editor(
-            display_df,
-            column_config={
-                "action": st.column_config.SelectboxColumn(
-                    "Action",
-                    help="Choose to edit or delete",
-                    options=action_options,
-                    required=True,
-                    width="small"
-                )
-            },
-            disabled=["id", "date", "category", "subcategory", "subsubcategory",
-                     "amount_before_vat", "vat_amount", "total_amount", "entered_by"],
-            hide_index=True,
-            use_container_width=True
-        )
+    # Summary figures come from an aggregate query, not from the loaded rows
+    totals = get_expense_totals(start_date, end_date)
+    if totals["count"] == 0:
+        st.info("No expenses found for the selected date range.")
+        return
 
-        # Handle actions
-        for index, row in edited_df.iterrows():
-            if row["action"] == "Delete":
-                if st.button(f"🗑️ Confirm Delete #{row['id']}", key=f"delete_mgr_{index}"):
-                    conn = get_connection()
-                    c = conn.cursor()
-                    c.execute("DELETE FROM expenses WHERE id=?", (row["id"],))
-                    conn.commit()
-                    conn.close()
-                    st.success("Expense deleted successfully!")
-                    st.rerun()
+    # Summary statistics
+    st.subheader("Summary Statistics")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Expenses", f"SAR {totals['total_amount']:,.4f}")
+    col2.metric("Average Expense", f"SAR {totals['average_amount']:,.4f}")
+    col3.metric("Number of Expenses", totals["count"])
 
-            elif row["action"] == "Edit":
-                if st.button(f"✏️ Edit Expense #{row['id']}", key=f"edit_mgr_{index}"):
-                    st.session_state.edit_id = row["id"]
-                    st.session_state.current_page = "Record Expense"
-                    st.rerun()
+    manager_expense_records(start_date, end_date)
 
-        # PDF Download button for all expenses
-        pdf_bytes = generate_pdf_report(filtered_expenses, f"Expense Report {start_date} to {end_date}")
-        st.download_button(
-            "📄 Download All Expenses (PDF)",
-            data=pdf_bytes,
-            file_name=f"expenses_{start_date}_to_{end_date}.pdf",
-            mime="application/pdf"
-        )
+    for label, key, render in MANAGER_SECTIONS:
+        lazy_section(label, key, render, start_date, end_date)
 
-        # Category breakdown
-        st.subheader("Expense Analysis by Category")
-        category_summary = get_category_summary(start_date, end_date)
+def diagnostics_page():
+    st.header("🩺 Diagnostics")
+    if not manager_login():
+        return
 
-        if not category_summary.empty:
-            filtered_summary = category_summary[category_summary['category'] != 'TOTAL']
-            st.bar_chart(
-                filtered_summary.set_index('category')['total_amount'],
-                use_container_width=True
-            )
+    diagnostics = get_diagnostics()
+    diagnostics["reports"] = reports.get_report_stats()
+    metrics = diagnostics["metrics"]
 
-            st.dataframe(category_summary, use_container_width=True)
+    col1, col2, col3 = st.columns([2, 1, 1])
+    col1.caption(f"Metrics for this server process since {diagnostics['since']}")
+    with col2:
+        st.download_button(
+            "📥 Export Metrics (JSON)",
+            json.dumps(diagnostics, indent=2, default=str),
+            f"diagnostics_{datetime.now():%Y%m%d_%H%M%S}.json",
+            "application/json"
+        )
+    with col3:
+        if st.button("🔄 Reset Metrics"):
+            instrumentation.reset()
+            st.rerun()
 
-            pdf_bytes = generate_category_pdf_report(
-                category_summary,
-                f"Category Summary {start_date} to {end_date}"
-            )
-            st.download_button(
-                "📊 Download Category Summary (PDF)",
-                data=pdf_bytes,
-                file_name=f"category_summary_{start_date}_to_{end_date}.pdf",
-                mime="application/pdf"
-            )
+    threshold = st.number_input("Slow query threshold (ms)", min_value=1.0, step=50.0,
+                                value=float(diagnostics["slow_query_ms"]))
+    if threshold != diagnostics["slow_query_ms"]:
+        instrumentation.set_slow_query_threshold(threshold)
+
+    st.subheader("Database Calls")
+    if not metrics:
+        st.info("No calls recorded yet.")
     else:
-        st.info("No expenses found for the selected date range.")
+        table = (pd.DataFrame.from_dict(metrics, orient="index")
+                 .drop(columns="histogram")
+                 .sort_values("total_ms", ascending=False))
+        st.dataframe(table, width="stretch")
+
+        name = st.selectbox("Latency histogram", list(table.index))
+        st.bar_chart(pd.Series(metrics[name]["histogram"], name="calls"))
+
+    st.subheader("Connections, Writer and Caches")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.json(diagnostics["pool"])
+    col2.json(diagnostics["writer"])
+    col3.json(diagnostics["query_cache"])
+    col4.json(diagnostics["reports"])
+
+    st.subheader("Reporting Snapshot")
+    snapshot = diagnostics["snapshot"]
+    col1, col2 = st.columns([3, 1])
+    if snapshot["exists"]:
+        behind = "behind the live data" if snapshot["behind"] else "up to date"
+        col1.caption(f"Taken {snapshot['taken_at']} ({snapshot['age_seconds'] / 60:,.1f} "
+                     f"minutes ago), {behind}.")
+    else:
+        col1.caption("No snapshot yet; the first report download creates it.")
+    with col2:
+        if st.button("📸 Refresh Snapshot"):
+            with st.spinner("Copying the database..."):
+                refresh_snapshot()
+            st.rerun()
+    st.json(snapshot, expanded=False)
+
+    st.subheader("Slow Queries")
+    if not diagnostics["slow_queries"]:
+        st.info("No statements over the threshold.")
+    for entry in diagnostics["slow_queries"]:
+        with st.expander(f"{entry['ms']:,.1f} ms · {entry['rows']} rows · {entry['at']}"):
+            st.code(entry["sql"], language="sql")
+            st.caption(f"Parameters: {entry['params']}")
+            st.code(entry["plan"])
 
 def main():
-    # Initialize database
-    initialize_database()
+    # Create or migrate the database once per server process, not every rerun
+    ensure_database()
+    start_snapshot_schedule()
 
     # Page config
     st.set_page_config(page_title="Expense Tracker", layout="wide")
@@ -448,14 +863,20 @@ def main():
 
     # Employee login
     if st.sidebar.radio("Login As", ["Employee", "Manager"]) == "Employee":
-        page = st.sidebar.radio("Go to", ["Record Expense", "My Expenses"])
+        page = st.sidebar.radio("Go to", ["Record Expense", "My Expenses", "Import Expenses"])
         if page == "Record Expense":
             record_expense_page()
+        elif page == "Import Expenses":
+            import_expenses_page()
         else:
             employee_view_page()
     else:
-        # Manager dashboard
-        manager_view_page()
+        page = st.sidebar.radio("Go to", ["Dashboard", "Diagnostics"])
+        if page == "Diagnostics":
+            diagnostics_page()
+        else:
+            # Manager dashboard
+            manager_view_page()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,662 @@
+"""Synthetic data generator and benchmarks for database.py and pdf_generator.py.
+
+Usage:
+    python benchmark.py generate --rows 100000
+    python benchmark.py run --sizes 1000 100000 1000000 --output bench_results.json
+    python benchmark.py compare old_results.json new_results.json
+    python benchmark.py startup --output startup_results.json
+    python benchmark.py load --writers 20 --writes 50 --contend
+    python benchmark.py memory --rows 100000
+    python benchmark.py dashboard --rows 100000 --repeat 5
+
+Datasets are generated once per (rows, seed) into bench_data/ and copied to a
+scratch file for each run, so timings never touch expense_tracker.db.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import database
+from utils import MONEY_SCALE
+
+BENCH_DIR = Path(__file__).parent / "bench_data"
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+DEFAULT_SEED = 42
+DATASET_END = date(2025, 12, 31)
+DATASET_DAYS = 365
+INSERT_BATCH = 50_000
+BUSY_TIMEOUT_S = database.BUSY_TIMEOUT_MS / 1000
+
+EMPLOYEES = ["Hassan Bhatti", "Accounts", "Ismail Asas"]
+EMPLOYEE_WEIGHTS = [0.5, 0.35, 0.15]
+
+# Median amount before VAT (SAR) per main category; amounts are log-normal
+MEDIAN_AMOUNTS = {
+    "Food": 40, "Fuel": 150, "Lubricants": 200, "Utilities": 300,
+    "Spare Parts": 250, "Repair & Maintainance": 500, "General Purchases": 100,
+}
+
+DESCRIPTION_ITEMS = ["tyre", "filter", "battery", "diesel", "petrol", "oil change", "groceries",
+                     "water", "tea", "lunch", "bill", "bearing", "hose", "grease", "spare part"]
+DESCRIPTION_SUPPLIERS = ["Hyundai", "Al Jazira", "Petromin", "SASCO", "Aldrees", "Panda",
+                         "Toyota", "Bin Dawood", "STC", "Mobily", "Saudi Electricity"]
+
+# ---------------------------------------------------------------------------
+# Data generation
+# ---------------------------------------------------------------------------
+
+def _category_paths(index):
+    """Every root-to-leaf path of the category tree as a 4-tuple of IDs"""
+    paths = []
+
+    def walk(node, path):
+        path = path + [node]
+        children = index.children.get(node, [])
+        if not children:
+            paths.append(tuple(path + [None] * (4 - len(path))))
+        for child in children:
+            walk(child, path)
+
+    for root in index.children.get(None, []):
+        walk(root, [])
+    return paths
+
+def _date_weights(days):
+    """More expenses on working days and around month end (Friday is the weekend)"""
+    dates = [DATASET_END - timedelta(days=days - 1 - i) for i in range(days)]
+    weights = np.array([(0.3 if d.weekday() == 4 else 1.0) * (1.6 if d.day >= 25 else 1.0)
+                        for d in dates])
+    return [d.isoformat() for d in dates], weights / weights.sum()
+
+def generate_dataset(path, rows, seed=DEFAULT_SEED, days=DATASET_DAYS):
+    """Create a fresh database at path filled with rows synthetic expenses"""
+    path = Path(path)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+    database.use_database(path)
+    database.initialize_database()
+    index = database.get_category_index()
+    paths = _category_paths(index)
+    roots = [index.name_of(p[0]) for p in paths]
+    medians = np.array([MEDIAN_AMOUNTS.get(name, 100) for name in roots], dtype=np.float64)
+    dates, date_weights = _date_weights(days)
+    rng = np.random.default_rng(seed)
+
+    with database.get_connection() as conn:
+        for start in range(0, rows, INSERT_BATCH):
+            n = min(INSERT_BATCH, rows - start)
+            path_idx = rng.integers(0, len(paths), n)
+            day_idx = rng.choice(len(dates), n, p=date_weights)
+            user_idx = rng.choice(len(EMPLOYEES), n, p=EMPLOYEE_WEIGHTS)
+            before = np.round(rng.lognormal(np.log(medians[path_idx]), 0.8) * 100) / 100
+            before_units = np.rint(before * MONEY_SCALE).astype(np.int64)
+            vat_rate = np.where(rng.random(n) < 0.85, 0.15, 0.0)
+            vat_units = np.floor(before_units * vat_rate + 0.5).astype(np.int64)
+            items = rng.integers(0, len(DESCRIPTION_ITEMS), n)
+            suppliers = rng.integers(0, len(DESCRIPTION_SUPPLIERS), n)
+
+            records = [
+                (dates[day_idx[i]], *paths[path_idx[i]],
+                 f"{DESCRIPTION_SUPPLIERS[suppliers[i]]} {DESCRIPTION_ITEMS[items[i]]}",
+                 int(before_units[i]), int(vat_units[i]), int(before_units[i] + vat_units[i]),
+                 EMPLOYEES[user_idx[i]])
+                for i in range(n)
+            ]
+            conn.executemany('''INSERT INTO expenses
+                                (date, category_id, subcategory_id, subsubcategory_id,
+                                 subsubsubcategory_id, description, amount_before_vat,
+                                 vat_amount, total_amount, entered_by)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', records)
+            conn.commit()
+        conn.execute("ANALYZE")
+    database.get_pool().close_all()
+    return path
+
+def dataset_path(rows, seed=DEFAULT_SEED):
+    """Path of the cached dataset for (rows, seed), generating it if needed"""
+    BENCH_DIR.mkdir(exist_ok=True)
+    path = BENCH_DIR / f"expenses_{rows}_{seed}.db"
+    if not path.exists():
+        print(f"Generating {rows:,} expenses into {path} ...")
+        started = time.perf_counter()
+        generate_dataset(path, rows, seed)
+        print(f"  done in {time.perf_counter() - started:.1f}s")
+    return path
+
+@contextlib.contextmanager
+def scratch_copy(rows, seed=DEFAULT_SEED):
+    """Use a throwaway copy of the (rows, seed) dataset for the duration of the block"""
+    source = dataset_path(rows, seed)
+    target = BENCH_DIR / f"scratch_{rows}_{seed}_{os.getpid()}.db"
+    shutil.copyfile(source, target)
+    database.use_database(target)
+    try:
+        yield target
+    finally:
+        database.get_pool().close_all()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{target}{suffix}").unlink(missing_ok=True)
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+class BenchContext:
+    """Random but reproducible arguments for the benchmarked calls"""
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        with database.get_connection() as conn:
+            self.max_id = conn.execute("SELECT IFNULL(MAX(id), 1) FROM expenses").fetchone()[0]
+        self.first_day = DATASET_END - timedelta(days=DATASET_DAYS - 1)
+
+    def date_range(self, days=30):
+        offset = int(self.rng.integers(0, DATASET_DAYS - days))
+        start = self.first_day + timedelta(days=offset)
+        return start, start + timedelta(days=days - 1)
+
+    def user(self):
+        return EMPLOYEES[int(self.rng.integers(0, len(EMPLOYEES)))]
+
+    def expense_id(self):
+        return int(self.rng.integers(1, self.max_id + 1))
+
+def _bench_save_expense(ctx):
+    start, _ = ctx.date_range(1)
+    database.save_expense(start, "Fuel", "Diesel", "Pickup", "8889 - Pickup",
+                          "Benchmark diesel", 100.0, 15.0, 115.0, ctx.user())
+
+def _bench_get_expenses(ctx):
+    database.get_expenses(custom_dates=ctx.date_range())
+
+def _bench_get_expenses_by_user(ctx):
+    database.get_expenses_by_user(ctx.user(), *ctx.date_range())
+
+def _bench_get_category_summary(ctx):
+    database.get_category_summary(*ctx.date_range())
+
+def _bench_pivot_expenses(ctx):
+    start, end = ctx.date_range(90)
+    database.pivot_expenses(("entered_by", "category"), ("dekad",),
+                            filters={"start_date": start, "end_date": end})
+
+def _bench_get_expense_by_id(ctx):
+    database.get_expense_by_id(ctx.expense_id())
+
+def _bench_ensure_database(ctx):
+    # Every Streamlit rerun calls this; after the first call it must not hit SQLite
+    database.ensure_database()
+
+def _bench_generate_pdf_report(ctx):
+    from pdf_generator import generate_pdf_report
+    start, end = ctx.date_range(7)
+    generate_pdf_report(database.get_expenses(custom_dates=(start, end)), "Benchmark")
+
+def _bench_generate_category_pdf_report(ctx):
+    from pdf_generator import generate_category_pdf_report
+    generate_category_pdf_report(database.get_category_summary(*ctx.date_range()), "Benchmark")
+
+BENCHMARKS = {
+    "ensure_database": _bench_ensure_database,
+    "save_expense": _bench_save_expense,
+    "get_expenses": _bench_get_expenses,
+    "get_expenses_by_user": _bench_get_expenses_by_user,
+    "get_category_summary": _bench_get_category_summary,
+    "pivot_expenses": _bench_pivot_expenses,
+    "get_expense_by_id": _bench_get_expense_by_id,
+    "generate_pdf_report": _bench_generate_pdf_report,
+    "generate_category_pdf_report": _bench_generate_category_pdf_report,
+}
+
+def time_call(func, repeat, setup=None):
+    """Run func repeat times; return latencies in milliseconds and peak traced MB"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Peak memory from one extra, separately traced call so tracing cost
+    # does not distort the timings
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return timings, peak / 1e6
+
+def summarize(name, rows, timings, peak_mb, **extra):
+    values = np.array(timings)
+    return {
+        "benchmark": name,
+        "rows": rows,
+        "repeat": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "peak_mem_mb": round(peak_mb, 3),
+        **extra,
+    }
+
+def run_benchmarks(sizes, repeat, seed=DEFAULT_SEED, names=None, cached=False):
+    results = []
+    for rows in sizes:
+        with scratch_copy(rows, seed):
+            ctx = BenchContext(seed)
+            # Cold results by default: each call misses the query cache
+            setup = None if cached else database.clear_query_cache
+            for name, bench in BENCHMARKS.items():
+                if names and name not in names:
+                    continue
+                timings, peak = time_call(lambda: bench(ctx), repeat, setup)
+                results.append(summarize(name, rows, timings, peak, cached=cached))
+                print(_format_result(results[-1]), file=sys.stderr)
+    return results
+
+def _format_result(result):
+    return (f"{result['benchmark']:<32} {result['rows']:>10,} rows  "
+            f"p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+            f"peak {result['peak_mem_mb']:>8.2f} MB")
+
+def run_metadata():
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+def write_results(results, output):
+    payload = {"meta": run_metadata(), "results": results}
+    Path(output).write_text(json.dumps(payload, indent=2))
+    print(f"Wrote {len(results)} results to {output}")
+
+def compare_results(old_path, new_path):
+    """Print p50/p95 ratios (new / old) for benchmarks present in both runs"""
+    old = {(r["benchmark"], r["rows"]): r for r in json.loads(Path(old_path).read_text())["results"]}
+    new = json.loads(Path(new_path).read_text())["results"]
+    for result in new:
+        before = old.get((result["benchmark"], result["rows"]))
+        if not before or "p50_ms" not in before:
+            continue
+        p50 = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("nan")
+        p95 = result["p95_ms"] / before["p95_ms"] if before["p95_ms"] else float("nan")
+        print(f"{result['benchmark']:<32} {result['rows']:>10,} rows  "
+              f"p50 x{p50:6.2f}  p95 x{p95:6.2f}")
+
+# ---------------------------------------------------------------------------
+# Startup
+# ---------------------------------------------------------------------------
+
+STARTUP_MODULES = ["utils", "instrumentation", "database", "reports", "pdf_generator", "app"]
+# Modules that only some pages need; importing the app must not load them
+LAZY_MODULES = ["fpdf", "openpyxl"]
+
+def import_profile(module, db_path):
+    """Import module in a fresh interpreter with -X importtime.
+
+    Returns (cumulative import time in ms, names of every module loaded).
+    """
+    env = dict(os.environ, EXPENSE_TRACKER_DB=str(db_path))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=Path(__file__).parent, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    cumulative_us = None
+    loaded = set()
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        loaded.add(name.strip())
+        if name.strip() == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1000, loaded
+
+def _format_startup(result):
+    eager = f"  eager: {', '.join(result['eager_imports'])}" if result["eager_imports"] else ""
+    return (f"{result['benchmark']:<32} p50 {result['p50_ms']:>9.2f} ms  "
+            f"p95 {result['p95_ms']:>9.2f} ms{eager}")
+
+def run_startup(repeat, modules=STARTUP_MODULES):
+    """Time each module's cold import and check that importing is side-effect free"""
+    results = []
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "startup.db"
+        for module in modules:
+            timings = []
+            for _ in range(repeat):
+                ms, loaded = import_profile(module, db_path)
+                timings.append(ms)
+            eager = sorted(name for name in LAZY_MODULES if name in loaded)
+            results.append(summarize(f"import {module}", 0, timings, 0.0, eager_imports=eager))
+            print(_format_startup(results[-1]), file=sys.stderr)
+            if module == "app" and eager:
+                problems.append(f"importing app loads {', '.join(eager)}")
+        if db_path.exists():
+            problems.append("importing the modules created the database file")
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    return results, problems
+
+# ---------------------------------------------------------------------------
+# Frame memory
+# ---------------------------------------------------------------------------
+
+def _untyped_frame(start_date=None, end_date=None, entered_by=None):
+    """The same rows built the way the read API used to: inferred, object-typed columns"""
+    with database.get_connection() as conn:
+        rows = list(database._iter_expense_rows(conn, start_date, end_date, entered_by))
+    df = pd.DataFrame.from_records(rows, columns=database._EXPENSE_COLUMN_NAMES)
+    return database._amounts_to_sar(df)
+
+def _traced(func):
+    """Call func; return its result, the seconds it took and its peak traced MB"""
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+def run_memory(rows, seed=DEFAULT_SEED):
+    """Per-session memory of the frames returned by the read API, typed vs untyped.
+
+    Each session holds its own copy of what it reads, so the deep size of
+    one frame is the per-session cost of that read.
+    """
+    results = []
+    with scratch_copy(rows, seed):
+        ctx = BenchContext(seed)
+        start, end = ctx.date_range(90)
+        user = EMPLOYEES[0]
+        reads = {
+            "get_all_expenses": (database.get_all_expenses, {}),
+            "get_expenses (90 days)": (lambda: database.get_expenses(custom_dates=(start, end)),
+                                       {"start_date": start, "end_date": end}),
+            "get_expenses_by_user": (lambda: database.get_expenses_by_user(user),
+                                     {"entered_by": user}),
+        }
+        for name, (read, params) in reads.items():
+            database.clear_query_cache()
+            typed, seconds, peak = _traced(read)
+            untyped, untyped_seconds, untyped_peak = _traced(lambda: _untyped_frame(**params))
+            if "entered_by" in params:
+                untyped = untyped.drop(columns="entered_by")
+            frame_mb = typed.memory_usage(deep=True).sum() / 1e6
+            untyped_mb = untyped.memory_usage(deep=True).sum() / 1e6
+            results.append(summarize(
+                f"memory {name}", rows, [seconds * 1000], peak,
+                frame_rows=len(typed), frame_mb=round(frame_mb, 3),
+                untyped_frame_mb=round(untyped_mb, 3),
+                untyped_peak_mem_mb=round(untyped_peak, 3),
+                untyped_ms=round(untyped_seconds * 1000, 3)))
+            print(_format_memory(results[-1]), file=sys.stderr)
+    return results
+
+def _format_memory(result):
+    return (f"{result['benchmark']:<32} {result['frame_rows']:>10,} rows  "
+            f"frame {result['untyped_frame_mb']:>8.2f} -> {result['frame_mb']:>7.2f} MB  "
+            f"peak {result['untyped_peak_mem_mb']:>8.2f} -> {result['peak_mem_mb']:>7.2f} MB  "
+            f"time {result['untyped_ms']:>8.1f} -> {result['p50_ms']:>7.1f} ms")
+
+# ---------------------------------------------------------------------------
+# Dashboard reruns
+# ---------------------------------------------------------------------------
+
+APP_SCRIPT = Path(__file__).parent / "app.py"
+# Expander keys of the manager dashboard's lazy sections (see app.MANAGER_SECTIONS)
+DASHBOARD_SECTIONS = ["manager_archive_section", "manager_category_section",
+                      "manager_drilldown_section", "manager_period_section",
+                      "manager_pivot_section", "manager_downloads_section"]
+
+def _timed_run(at):
+    """Run the app script once; return the milliseconds it took"""
+    started = time.perf_counter()
+    at.run()
+    elapsed = (time.perf_counter() - started) * 1000
+    if at.exception:
+        raise RuntimeError(f"app.py raised: {at.exception[0].value}")
+    return elapsed
+
+def _set_dates(at, start, end):
+    at.date_input[0].set_value(start)
+    at.date_input[1].set_value(end)
+
+def run_dashboard(rows, repeat, seed=DEFAULT_SEED):
+    """Time the manager dashboard's script runs with Streamlit's AppTest.
+
+    first paint is the first run with a date range that has data, on a cold
+    query cache; the other scenarios rerun that session. AppTest always runs
+    the whole script, so interactions inside a fragment (paging) are timed
+    as full reruns; in a browser they rerun only their fragment.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    scenarios = {name: [] for name in ("first paint", "date change", "next page",
+                                       "all sections open")}
+    with scratch_copy(rows, seed):
+        ctx = BenchContext(seed)
+        for _ in range(repeat):
+            at = AppTest.from_file(str(APP_SCRIPT), default_timeout=600)
+            at.session_state["manager_authenticated"] = True
+            at.run()
+            at.sidebar.radio[0].set_value("Manager").run()
+
+            _set_dates(at, *ctx.date_range())
+            database.clear_query_cache()
+            scenarios["first paint"].append(_timed_run(at))
+
+            _set_dates(at, *ctx.date_range())
+            database.clear_query_cache()
+            scenarios["date change"].append(_timed_run(at))
+
+            at.button(key="manager_expenses_page_next").click()
+            scenarios["next page"].append(_timed_run(at))
+
+            for key in DASHBOARD_SECTIONS:
+                at.session_state[key] = True
+            database.clear_query_cache()
+            scenarios["all sections open"].append(_timed_run(at))
+
+    results = []
+    for name, timings in scenarios.items():
+        results.append(summarize(f"dashboard {name}", rows, timings, 0.0))
+        print(_format_dashboard(results[-1]), file=sys.stderr)
+    return results
+
+def _format_dashboard(result):
+    return (f"{result['benchmark']:<32} {result['rows']:>10,} rows  "
+            f"p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms")
+
+# ---------------------------------------------------------------------------
+# Concurrent writers
+# ---------------------------------------------------------------------------
+
+LOAD_DESCRIPTION = "Load test"
+
+def _hold_write_lock(path, stop, hold=0.02, pause=0.05):
+    """Take the write lock now and then from a separate connection, like another process"""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+    try:
+        while not stop.is_set():
+            conn.execute("BEGIN IMMEDIATE")
+            time.sleep(hold)
+            conn.execute("COMMIT")
+            time.sleep(pause)
+    finally:
+        conn.close()
+
+def run_load_test(writers, writes, rows=1_000, seed=DEFAULT_SEED, contend=False):
+    """Save expenses from many threads at once and check that none are lost.
+
+    Each writer thread plays a clerk calling save_expense in a loop. With
+    contend, another connection keeps grabbing the write lock as a second
+    process would. Returns a result dict with latencies, throughput, the
+    writer queue counters and any lost or failed writes.
+    """
+    latencies = []
+    ids = []
+    errors = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(writers + 1)
+
+    def clerk(number):
+        start_line.wait()
+        for i in range(writes):
+            started = time.perf_counter()
+            try:
+                expense_id = database.save_expense(
+                    DATASET_END, "Fuel", "Diesel", "Pickup", "8889 - Pickup",
+                    f"{LOAD_DESCRIPTION} {number}-{i}", 100.0, 15.0, 115.0, f"Clerk {number}")
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                ids.append(expense_id)
+
+    with scratch_copy(rows, seed) as path:
+        database.ensure_database()
+        stop = threading.Event()
+        threads = [threading.Thread(target=clerk, args=(n,)) for n in range(writers)]
+        if contend:
+            threads.append(threading.Thread(target=_hold_write_lock, args=(path, stop)))
+        for thread in threads:
+            thread.start()
+        start_line.wait()
+        started = time.perf_counter()
+        for thread in threads[:writers]:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in threads[writers:]:
+            thread.join()
+
+        writer_stats = database.get_writer_stats()
+        with database.get_connection() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM expenses WHERE description LIKE ?",
+                                  (f"{LOAD_DESCRIPTION} %",)).fetchone()[0]
+
+    expected = writers * writes
+    result = summarize("load save_expense", rows, latencies or [0.0], 0.0,
+                       writers=writers, writes=expected, contend=contend,
+                       seconds=round(elapsed, 3),
+                       writes_per_s=round(len(ids) / elapsed, 1) if elapsed else 0.0,
+                       distinct_ids=len(set(ids)), stored=stored,
+                       lost=expected - stored, errors=errors[:20], writer=writer_stats)
+    print(_format_load(result), file=sys.stderr)
+    return result
+
+def _format_load(result):
+    writer = result["writer"]
+    return (f"{result['writers']} writers x {result['writes'] // result['writers']} writes: "
+            f"{result['writes_per_s']:,.0f} writes/s  p50 {result['p50_ms']:.2f} ms  "
+            f"p95 {result['p95_ms']:.2f} ms  batches {writer['batches']} "
+            f"(mean {writer['mean_batch']:.1f}, max {writer['max_batch']})  "
+            f"retries {writer['retries']}  lost {result['lost']}  errors {len(result['errors'])}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Generate a synthetic dataset")
+    generate.add_argument("--rows", type=int, required=True)
+    generate.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    generate.add_argument("--path", help="Output file (default: bench_data/expenses_<rows>_<seed>.db)")
+
+    run = commands.add_parser("run", help="Time the database and PDF functions")
+    run.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    run.add_argument("--repeat", type=int, default=20)
+    run.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    run.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run a subset")
+    run.add_argument("--cached", action="store_true", help="Let calls hit the query cache")
+    run.add_argument("--output", default="bench_results.json")
+
+    startup = commands.add_parser("startup", help="Time cold imports of each module")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--output", default="startup_results.json")
+
+    load = commands.add_parser("load", help="Concurrent save_expense load test")
+    load.add_argument("--writers", type=int, default=20)
+    load.add_argument("--writes", type=int, default=50, help="Writes per writer")
+    load.add_argument("--rows", type=int, default=1_000, help="Dataset size to write into")
+    load.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    load.add_argument("--contend", action="store_true",
+                      help="Also hold the write lock from a second connection")
+    load.add_argument("--output", default="load_results.json")
+
+    memory = commands.add_parser("memory", help="Per-session memory of the read API's frames")
+    memory.add_argument("--rows", type=int, default=100_000)
+    memory.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    memory.add_argument("--output", default="memory_results.json")
+
+    dashboard = commands.add_parser("dashboard", help="Time manager dashboard script runs")
+    dashboard.add_argument("--rows", type=int, default=100_000)
+    dashboard.add_argument("--repeat", type=int, default=5)
+    dashboard.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    dashboard.add_argument("--output", default="dashboard_results.json")
+
+    compare = commands.add_parser("compare", help="Compare two result files")
+    compare.add_argument("old")
+    compare.add_argument("new")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        if args.path:
+            generate_dataset(args.path, args.rows, args.seed)
+        else:
+            dataset_path(args.rows, args.seed)
+    elif args.command == "run":
+        results = run_benchmarks(args.sizes, args.repeat, args.seed, args.only, args.cached)
+        write_results(results, args.output)
+    elif args.command == "startup":
+        results, problems = run_startup(args.repeat)
+        write_results(results, args.output)
+        return 1 if problems else 0
+    elif args.command == "load":
+        result = run_load_test(args.writers, args.writes, args.rows, args.seed, args.contend)
+        write_results([result], args.output)
+        failed = result["lost"] or result["errors"] or result["distinct_ids"] != result["writes"]
+        return 1 if failed else 0
+    elif args.command == "memory":
+        write_results(run_memory(args.rows, args.seed), args.output)
+    elif args.command == "dashboard":
+        write_results(run_dashboard(args.rows, args.repeat, args.seed), args.output)
+    elif args.command == "compare":
+        compare_results(args.old, args.new)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,578 @@
 import sqlite3
+import io
+import json
+import logging
 import os
+import re
+import sys
+import queue
+import random
+import threading
+import time
+import functools
+import heapq
+import inspect
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import closing, contextmanager
+from itertools import islice
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import numpy as np
 import pandas as pd
-import streamlit as st
+import instrumentation
+from utils import (MONEY_COLUMNS, MONEY_SCALE, PERIOD_GRAINS, to_minor_units,
+                   from_minor_units, to_minor_units_array, get_period_dates, period_label,
+                   period_starts)
+
+logger = logging.getLogger(__name__)
 
 # Database configuration
-DB_PATH = Path(__file__).parent / "expense_tracker.db"
+DB_PATH = Path(os.environ.get("EXPENSE_TRACKER_DB", Path(__file__).parent / "expense_tracker.db"))
+
+# Connection tuning, applied once when a pooled connection is opened
+POOL_SIZE = 8
+POOL_WAIT_TIMEOUT = 30.0        # seconds to wait for a free connection
+BUSY_TIMEOUT_MS = 5000          # how long a writer waits on a locked database
+MMAP_SIZE = 64 * 1024 * 1024    # bytes of the file to memory-map
+CACHE_SIZE_KB = 16 * 1024       # page cache per connection
+
+# Read results cached across all sessions, bounded by their size in memory
+QUERY_CACHE_BYTES = 64 * 1024 * 1024
+QUERY_CACHE_MAX_RESULT_BYTES = 8 * 1024 * 1024   # larger results are not cached
+
+# Writer queue: every expense write goes through one thread and one connection
+WRITE_BATCH_SIZE = 256          # most writes applied in one group commit
+WRITE_RETRIES = 5               # attempts after the first when the file is locked
+WRITE_RETRY_DELAY = 0.05        # seconds before the first retry; doubles each time
+
+# Reporting snapshot: a read-only copy of the live file for long report reads
+SNAPSHOT_STEP_PAGES = 1024      # pages copied per online backup step
+SNAPSHOT_STEP_SLEEP = 0.005     # seconds between steps, letting writers in
+SNAPSHOT_INTERVAL = 15 * 60     # seconds between scheduled refreshes
+
+CATEGORY_CHECK_INTERVAL = 5.0   # seconds between checks for category changes elsewhere
+
+EXPENSE_PAGE_SIZE = 50
+IMPORT_CHUNKSIZE = 1000
+READ_CHUNKSIZE = 10000          # rows converted at a time when building frames
+DEFAULT_VAT_RATE = 0.15
+
+def _open_connection(path, readonly=False):
+    """Open a connection to path with the WAL and cache tuning every connection uses"""
+    started = time.perf_counter()
+    # uri=True lets archives be attached read-only with file:...?mode=ro
+    target = f"{Path(path).resolve().as_uri()}?mode=ro" if readonly else path
+    conn = sqlite3.connect(target, timeout=BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False, uri=True,
+                           factory=instrumentation.InstrumentedConnection)
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+    else:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    instrumentation.record("connection.open", time.perf_counter() - started)
+    return conn
+
+class ConnectionPool:
+    """Small bounded pool of tuned SQLite connections.
+
+    Connections are opened lazily up to max_size and handed back out
+    most-recently-used first. When all are busy, callers wait for one to be
+    released rather than opening more.
+    """
+
+    def __init__(self, path, max_size=POOL_SIZE, wait_timeout=POOL_WAIT_TIMEOUT, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._opened = 0
+        self._stats = {"opened": 0, "reused": 0, "waited": 0, "wait_seconds": 0.0}
+
+    def _open(self):
+        return _open_connection(self.path, self.readonly)
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats["reused"] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.max_size
+            if can_open:
+                self._opened += 1
+                self._stats["opened"] += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.wait_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"Timed out waiting for a database connection ({self.max_size} in use)")
+        with self._lock:
+            self._stats["waited"] += 1
+            self._stats["wait_seconds"] += time.perf_counter() - started
+        return conn
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def current(self):
+        """The connection this thread has borrowed in an open with-block, if any"""
+        return getattr(self._local, "conn", None)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block.
+
+        Commits when the block succeeds and rolls back when it raises. Nested
+        blocks on the same thread share the outer connection, so helpers can
+        be composed into a single transaction.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        started = time.perf_counter()
+        conn = self.acquire()
+        acquired = time.perf_counter()
+        instrumentation.record("connection.acquire", acquired - started)
+        self._local.conn = conn
+        error = False
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            error = True
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self.release(conn)
+            instrumentation.record("connection.held", time.perf_counter() - acquired, error=error)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = self._opened
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["open"] - stats["idle"]
+        stats["max_size"] = self.max_size
+        return stats
+
+    def close_all(self):
+        """Close idle connections; connections currently borrowed are unaffected"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+def use_database(path):
+    """Point the module at another database file (benchmarks, scratch copies).
+
+    Stops the writer, closes idle pooled connections and drops every
+    in-process cache tied to the previous file.
+    """
+    global DB_PATH, _pool, _writer, _snapshot_pool
+    with _pool_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = None
+        for pool in (_pool, _snapshot_pool):
+            if pool is not None:
+                pool.close_all()
+        _pool = _snapshot_pool = None
+        DB_PATH = Path(path)
+    clear_query_cache()
+    invalidate_category_index()
+
+# Per-thread override of the pool reads come from (see use_snapshot)
+_reader = threading.local()
+
+def get_connection():
+    """Get a pooled database connection as a context manager.
+
+    Use as ``with get_connection() as conn:``; the transaction is committed
+    on exit and rolled back if the block raises. Inside use_snapshot() the
+    connection reads the reporting snapshot instead of the live file.
+    """
+    return (getattr(_reader, "pool", None) or get_pool()).connection()
+
+def get_pool_stats():
+    """Connection pool counters: opened, reused, waited and current usage"""
+    return get_pool().stats()
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+class WriteQueue:
+    """One writer thread that applies queued writes in group commits.
+
+    Callers submit a function taking a connection; it runs inside the
+    writer's transaction and its return value is handed back once that
+    transaction has committed. Writes that queue up while a commit is in
+    progress are applied together in the next transaction, so concurrent
+    sessions share commits instead of fighting over the write lock. When
+    another process holds the lock the whole batch is retried with
+    exponential backoff; a write that raises rolls back only itself.
+    """
+
+    def __init__(self, path, batch_size=WRITE_BATCH_SIZE, retries=WRITE_RETRIES,
+                 retry_delay=WRITE_RETRY_DELAY):
+        self.path = path
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {"writes": 0, "batches": 0, "max_batch": 0, "retries": 0, "failed": 0}
+
+    def submit(self, op):
+        """Queue op(conn) and wait for its result, available once it has committed"""
+        future = Future()
+        # Queue under the lock so a writer that is dying can't miss the write:
+        # it fails everything queued while holding the same lock
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="expense-writer",
+                                                daemon=True)
+                self._thread.start()
+            self._queue.put((op, future))
+        return future.result()
+
+    def close(self):
+        """Finish queued writes, then stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None and thread.is_alive():
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        batch = []
+        try:
+            conn = _open_connection(self.path)
+        except BaseException as e:
+            self._abandon(e, batch)
+            return
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit(conn, batch)
+        except BaseException as e:
+            self._abandon(e, batch)
+        finally:
+            conn.close()
+
+    def _abandon(self, error, batch):
+        """Fail the current batch and every queued write once the writer can't go on.
+
+        The next submit() starts a fresh writer thread.
+        """
+        logger.error("Writer thread stopped: %s", error)
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+            pending = list(batch)
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    pending.append(item)
+            pending = [future for _, future in pending if not future.done()]
+            self._stats["failed"] += len(pending)
+        for future in pending:
+            future.set_exception(error)
+
+    def _commit(self, conn, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                results = self._apply(conn, batch)
+            except BaseException as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if isinstance(e, sqlite3.OperationalError) and _is_lock_error(e) \
+                        and attempt < self.retries:
+                    delay = self.retry_delay * 2 ** attempt * (1 + random.random())
+                    logger.warning("Database locked, retrying %d writes in %.2fs",
+                                   len(batch), delay)
+                    with self._lock:
+                        self._stats["retries"] += 1
+                    time.sleep(delay)
+                    continue
+                logger.error("Failed to commit %d writes: %s", len(batch), e)
+                with self._lock:
+                    self._stats["failed"] += len(batch)
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+            with self._lock:
+                self._stats["writes"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            for (_, future), (error, value) in zip(batch, results):
+                if error is None:
+                    future.set_result(value)
+                else:
+                    future.set_exception(error)
+            return
+
+    def _apply(self, conn, batch):
+        """Run every write of batch in one transaction; returns (error, value) pairs"""
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        results = []
+        for op, _ in batch:
+            conn.execute("SAVEPOINT write")
+            try:
+                value = op(conn)
+            except Exception as e:
+                if isinstance(e, sqlite3.OperationalError) and _is_lock_error(e):
+                    raise
+                conn.execute("ROLLBACK TO write")
+                conn.execute("RELEASE write")
+                results.append((e, None))
+                continue
+            conn.execute("RELEASE write")
+            results.append((None, value))
+        conn.commit()
+        instrumentation.record("writer.batch", time.perf_counter() - started, len(batch))
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["mean_batch"] = stats["writes"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+_writer = None
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = WriteQueue(DB_PATH)
+    return _writer
+
+def get_writer_stats():
+    """Writer queue counters: writes, group commits, batch sizes, retries and failures"""
+    return get_writer().stats()
+
+def _run_write(op):
+    """Apply op(conn) through the writer queue and return its result once committed.
+
+    Inside a caller's own with get_connection() block, op joins that
+    transaction instead, so the caller still commits or rolls back as one.
+    """
+    conn = get_pool().current()
+    if conn is not None:
+        return op(conn)
+    return get_writer().submit(op)
+
+def _data_generation(conn):
+    row = conn.execute("SELECT value FROM db_meta WHERE key = 'data_generation'").fetchone()
+    return row[0] if row else 0
+
+def get_data_version():
+    """Write generation of the database, bumped by triggers on every change"""
+    with get_connection() as conn:
+        return _data_generation(conn)
+
+class QueryCache:
+    """Process-wide LRU cache of read results, shared by all sessions.
+
+    Entries are keyed by function, arguments and the database write
+    generation, so any committed change makes older entries unreachable;
+    they then age out through LRU eviction. The cache is bounded by the
+    memory its results hold, and results over max_result_bytes (whole-table
+    frames on a large database) are not kept at all.
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_BYTES, max_result_bytes=QUERY_CACHE_MAX_RESULT_BYTES):
+        self.max_bytes = max_bytes
+        self.max_result_bytes = max_result_bytes
+        self._entries = OrderedDict()   # key -> (value, size in bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "too_large": 0}
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self._stats["misses"] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key, value):
+        size = _result_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            if size > self.max_result_bytes:
+                self._stats["too_large"] += 1
+                return
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._size,
+                         max_bytes=self.max_bytes)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+def _result_bytes(value):
+    """Approximate memory held by a cached read result"""
+    if isinstance(value, (ExpensePage, SearchResult)):
+        value = value.rows
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+_MISSING = object()
+_query_cache = QueryCache()
+
+# Under copy-on-write (always on from pandas 3) a shallow copy is enough to
+# protect a cached frame: a caller's edits copy the columns they touch
+_COPY_ON_WRITE = (int(pd.__version__.split(".")[0]) >= 3
+                  or pd.get_option("mode.copy_on_write") is True)
+
+def _copy_frame(df):
+    return df.copy(deep=not _COPY_ON_WRITE)
+
+def _copy_result(value):
+    # Callers add columns to returned frames, so never hand out the cached object
+    if isinstance(value, pd.DataFrame):
+        return _copy_frame(value)
+    if isinstance(value, (ExpensePage, SearchResult)):
+        return value._replace(rows=_copy_frame(value.rows))
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+def cached_query(func):
+    """Cache a read function's results by arguments and data version"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())), get_data_version())
+        try:
+            hash(key)
+        except TypeError:
+            return func(*args, **kwargs)
+        value = _query_cache.get(key)
+        if value is _MISSING:
+            value = func(*args, **kwargs)
+            _query_cache.put(key, value)
+        return _copy_result(value)
+    wrapper.uncached = func
+    return wrapper
+
+def get_cache_stats():
+    """Query cache counters: hits, misses, evictions and current size"""
+    return _query_cache.stats()
+
+def clear_query_cache():
+    _query_cache.clear()
 
 def initialize_database():
     """Initialize database with tables and default categories if missing"""
-    conn = sqlite3.connect(DB_PATH)
+    with get_connection() as conn:
+        _create_schema(conn)
+        conn.commit()
+        migrate(conn)
+    invalidate_category_index()
+
+_ensured_paths = set()
+_ensure_lock = threading.Lock()
+
+def ensure_database():
+    """Create or upgrade the current database file once per process.
+
+    Safe to call on every Streamlit rerun: after the first call for a file it
+    returns without touching SQLite. Importing this module never does it.
+    """
+    path = DB_PATH
+    if path in _ensured_paths:
+        return
+    with _ensure_lock:
+        if path not in _ensured_paths:
+            if not path.exists():
+                logger.info("Initializing new database at %s", path)
+            initialize_database()
+            _ensured_paths.add(path)
+
+def _create_schema(conn):
     c = conn.cursor()
     
     # Create tables if they don't exist
@@ -42,9 +604,815 @@ def initialize_database():
     c.execute("SELECT COUNT(*) FROM categories")
     if c.fetchone()[0] == 0:
         insert_default_categories(conn)
-    
-    conn.commit()
-    conn.close()
+
+def _migration_date_index(conn):
+    # Date-range filters (get_expenses, get_category_summary); also covers the
+    # summary's category grouping and SUM without touching the table
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_expenses_date
+                    ON expenses(date, category_id, subcategory_id, total_amount)''')
+
+def _migration_user_index(conn):
+    # get_expenses_by_user: equality on entered_by, then date range and ordering
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+                    ON expenses(entered_by, date)''')
+
+def _migration_category_index(conn):
+    # Unfiltered category summaries and lookups by category
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_expenses_category
+                    ON expenses(category_id, subcategory_id, total_amount)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_categories_parent
+                    ON categories(parent_id, level)''')
+
+def _migration_integer_money(conn):
+    # Rebuild expenses with INTEGER amounts in ten-thousandths of a SAR.
+    # SQLite cannot change a column's type, so copy into a new table.
+    conn.execute('''CREATE TABLE expenses_new
+                    (id INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    category_id INTEGER NOT NULL,
+                    subcategory_id INTEGER,
+                    subsubcategory_id INTEGER,
+                    subsubsubcategory_id INTEGER,
+                    description TEXT,
+                    amount_before_vat INTEGER NOT NULL,
+                    vat_amount INTEGER NOT NULL,
+                    total_amount INTEGER NOT NULL,
+                    entered_by TEXT,
+                    FOREIGN KEY (category_id) REFERENCES categories(id),
+                    FOREIGN KEY (subcategory_id) REFERENCES categories(id),
+                    FOREIGN KEY (subsubcategory_id) REFERENCES categories(id),
+                    FOREIGN KEY (subsubsubcategory_id) REFERENCES categories(id))''')
+    conn.execute(f'''INSERT INTO expenses_new
+                     SELECT id, date, category_id, subcategory_id, subsubcategory_id,
+                            subsubsubcategory_id, description,
+                            CAST(ROUND(amount_before_vat * {MONEY_SCALE}) AS INTEGER),
+                            CAST(ROUND(vat_amount * {MONEY_SCALE}) AS INTEGER),
+                            CAST(ROUND(total_amount * {MONEY_SCALE}) AS INTEGER),
+                            entered_by
+                     FROM expenses''')
+    conn.execute("DROP TABLE expenses")
+    conn.execute("ALTER TABLE expenses_new RENAME TO expenses")
+    _migration_date_index(conn)
+    _migration_user_index(conn)
+    _migration_category_index(conn)
+
+# Daily rollup of expenses, maintained by triggers. NULL keys are stored as
+# 0 / '' so they take part in the primary key.
+_ROLLUP_KEY = "day, category_id, subcategory_id, entered_by"
+
+def _rollup_key_values(row):
+    return (f"{row}.date, {row}.category_id, IFNULL({row}.subcategory_id, 0), "
+            f"IFNULL({row}.entered_by, '')")
+
+def _rollup_add_sql(row):
+    return f'''INSERT INTO expense_daily_rollup
+                 VALUES ({_rollup_key_values(row)}, {row}.amount_before_vat,
+                         {row}.vat_amount, {row}.total_amount, 1)
+                 ON CONFLICT ({_ROLLUP_KEY}) DO UPDATE SET
+                     amount_before_vat = amount_before_vat + excluded.amount_before_vat,
+                     vat_amount = vat_amount + excluded.vat_amount,
+                     total_amount = total_amount + excluded.total_amount,
+                     expense_count = expense_count + 1;'''
+
+def _rollup_remove_sql(row):
+    match = (f"({_ROLLUP_KEY}) = ({_rollup_key_values(row)})")
+    return f'''UPDATE expense_daily_rollup SET
+                     amount_before_vat = amount_before_vat - {row}.amount_before_vat,
+                     vat_amount = vat_amount - {row}.vat_amount,
+                     total_amount = total_amount - {row}.total_amount,
+                     expense_count = expense_count - 1
+                 WHERE {match};
+                 DELETE FROM expense_daily_rollup WHERE {match} AND expense_count = 0;'''
+
+_ROLLUP_TABLE_SQL = '''CREATE TABLE expense_daily_rollup
+                    (day TEXT NOT NULL,
+                    category_id INTEGER NOT NULL,
+                    subcategory_id INTEGER NOT NULL,
+                    entered_by TEXT NOT NULL,
+                    amount_before_vat INTEGER NOT NULL,
+                    vat_amount INTEGER NOT NULL,
+                    total_amount INTEGER NOT NULL,
+                    expense_count INTEGER NOT NULL,
+                    PRIMARY KEY (day, category_id, subcategory_id, entered_by))
+                    WITHOUT ROWID'''
+
+def _migration_daily_rollup(conn):
+    conn.execute(_ROLLUP_TABLE_SQL)
+    conn.execute(f'''CREATE TRIGGER trg_expenses_rollup_insert AFTER INSERT ON expenses
+                     BEGIN {_rollup_add_sql("NEW")} END''')
+    conn.execute(f'''CREATE TRIGGER trg_expenses_rollup_delete AFTER DELETE ON expenses
+                     BEGIN {_rollup_remove_sql("OLD")} END''')
+    conn.execute(f'''CREATE TRIGGER trg_expenses_rollup_update
+                     AFTER UPDATE OF date, category_id, subcategory_id, entered_by,
+                                     amount_before_vat, vat_amount, total_amount ON expenses
+                     BEGIN {_rollup_remove_sql("OLD")} {_rollup_add_sql("NEW")} END''')
+    _fill_rollup(conn)
+
+def _fill_rollup(conn):
+    conn.execute('''INSERT INTO expense_daily_rollup
+                    SELECT date, category_id, IFNULL(subcategory_id, 0), IFNULL(entered_by, ''),
+                           SUM(amount_before_vat), SUM(vat_amount), SUM(total_amount), COUNT(*)
+                    FROM expenses
+                    GROUP BY 1, 2, 3, 4''')
+
+def _migration_data_generation(conn):
+    conn.execute('''CREATE TABLE db_meta
+                    (key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL)''')
+    conn.execute("INSERT INTO db_meta (key, value) VALUES ('data_generation', 0)")
+    bump = "UPDATE db_meta SET value = value + 1 WHERE key = 'data_generation';"
+    for table in ("expenses", "categories"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f'''CREATE TRIGGER trg_{table}_generation_{event.lower()}
+                             AFTER {event} ON {table} BEGIN {bump} END''')
+
+def _migration_category_closure(conn):
+    # Every (ancestor, descendant, depth) pair of the category tree, including
+    # each node paired with itself at depth 0
+    conn.execute('''CREATE TABLE category_closure
+                    (ancestor_id INTEGER NOT NULL,
+                    descendant_id INTEGER NOT NULL,
+                    depth INTEGER NOT NULL,
+                    PRIMARY KEY (ancestor_id, descendant_id))
+                    WITHOUT ROWID''')
+    conn.execute('''CREATE INDEX idx_category_closure_descendant
+                    ON category_closure(descendant_id, ancestor_id)''')
+    conn.execute('''INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+                    WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+                        SELECT id, id, 0 FROM categories
+                        UNION ALL
+                        SELECT t.ancestor_id, c.id, t.depth + 1
+                        FROM tree t JOIN categories c ON c.parent_id = t.descendant_id
+                    )
+                    SELECT ancestor_id, descendant_id, depth FROM tree''')
+
+    conn.execute('''CREATE TRIGGER trg_categories_closure_insert AFTER INSERT ON categories
+                    BEGIN
+                        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+                        SELECT ancestor_id, NEW.id, depth + 1 FROM category_closure
+                        WHERE descendant_id = NEW.parent_id
+                        UNION ALL SELECT NEW.id, NEW.id, 0;
+                    END''')
+    conn.execute('''CREATE TRIGGER trg_categories_closure_delete AFTER DELETE ON categories
+                    BEGIN
+                        DELETE FROM category_closure
+                        WHERE descendant_id = OLD.id OR ancestor_id = OLD.id;
+                    END''')
+    # Re-parenting moves the whole subtree: drop its links to the old
+    # ancestors, then link every new ancestor to every node in the subtree
+    conn.execute('''CREATE TRIGGER trg_categories_closure_move
+                    AFTER UPDATE OF parent_id ON categories
+                    WHEN OLD.parent_id IS NOT NEW.parent_id
+                    BEGIN
+                        DELETE FROM category_closure
+                        WHERE descendant_id IN (SELECT descendant_id FROM category_closure
+                                                WHERE ancestor_id = OLD.id)
+                          AND ancestor_id NOT IN (SELECT descendant_id FROM category_closure
+                                                  WHERE ancestor_id = OLD.id);
+                        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+                        SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+                        FROM category_closure a, category_closure d
+                        WHERE a.descendant_id = NEW.parent_id AND d.ancestor_id = NEW.id;
+                    END''')
+
+    # The deepest category set on each expense, so rollups can join the
+    # closure table on one indexed column
+    conn.execute('''ALTER TABLE expenses ADD COLUMN leaf_category_id INTEGER
+                    GENERATED ALWAYS AS (COALESCE(subsubsubcategory_id, subsubcategory_id,
+                                                  subcategory_id, category_id)) VIRTUAL''')
+    _create_leaf_index(conn)
+
+def _create_leaf_index(conn):
+    conn.execute('''CREATE INDEX idx_expenses_leaf_date
+                    ON expenses(leaf_category_id, date, total_amount)''')
+
+def _category_names_sql(row):
+    """SQL expression joining the names of a row's categories, top level first"""
+    return (f"(SELECT group_concat(name, ' ') FROM categories WHERE id IN "
+            f"({row}.category_id, {row}.subcategory_id, {row}.subsubcategory_id, "
+            f"{row}.subsubsubcategory_id))")
+
+def _migration_expense_search(conn):
+    # FTS5 index keyed by expense id (rowid); trigger-maintained
+    conn.execute('''CREATE VIRTUAL TABLE expense_search USING fts5(
+                        description, categories,
+                        tokenize = 'unicode61 remove_diacritics 2',
+                        prefix = '2 3')''')
+    conn.execute(f'''INSERT INTO expense_search (rowid, description, categories)
+                     SELECT e.id, e.description, {_category_names_sql("e")} FROM expenses e''')
+    insert = (f"INSERT INTO expense_search (rowid, description, categories) "
+              f"VALUES (NEW.id, NEW.description, {_category_names_sql('NEW')});")
+    delete = "DELETE FROM expense_search WHERE rowid = OLD.id;"
+    conn.execute(f'''CREATE TRIGGER trg_expenses_search_insert AFTER INSERT ON expenses
+                     BEGIN {insert} END''')
+    conn.execute(f'''CREATE TRIGGER trg_expenses_search_delete AFTER DELETE ON expenses
+                     BEGIN {delete} END''')
+    conn.execute(f'''CREATE TRIGGER trg_expenses_search_update
+                     AFTER UPDATE OF description, category_id, subcategory_id,
+                                     subsubcategory_id, subsubsubcategory_id ON expenses
+                     BEGIN {delete} {insert} END''')
+    # Renaming a category re-indexes the expenses filed under it
+    conn.execute(f'''CREATE TRIGGER trg_categories_search_rename
+                     AFTER UPDATE OF name ON categories
+                     BEGIN
+                         UPDATE expense_search SET categories = (
+                             SELECT {_category_names_sql("e")} FROM expenses e
+                             WHERE e.id = expense_search.rowid)
+                         WHERE rowid IN (SELECT id FROM expenses
+                                         WHERE NEW.id IN (category_id, subcategory_id,
+                                                          subsubcategory_id, subsubsubcategory_id));
+                     END''')
+
+def _migration_archive_months(conn):
+    # One row per month moved out to a read-only archive file (see archive_month)
+    conn.execute('''CREATE TABLE archive_months
+                    (month TEXT PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    expense_count INTEGER NOT NULL,
+                    total_amount INTEGER NOT NULL,
+                    archived_at TEXT NOT NULL)
+                    WITHOUT ROWID''')
+
+_CHANGE_ROW_COLUMNS = ("date, category_id, subcategory_id, subsubcategory_id, "
+                       "subsubsubcategory_id, description, amount_before_vat, vat_amount, "
+                       "total_amount, entered_by")
+
+def _change_log_sql(op, row):
+    values = ", ".join(f"{row}.{col.strip()}" for col in _CHANGE_ROW_COLUMNS.split(","))
+    return (f"INSERT INTO expense_changes (op, expense_id, {_CHANGE_ROW_COLUMNS}) "
+            f"VALUES ('{op}', {row}.id, {values});")
+
+def _migration_change_log(conn):
+    # Append-only log of expense changes for incremental exports (see
+    # export_changes). Rows hold the expense as written, or as it was before
+    # a delete; AUTOINCREMENT keeps sequence numbers from ever being reused.
+    conn.execute('''CREATE TABLE expense_changes
+                    (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+                    expense_id INTEGER NOT NULL,
+                    changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now')),
+                    date TEXT,
+                    category_id INTEGER,
+                    subcategory_id INTEGER,
+                    subsubcategory_id INTEGER,
+                    subsubsubcategory_id INTEGER,
+                    description TEXT,
+                    amount_before_vat INTEGER,
+                    vat_amount INTEGER,
+                    total_amount INTEGER,
+                    entered_by TEXT)''')
+    # archive_month switches capture off while it moves rows out of the live table
+    conn.execute("INSERT INTO db_meta (key, value) VALUES ('capture_changes', 1)")
+    capturing = "(SELECT value FROM db_meta WHERE key = 'capture_changes')"
+    for event, op, row in (("INSERT", "insert", "NEW"), ("UPDATE", "update", "NEW"),
+                           ("DELETE", "delete", "OLD")):
+        conn.execute(f'''CREATE TRIGGER trg_expenses_change_{op} AFTER {event} ON expenses
+                         WHEN {capturing}
+                         BEGIN {_change_log_sql(op, row)} END''')
+    # Existing expenses start the log, so a first export from 0 is a full copy
+    conn.execute(f'''INSERT INTO expense_changes (op, expense_id, {_CHANGE_ROW_COLUMNS})
+                     SELECT 'insert', id, {_CHANGE_ROW_COLUMNS} FROM expenses ORDER BY id''')
+
+# Days since 1970-01-01, computed by SQLite from the stored 'YYYY-MM-DD' text
+_DAY_NUMBER_SQL = "CAST(julianday(date) - 2440587.5 AS INTEGER)"
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def _add_day_number(conn):
+    conn.execute(f'''ALTER TABLE expenses ADD COLUMN day_number INTEGER
+                     GENERATED ALWAYS AS ({_DAY_NUMBER_SQL}) VIRTUAL''')
+
+def _create_day_indexes(conn):
+    # Date ranges compare integers: the range scan, the category summary's
+    # grouping and SUM, the per-user range and the leaf-category rollups
+    conn.execute('''CREATE INDEX idx_expenses_day
+                    ON expenses(day_number, category_id, subcategory_id, total_amount)''')
+    conn.execute('''CREATE INDEX idx_expenses_user_day
+                    ON expenses(entered_by, day_number)''')
+    conn.execute('''CREATE INDEX idx_expenses_leaf_day
+                    ON expenses(leaf_category_id, day_number, total_amount)''')
+
+def _drop_date_indexes(conn):
+    for index in ("idx_expenses_date", "idx_expenses_user_date", "idx_expenses_leaf_date"):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+
+def _normalize_dates(conn):
+    """Rewrite dates stored with a time part or other extras as 'YYYY-MM-DD'"""
+    return conn.execute("UPDATE expenses SET date = date(date) "
+                        "WHERE date IS NOT date(date) AND date(date) IS NOT NULL").rowcount
+
+def _upgrade_archive(path):
+    """Give an archive file written before migration 11 its day_number column"""
+    path.chmod(0o644)
+    archive = sqlite3.connect(path)
+    try:
+        columns = [row[1] for row in archive.execute("PRAGMA table_xinfo(expenses)")]
+        if "day_number" not in columns:
+            if _normalize_dates(archive):
+                # Archives have no triggers; recompute the rollup by hand
+                archive.execute("DELETE FROM expense_daily_rollup")
+                _fill_rollup(archive)
+            _add_day_number(archive)
+            _drop_date_indexes(archive)
+            _create_day_indexes(archive)
+            archive.execute("ANALYZE")
+            archive.commit()
+            archive.execute("VACUUM")
+    finally:
+        archive.close()
+        path.chmod(0o444)
+
+def _migration_day_number(conn):
+    # Range filters used to compare TEXT dates, which only works while every
+    # row and parameter is exactly 'YYYY-MM-DD'. Normalize the stored dates,
+    # then filter on a generated integer day number instead.
+    _normalize_dates(conn)
+    _add_day_number(conn)
+    _drop_date_indexes(conn)
+    _create_day_indexes(conn)
+    for (file,) in conn.execute("SELECT file FROM archive_months").fetchall():
+        _upgrade_archive(archive_dir() / file)
+
+def _migration_stale_leaf_categories(conn):
+    # Edits used to rewrite the first three category levels only, leaving a
+    # fourth level from the old category behind (and with it the leaf
+    # category the drill-down reads). Clear any that no longer fits.
+    conn.execute('''UPDATE expenses SET subsubsubcategory_id = NULL
+                    WHERE subsubsubcategory_id IS NOT NULL
+                      AND subsubsubcategory_id NOT IN (
+                          SELECT id FROM categories
+                          WHERE parent_id IS expenses.subsubcategory_id)''')
+
+def _archived_max_id(conn):
+    """Highest expense id held in any archive file"""
+    highest = 0
+    for (file,) in conn.execute("SELECT file FROM archive_months").fetchall():
+        path = archive_dir() / file
+        archive = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            highest = max(highest, archive.execute(
+                "SELECT IFNULL(MAX(id), 0) FROM expenses").fetchone()[0])
+        finally:
+            archive.close()
+    return highest
+
+def _migration_autoincrement_ids(conn):
+    # With a plain INTEGER PRIMARY KEY, SQLite hands out MAX(id) + 1, so once
+    # archive_month moved the newest ids out of the live table they were
+    # given to new expenses again. Rebuild the table with AUTOINCREMENT,
+    # keeping its triggers and indexes, and start the sequence above every id
+    # ever used: live, archived or only seen in the change log.
+    objects = conn.execute("""SELECT sql FROM sqlite_master
+                              WHERE tbl_name = 'expenses' AND type IN ('index', 'trigger')
+                                AND sql IS NOT NULL""").fetchall()
+    table_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'expenses'").fetchone()[0]
+    table_sql = re.sub(r'^CREATE TABLE\s+"?expenses"?', "CREATE TABLE expenses_new", table_sql)
+    table_sql = re.sub(r"\bid INTEGER PRIMARY KEY\b(?! AUTOINCREMENT)",
+                       "id INTEGER PRIMARY KEY AUTOINCREMENT", table_sql, count=1)
+    columns = ", ".join(row[1] for row in conn.execute("PRAGMA table_xinfo(expenses)")
+                        if row[6] == 0)  # stored columns only, not generated ones
+
+    conn.execute(table_sql)
+    conn.execute(f"INSERT INTO expenses_new ({columns}) SELECT {columns} FROM expenses")
+    conn.execute("DROP TABLE expenses")
+    # Other tables' triggers name expenses; don't re-check them mid-rename
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        conn.execute("ALTER TABLE expenses_new RENAME TO expenses")
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    for (sql,) in objects:
+        conn.execute(sql)
+
+    highest = max(conn.execute("SELECT IFNULL(MAX(id), 0) FROM expenses").fetchone()[0],
+                  conn.execute("SELECT IFNULL(MAX(expense_id), 0) FROM expense_changes"
+                               ).fetchone()[0],
+                  _archived_max_id(conn))
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'expenses'")
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('expenses', ?)", (highest,))
+
+def _migration_category_generation(conn):
+    # The category index only needs reloading when categories change; the
+    # data generation also moves on every expense write
+    conn.execute("INSERT INTO db_meta (key, value) VALUES ('category_generation', 0)")
+    bump = "UPDATE db_meta SET value = value + 1 WHERE key = 'category_generation';"
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f'''CREATE TRIGGER trg_categories_category_generation_{event.lower()}
+                         AFTER {event} ON categories BEGIN {bump} END''')
+
+# Schema migrations, applied in order and tracked in PRAGMA user_version.
+# Append new entries; never renumber or edit ones that have shipped.
+MIGRATIONS = [
+    (1, "Index expenses by date", _migration_date_index),
+    (2, "Index expenses by user and date", _migration_user_index),
+    (3, "Index expenses and categories by category", _migration_category_index),
+    (4, "Store amounts as integer ten-thousandths of a SAR", _migration_integer_money),
+    (5, "Add trigger-maintained daily expense rollup", _migration_daily_rollup),
+    (6, "Track a data generation for query caching", _migration_data_generation),
+    (7, "Add category closure table and expense leaf category", _migration_category_closure),
+    (8, "Add full-text search over descriptions and categories", _migration_expense_search),
+    (9, "Track months archived to read-only files", _migration_archive_months),
+    (10, "Log expense changes for incremental exports", _migration_change_log),
+    (11, "Add integer day numbers for date-range queries", _migration_day_number),
+    (12, "Clear category levels left behind by edits", _migration_stale_leaf_categories),
+    (13, "Never reuse expense ids, even after archiving", _migration_autoincrement_ids),
+    (14, "Track a category generation for the category index", _migration_category_generation),
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Upgrade the database schema in place to the latest migration.
+
+    Each migration runs in its own write transaction together with the
+    user_version bump, so an interrupted upgrade resumes where it stopped.
+    Returns the list of versions applied.
+    """
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            if version > get_schema_version(conn):
+                logger.info("Applying migration %s: %s", version, description)
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if applied:
+        # Refresh planner statistics so the new indexes are used
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
+
+def rebuild_rollup():
+    """Recompute expense_daily_rollup from the expenses table"""
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM expense_daily_rollup")
+        _fill_rollup(conn)
+
+def verify_rollup():
+    """Compare the rollup with a fresh aggregate of expenses.
+
+    Returns a DataFrame with one row per key whose sums or counts differ
+    (empty when the rollup is consistent). Missing rows show as NULL.
+    """
+    query = '''
+    WITH base AS (
+        SELECT date AS day, category_id, IFNULL(subcategory_id, 0) AS subcategory_id,
+               IFNULL(entered_by, '') AS entered_by,
+               SUM(amount_before_vat) AS amount_before_vat, SUM(vat_amount) AS vat_amount,
+               SUM(total_amount) AS total_amount, COUNT(*) AS expense_count
+        FROM expenses
+        GROUP BY 1, 2, 3, 4
+    ),
+    keys AS (
+        SELECT day, category_id, subcategory_id, entered_by FROM base
+        UNION
+        SELECT day, category_id, subcategory_id, entered_by FROM expense_daily_rollup
+    )
+    SELECT k.day, k.category_id, k.subcategory_id, k.entered_by,
+           b.total_amount AS expected_total, r.total_amount AS rollup_total,
+           b.expense_count AS expected_count, r.expense_count AS rollup_count
+    FROM keys k
+    LEFT JOIN base b USING (day, category_id, subcategory_id, entered_by)
+    LEFT JOIN expense_daily_rollup r USING (day, category_id, subcategory_id, entered_by)
+    WHERE b.amount_before_vat IS NOT r.amount_before_vat
+       OR b.vat_amount IS NOT r.vat_amount
+       OR b.total_amount IS NOT r.total_amount
+       OR b.expense_count IS NOT r.expense_count
+    '''
+    with get_connection() as conn:
+        return pd.read_sql(query, conn)
+
+# Closed months can be moved out of the live expenses table into one
+# read-only, compacted SQLite file per month. Reads attach only the months
+# that overlap their date range, one at a time (SQLite allows few attached
+# databases at once).
+ARCHIVE_SCHEMA = "archive"
+_FIRST_DAY = "0001-01-01"
+_LAST_DAY = "9999-12-31"
+
+_ARCHIVE_COLUMNS = ("id, date, category_id, subcategory_id, subsubcategory_id, "
+                    "subsubsubcategory_id, description, amount_before_vat, vat_amount, "
+                    "total_amount, entered_by")
+
+def archive_dir():
+    """Directory holding the monthly archive files of the current database"""
+    return DB_PATH.parent / f"{DB_PATH.stem}_archive"
+
+def _month_bounds(month):
+    """First and last day ('YYYY-MM-DD') of a 'YYYY-MM' month"""
+    first = datetime.strptime(month, "%Y-%m").date()
+    next_month = first.replace(day=28) + timedelta(days=4)
+    return first.isoformat(), (next_month - timedelta(days=next_month.day)).isoformat()
+
+def _shift_day(day, days):
+    return (datetime.strptime(day, "%Y-%m-%d").date() + timedelta(days=days)).isoformat()
+
+def _archived_months(conn, start_date=None, end_date=None):
+    """(month, file path) of the archived months overlapping the range, newest first"""
+    where, params = "1", []
+    if start_date and end_date:
+        where = "month BETWEEN substr(?, 1, 7) AND substr(?, 1, 7)"
+        params = [_date_param(start_date), _date_param(end_date)]
+    rows = conn.execute(f"SELECT month, file FROM archive_months WHERE {where} "
+                        f"ORDER BY month DESC", params).fetchall()
+    return [(month, archive_dir() / file) for month, file in rows]
+
+@contextmanager
+def _attached_archive(conn, path):
+    """Attach an archive file read-only as ARCHIVE_SCHEMA for the with-block"""
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}",
+                 (f"{Path(path).resolve().as_uri()}?mode=ro",))
+    try:
+        yield ARCHIVE_SCHEMA
+    finally:
+        conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+def _partitions(conn, start_date=None, end_date=None):
+    """Yield the schema of every partition overlapping the range: "main" for
+    the live tables, then each archived month while it is attached.
+
+    Finish reading one partition before asking for the next.
+    """
+    yield "main"
+    for _, path in _archived_months(conn, start_date, end_date):
+        with _attached_archive(conn, path) as schema:
+            yield schema
+
+def _build_archive(path, first_day, last_day):
+    """Copy the live expenses of one month into a new, compacted archive file"""
+    archive = sqlite3.connect(path)
+    try:
+        archive.execute("ATTACH DATABASE ? AS live", (str(DB_PATH),))
+        # Same shape as the live table so the same queries run on both
+        archive.execute('''CREATE TABLE expenses
+                          (id INTEGER PRIMARY KEY,
+                          date TEXT NOT NULL,
+                          category_id INTEGER NOT NULL,
+                          subcategory_id INTEGER,
+                          subsubcategory_id INTEGER,
+                          subsubsubcategory_id INTEGER,
+                          description TEXT,
+                          amount_before_vat INTEGER NOT NULL,
+                          vat_amount INTEGER NOT NULL,
+                          total_amount INTEGER NOT NULL,
+                          entered_by TEXT,
+                          leaf_category_id INTEGER
+                              GENERATED ALWAYS AS (COALESCE(subsubsubcategory_id, subsubcategory_id,
+                                                            subcategory_id, category_id)) VIRTUAL)''')
+        _add_day_number(archive)
+        archive.execute(_ROLLUP_TABLE_SQL)
+        archive.execute(f'''INSERT INTO main.expenses ({_ARCHIVE_COLUMNS})
+                           SELECT {_ARCHIVE_COLUMNS} FROM live.expenses
+                           WHERE day_number BETWEEN ? AND ? ORDER BY day_number, id''',
+                        (_day_number(first_day), _day_number(last_day)))
+        _fill_rollup(archive)
+        archive.commit()
+        archive.execute("DETACH DATABASE live")
+
+        # Indexes are built once the rows are in; then compact the file
+        _create_day_indexes(archive)
+        archive.execute("ANALYZE")
+        archive.commit()
+        archive.execute("VACUUM")
+    finally:
+        archive.close()
+
+def archive_month(month):
+    """Move a closed month's expenses out of the live table into an archive file.
+
+    month is "YYYY-MM" and must be before the current month. The rows are
+    first copied into a new read-only file; the live rows are then deleted
+    in one transaction, after checking that the archive holds exactly them.
+    Reports keep including the month. Returns the number of expenses moved.
+    """
+    first_day, last_day = _month_bounds(month)
+    if first_day >= datetime.today().date().replace(day=1).isoformat():
+        raise ValueError(f"{month} is not closed yet; only past months can be archived")
+    with get_connection() as conn:
+        if conn.execute("SELECT 1 FROM archive_months WHERE month = ?", (month,)).fetchall():
+            raise ValueError(f"{month} is already archived")
+
+    directory = archive_dir()
+    directory.mkdir(exist_ok=True)
+    path = directory / f"expenses_{month.replace('-', '_')}.db"
+    if path.exists():
+        # Left by an interrupted run; it was never recorded, so rebuild it
+        path.chmod(0o644)
+        path.unlink()
+    _build_archive(path, first_day, last_day)
+    path.chmod(0o444)
+
+    days = (_day_number(first_day), _day_number(last_day))
+    month_rows = (f"SELECT {_ARCHIVE_COLUMNS} FROM {{schema}}.expenses "
+                  f"WHERE day_number BETWEEN ? AND ?")
+    with get_connection() as conn:
+        with _attached_archive(conn, path) as schema:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                live_count, total_units = conn.execute(
+                    "SELECT COUNT(*), IFNULL(SUM(total_amount), 0) FROM main.expenses "
+                    "WHERE day_number BETWEEN ? AND ?", days).fetchall()[0]
+                archived_count = conn.execute(
+                    f"SELECT COUNT(*) FROM {schema}.expenses").fetchall()[0][0]
+                missing = conn.execute(
+                    f"SELECT COUNT(*) FROM ({month_rows.format(schema='main')} "
+                    f"EXCEPT {month_rows.format(schema=schema)})",
+                    days + days).fetchall()[0][0]
+                if missing or live_count != archived_count:
+                    raise sqlite3.OperationalError(
+                        f"Expenses for {month} changed while archiving; try again")
+                # A move, not a deletion: keep it out of the change log
+                conn.execute("UPDATE db_meta SET value = 0 WHERE key = 'capture_changes'")
+                conn.execute("DELETE FROM main.expenses WHERE day_number BETWEEN ? AND ?", days)
+                conn.execute("UPDATE db_meta SET value = 1 WHERE key = 'capture_changes'")
+                conn.execute('''INSERT INTO archive_months
+                                (month, file, expense_count, total_amount, archived_at)
+                                VALUES (?, ?, ?, ?, ?)''',
+                             (month, path.name, live_count, total_units,
+                              datetime.now().isoformat(timespec="seconds")))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        conn.execute("PRAGMA optimize")
+    logger.info("Archived %s expenses for %s to %s", live_count, month, path)
+    return live_count
+
+def get_archivable_months():
+    """Closed months that still have live expenses and are not archived, oldest first"""
+    query = '''SELECT substr(day, 1, 7) AS month, SUM(expense_count) AS expense_count,
+                      SUM(total_amount) AS total_amount
+               FROM expense_daily_rollup
+               WHERE day < ? AND substr(day, 1, 7) NOT IN (SELECT month FROM archive_months)
+               GROUP BY 1 ORDER BY 1'''
+    with get_connection() as conn:
+        df = pd.read_sql(query, conn,
+                         params=[datetime.today().date().replace(day=1).isoformat()])
+    return _amounts_to_sar(df)
+
+@cached_query
+def get_archived_months():
+    """Months moved to archive files, newest first"""
+    query = '''SELECT month, file, expense_count, total_amount, archived_at
+               FROM archive_months ORDER BY month DESC'''
+    with get_connection() as conn:
+        return _amounts_to_sar(pd.read_sql(query, conn))
+
+# Long report reads can run on a reporting snapshot: a read-only copy of the
+# live file made with SQLite's online backup API, so they never hold up
+# writers or see a half-applied change. Archive files are shared with the
+# live database, so archived months read the same either way.
+_snapshot_pool = None
+_snapshot_lock = threading.Lock()
+_snapshot_use_lock = threading.Lock()
+_snapshot_refresh = {}
+_snapshot_schedule = None
+
+def snapshot_path():
+    """Reporting snapshot file of the current database"""
+    return DB_PATH.parent / f"{DB_PATH.stem}_snapshot.db"
+
+def _get_snapshot_pool():
+    global _snapshot_pool
+    if _snapshot_pool is None:
+        with _pool_lock:
+            if _snapshot_pool is None:
+                _snapshot_pool = ConnectionPool(snapshot_path(), readonly=True)
+    return _snapshot_pool
+
+def refresh_snapshot():
+    """Copy the live database into the reporting snapshot and return its status.
+
+    The copy is made in steps of SNAPSHOT_STEP_PAGES pages, so writers get
+    the lock between steps; SQLite restarts the copy when a write lands in
+    the middle, so the result is always one consistent state. The new file
+    replaces the old one atomically, and open report reads finish on the old.
+    """
+    global _snapshot_pool
+    with _snapshot_lock:
+        target = snapshot_path()
+        temp = target.with_name(target.name + ".tmp")
+        if temp.exists():
+            temp.chmod(0o644)
+            temp.unlink()
+
+        started = time.perf_counter()
+        progress = {"steps": 0, "restarts": 0, "remaining": None, "pages": 0}
+
+        def step(status, remaining, total):
+            if progress["remaining"] is not None and remaining > progress["remaining"]:
+                progress["restarts"] += 1
+            progress.update(steps=progress["steps"] + 1, remaining=remaining, pages=total)
+
+        source = _open_connection(DB_PATH)
+        copy = sqlite3.connect(temp)
+        try:
+            source.backup(copy, pages=SNAPSHOT_STEP_PAGES, progress=step,
+                          sleep=SNAPSHOT_STEP_SLEEP)
+            copy.execute("INSERT OR REPLACE INTO db_meta (key, value) "
+                         "VALUES ('snapshot_taken_at', ?)", (int(time.time()),))
+            copy.commit()
+            # A rollback-journal file can be opened read-only without -wal/-shm
+            copy.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            copy.close()
+            source.close()
+        temp.chmod(0o444)
+        os.replace(temp, target)
+
+        # New connections must open the new file
+        with _pool_lock:
+            old, _snapshot_pool = _snapshot_pool, None
+        if old is not None:
+            old.close_all()
+
+        seconds = time.perf_counter() - started
+        _snapshot_refresh.update(seconds=round(seconds, 3), pages=progress["pages"],
+                                 steps=progress["steps"], restarts=progress["restarts"])
+        instrumentation.record("snapshot.refresh", seconds)
+        logger.info("Refreshed reporting snapshot: %d pages in %.2fs (%d restarts)",
+                    progress["pages"], seconds, progress["restarts"])
+    return get_snapshot_status()
+
+def get_snapshot_status():
+    """Age and freshness of the reporting snapshot, plus stats of the last refresh"""
+    path = snapshot_path()
+    with get_pool().connection() as conn:
+        live_generation = _data_generation(conn)
+    status = {"path": str(path), "exists": path.exists(), "live_generation": live_generation,
+              "last_refresh": dict(_snapshot_refresh)}
+    if not status["exists"]:
+        return status
+    with _get_snapshot_pool().connection() as conn:
+        meta = dict(conn.execute("SELECT key, value FROM db_meta WHERE key IN "
+                                 "('data_generation', 'snapshot_taken_at')").fetchall())
+    taken_at = meta.get("snapshot_taken_at", int(path.stat().st_mtime))
+    status.update(
+        taken_at=datetime.fromtimestamp(taken_at).isoformat(timespec="seconds"),
+        age_seconds=round(time.time() - taken_at, 1),
+        data_generation=meta.get("data_generation", 0),
+        behind=meta.get("data_generation", 0) != live_generation,
+        size_bytes=path.stat().st_size,
+    )
+    return status
+
+@contextmanager
+def use_snapshot(max_age=0):
+    """Run this thread's reads against the reporting snapshot for the with-block.
+
+    The snapshot is refreshed first when it is missing, or when it is behind
+    the live database and more than max_age seconds old; max_age=0 means
+    reads see the live data as of entering the block. Writes still go to the
+    live database.
+    """
+    def stale():
+        status = get_snapshot_status()
+        return not status["exists"] or (status["behind"] and status["age_seconds"] > max_age)
+
+    if stale():
+        # Threads that find it stale together share one refresh
+        with _snapshot_use_lock:
+            if stale():
+                refresh_snapshot()
+    previous = getattr(_reader, "pool", None)
+    _reader.pool = _get_snapshot_pool()
+    try:
+        yield
+    finally:
+        _reader.pool = previous
+
+def start_snapshot_schedule(interval=SNAPSHOT_INTERVAL):
+    """Refresh the snapshot in the background every interval seconds while it is behind.
+
+    Safe to call repeatedly; one scheduler thread runs per process.
+    """
+    global _snapshot_schedule
+    with _snapshot_lock:
+        if _snapshot_schedule is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    status = get_snapshot_status()
+                    if not status["exists"] or status["behind"]:
+                        refresh_snapshot()
+                except Exception:
+                    logger.exception("Scheduled snapshot refresh failed")
+
+        _snapshot_schedule = threading.Thread(target=run, name="snapshot-schedule", daemon=True)
+        _snapshot_schedule.start()
 
 def insert_default_categories(conn):
     """Insert default category hierarchy"""
@@ -135,307 +1503,1263 @@ def insert_default_categories(conn):
             c.execute("INSERT INTO categories (name, parent_id, level) VALUES (?, ?, ?)", 
                     (item, subcategory_id, 3))
 
-def get_categories(level=None, parent_id=None):
-    conn = get_connection()
-    c = conn.cursor()
-    
-    query = "SELECT id, name FROM categories"
-    params = []
-    
-    if level is not None:
-        query += " WHERE level = ?"
-        params.append(level)
-    
-    if parent_id is not None:
-        if level is not None:
-            query += " AND parent_id = ?"
+class CategoryIndex:
+    """In-memory copy of the categories table with O(1) lookups.
+
+    The tree is small and changes rarely, so it is loaded once per process and
+    shared by every session instead of being queried on each form render.
+    """
+
+    def __init__(self, rows):
+        self.names = {}       # id -> name
+        self.parents = {}     # id -> parent_id (None for main categories)
+        self.levels = {}      # id -> level
+        self.children = {}    # parent_id -> [child ids]
+        self.by_level = {}    # level -> [ids]
+        self._scoped = {}     # (parent_id, name) -> id
+        self._by_name = {}    # name -> [ids], in insertion order
+
+        for cat_id, name, parent_id, level in rows:
+            self.names[cat_id] = name
+            self.parents[cat_id] = parent_id
+            self.levels[cat_id] = level
+            self.children.setdefault(parent_id, []).append(cat_id)
+            self.by_level.setdefault(level, []).append(cat_id)
+            self._scoped.setdefault((parent_id, name), cat_id)
+            self._by_name.setdefault(name, []).append(cat_id)
+
+    @classmethod
+    def load(cls, conn):
+        c = conn.cursor()
+        c.execute("SELECT id, name, parent_id, level FROM categories ORDER BY id")
+        return cls(c.fetchall())
+
+    def name_of(self, category_id):
+        return self.names.get(category_id)
+
+    def id_of(self, name, parent_id=None):
+        """Look up a category by name, scoped to parent_id when one is given"""
+        if parent_id:
+            return self._scoped.get((parent_id, name))
+        ids = self._by_name.get(name)
+        return ids[0] if ids else None
+
+    def child_id(self, name, parent_id):
+        """Look up a category by name strictly inside parent_id (None = main categories)"""
+        return self._scoped.get((parent_id, name))
+
+    def resolve_path(self, *names):
+        """Resolve a category path such as ("Fuel", "Diesel", "Pickup") to IDs.
+
+        Each name is looked up among the children of the previous one, so names
+        shared between branches (e.g. "Pickup") resolve to the right node.
+        Missing or empty names resolve to None, as does everything below them.
+        """
+        ids = []
+        parent_id = None
+        for depth, name in enumerate(names):
+            if name and (depth == 0 or parent_id is not None):
+                cat_id = self.child_id(name, parent_id)
+            else:
+                cat_id = None
+            ids.append(cat_id)
+            parent_id = cat_id
+        return tuple(ids)
+
+    def list_names(self, level=None, parent_id=None):
+        if parent_id is not None:
+            ids = self.children.get(parent_id, [])
+            if level is not None:
+                ids = [i for i in ids if self.levels[i] == level]
+        elif level is not None:
+            ids = self.by_level.get(level, [])
         else:
-            query += " WHERE parent_id = ?"
-        params.append(parent_id)
-    
-    c.execute(query, params)
-    categories = [row[1] for row in c.fetchall()]
-    conn.close()
-    return categories
+            ids = list(self.names)
+        return [self.names[i] for i in ids]
+
+# (category generation it was loaded at, time it was last checked, CategoryIndex)
+_category_index = None
+_category_index_lock = threading.Lock()
+
+def _category_generation(conn):
+    row = conn.execute("SELECT value FROM db_meta WHERE key = 'category_generation'").fetchone()
+    return row[0] if row else 0
+
+def get_category_index():
+    """Return the process-wide category index, reloading it when the categories change.
+
+    Changes made in this process drop the index through
+    invalidate_category_index(). Changes committed by another process
+    (manage.py, a second server worker) bump the category generation, which
+    is checked at most every CATEGORY_CHECK_INTERVAL seconds, so lookups and
+    expense writes in between make no queries at all.
+    """
+    global _category_index
+    cached = _category_index
+    if cached is not None and time.monotonic() - cached[1] < CATEGORY_CHECK_INTERVAL:
+        return cached[2]
+    with _category_index_lock:
+        cached = _category_index
+        if cached is not None and time.monotonic() - cached[1] < CATEGORY_CHECK_INTERVAL:
+            return cached[2]
+        # Always the live file: a snapshot's older generation would force a reload
+        with get_pool().connection() as conn:
+            generation = _category_generation(conn)
+            if cached is not None and cached[0] == generation:
+                index = cached[2]
+            else:
+                # Read the generation first: a change landing in between
+                # only makes the next check reload again
+                index = CategoryIndex.load(conn)
+        _category_index = cached = (generation, time.monotonic(), index)
+    return cached[2]
+
+def invalidate_category_index():
+    """Drop the cached category index; call after any change to the categories table"""
+    global _category_index
+    with _category_index_lock:
+        _category_index = None
+
+def get_categories(level=None, parent_id=None):
+    return get_category_index().list_names(level=level, parent_id=parent_id)
 
 def get_category_id(name, parent_id=None):
-    conn = get_connection()
-    c = conn.cursor()
-    if parent_id:
-        c.execute("SELECT id FROM categories WHERE name = ? AND parent_id = ?", (name, parent_id))
-    else:
-        c.execute("SELECT id FROM categories WHERE name = ?", (name,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
+    return get_category_index().id_of(name, parent_id)
+
+def resolve_category_ids(category, subcategory=None, subsubcategory=None, subsubsubcategory=None):
+    """Resolve a category path to its four IDs, each name scoped to its parent"""
+    return get_category_index().resolve_path(category, subcategory, subsubcategory, subsubsubcategory)
+
+def _amounts_to_sar(df):
+    """Convert integer minor-unit amount columns of a query result to SAR"""
+    for col in MONEY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].to_numpy(dtype=np.int64) / MONEY_SCALE
+    return df
 
 def save_expense(date, category, subcategory, subsubcategory, subsubsubcategory, 
                 description, amount_before_vat, vat_amount, total_amount, entered_by):
-    conn = get_connection()
-    c = conn.cursor()
-    
     try:
-        # Convert date to proper string format
-        if hasattr(date, 'strftime'):  # Works for both date and datetime objects
-            date_str = date.strftime('%Y-%m-%d')
-        else:
-            date_str = str(date)  # Fallback if already string
+        # Store dates as 'YYYY-MM-DD' so the day_number column can be computed
+        date_str = _date_param(date)
             
-        print(f"DEBUG: Saving expense with date: {date_str}")  # Debug output
+        logger.debug("Saving expense dated %s", date_str)
         
         # Get category IDs (handles None for subcategories)
-        category_id = get_category_id(category)
-        subcategory_id = get_category_id(subcategory) if subcategory else None
-        subsubcategory_id = get_category_id(subsubcategory) if subsubcategory else None
-        subsubsubcategory_id = get_category_id(subsubsubcategory) if subsubsubcategory else None
+        category_id, subcategory_id, subsubcategory_id, subsubsubcategory_id = \
+            resolve_category_ids(category, subcategory, subsubcategory, subsubsubcategory)
         
-        # Ensure 4-decimal precision for all amounts
-        amount_before_vat = round(float(amount_before_vat), 4)
-        vat_amount = round(float(vat_amount), 4)
-        total_amount = round(float(total_amount), 4)
+        # Store amounts as exact integer ten-thousandths of a SAR
+        amount_before_vat = to_minor_units(amount_before_vat)
+        vat_amount = to_minor_units(vat_amount)
+        total_amount = to_minor_units(total_amount)
         
-        # Insert the expense
-        c.execute('''INSERT INTO expenses 
-                    (date, category_id, subcategory_id, subsubcategory_id, subsubsubcategory_id,
-                     description, amount_before_vat, vat_amount, total_amount, entered_by)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                (date_str, category_id, subcategory_id, subsubcategory_id, subsubsubcategory_id,
-                 description, amount_before_vat, vat_amount, total_amount, entered_by))
+        # Insert through the writer queue; the ID comes back once it is committed
+        def insert(conn):
+            c = conn.cursor()
+            c.execute('''INSERT INTO expenses
+                        (date, category_id, subcategory_id, subsubcategory_id, subsubsubcategory_id,
+                         description, amount_before_vat, vat_amount, total_amount, entered_by)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (date_str, category_id, subcategory_id, subsubcategory_id, subsubsubcategory_id,
+                     description, amount_before_vat, vat_amount, total_amount, entered_by))
+            return c.lastrowid
+        expense_id = _run_write(insert)
         
-        conn.commit()
-        print(f"DEBUG: Expense saved successfully! Amount: {total_amount:.4f}")  # Confirmation
+        logger.debug("Saved expense %s, total %.4f", expense_id, from_minor_units(total_amount))
         
-        return c.lastrowid  # Return the ID of the newly created expense
+        return expense_id  # Return the ID of the newly created expense
         
     except sqlite3.Error as e:
-        print(f"ERROR: Failed to save expense - {str(e)}")
-        conn.rollback()
+        logger.error("Failed to save expense: %s", e)
         raise  # Re-raise the error after logging
     except ValueError as e:
-        print(f"ERROR: Invalid numeric value - {str(e)}")
-        conn.rollback()
+        logger.error("Invalid value in expense: %s", e)
         raise
+
+CATEGORY_PATH_COLUMNS = ['category', 'subcategory', 'subsubcategory', 'subsubsubcategory']
+
+BulkResult = namedtuple("BulkResult", ["inserted", "rejected"])
+
+def _normalize_import_columns(df):
+    """Accept spreadsheet headers such as 'Amount Before VAT' or 'Entered By'"""
+    df = df.rename(columns=lambda c: str(c).strip().lower().replace(" ", "_").replace("-", "_"))
+    return df.rename(columns={"sub_category": "subcategory", "vat": "vat_amount",
+                              "total": "total_amount", "amount": "amount_before_vat"})
+
+def _text_column(df, name):
+    if name not in df.columns:
+        return pd.Series(None, index=df.index, dtype=object)
+    values = df[name].astype(object).where(df[name].notna(), None)
+    values = values.map(lambda v: str(v).strip() if v is not None else None)
+    return values.where(values != "", None)
+
+# Text dates are only accepted in ISO form, optionally with a time part
+_ISO_DATE_RE = r"\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?"
+
+def _import_dates(values):
+    """Parse an import's date column; returns (dates, mask of non-ISO text).
+
+    Date cells (Excel dates, date objects) are used as they are. Text must be
+    YYYY-MM-DD: "03/02/2025" could be 3 February or 2 March, so such rows
+    are rejected rather than guessed.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values), pd.Series(False, index=values.index)
+    is_text = values.map(lambda v: isinstance(v, str)).astype(bool)
+    is_date = values.map(lambda v: isinstance(v, (date, np.datetime64))).astype(bool)
+    text = values[is_text].str.strip()
+    iso = text.str.fullmatch(_ISO_DATE_RE).astype(bool)
+
+    dates = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    dates[is_text] = pd.to_datetime(text.where(iso).str[:10], format="%Y-%m-%d", errors="coerce")
+    dates[is_date] = pd.to_datetime(values[is_date].map(_as_date))
+    not_iso = pd.Series(False, index=values.index)
+    not_iso[is_text] = ~iso & (text != "")
+    return dates, not_iso
+
+def save_expenses_bulk(rows, entered_by=None, vat_rate=DEFAULT_VAT_RATE):
+    """Validate and insert many expenses in a single transaction.
+
+    rows is a DataFrame or an iterable of dicts with the save_expense fields
+    (category names rather than IDs). vat_amount and total_amount are
+    optional: when vat_amount is missing it is computed from a vat_rate
+    column or the vat_rate argument, and the total is always
+    amount_before_vat + vat_amount. entered_by fills rows that have none.
+
+    Returns BulkResult(inserted, rejected), where rejected holds the invalid
+    input rows with a 'reason' column; valid rows are inserted either way.
+    """
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    df = _normalize_import_columns(df)
+    if df.empty:
+        return BulkResult(0, df.assign(reason=pd.Series(dtype=object)))
+
+    reason = pd.Series(None, index=df.index, dtype=object)
+
+    def reject(mask, message):
+        reason.loc[mask & reason.isna()] = message
+
+    # Dates
+    if 'date' in df.columns:
+        dates, not_iso = _import_dates(df['date'])
+        reject(not_iso, "date must be YYYY-MM-DD")
+    else:
+        dates = pd.Series(pd.NaT, index=df.index)
+    reject(dates.isna(), "invalid or missing date")
+
+    # Categories: resolve each distinct path once
+    paths = pd.DataFrame({col: _text_column(df, col) for col in CATEGORY_PATH_COLUMNS})
+    index = get_category_index()
+    resolved = {path: index.resolve_path(*path)
+                for path in paths.drop_duplicates().itertuples(index=False, name=None)}
+    ids = pd.DataFrame([resolved[path] for path in paths.itertuples(index=False, name=None)],
+                       index=df.index, columns=[f"{c}_id" for c in CATEGORY_PATH_COLUMNS],
+                       dtype=object)
+    for col in CATEGORY_PATH_COLUMNS:
+        reject(paths[col].notna() & ids[f"{col}_id"].isna(), f"unknown {col}")
+    reject(paths['category'].isna(), "missing category")
+
+    # Text fields
+    descriptions = _text_column(df, 'description')
+    reject(descriptions.isna(), "missing description")
+    users = _text_column(df, 'entered_by')
+    if entered_by:
+        users = users.fillna(entered_by)
+    reject(users.isna(), "missing entered_by")
+
+    # Amounts, computed in integer minor units
+    if 'amount_before_vat' in df.columns:
+        before = pd.to_numeric(df['amount_before_vat'], errors='coerce')
+    else:
+        before = pd.Series(np.nan, index=df.index)
+    reject(before.isna(), "invalid amount_before_vat")
+    reject(before <= 0, "amount_before_vat must be positive")
+    before_units = to_minor_units_array(before.fillna(0))
+
+    if 'vat_rate' in df.columns:
+        rates = pd.to_numeric(df['vat_rate'], errors='coerce').fillna(vat_rate)
+    else:
+        rates = pd.Series(vat_rate, index=df.index, dtype=float)
+    vat_units = np.floor(before_units * rates.to_numpy(dtype=np.float64) + 0.5).astype(np.int64)
+    if 'vat_amount' in df.columns:
+        given_vat = pd.to_numeric(df['vat_amount'], errors='coerce')
+        reject(df['vat_amount'].notna() & given_vat.isna(), "invalid vat_amount")
+        vat_units = np.where(given_vat.notna(), to_minor_units_array(given_vat.fillna(0)), vat_units)
+    reject(pd.Series(vat_units < 0, index=df.index), "vat_amount cannot be negative")
+    total_units = before_units + vat_units
+
+    valid = reason.isna().to_numpy()
+    records = pd.DataFrame({
+        'date': dates.dt.strftime('%Y-%m-%d'),
+        'category_id': ids['category_id'],
+        'subcategory_id': ids['subcategory_id'],
+        'subsubcategory_id': ids['subsubcategory_id'],
+        'subsubsubcategory_id': ids['subsubsubcategory_id'],
+        'description': descriptions,
+        'amount_before_vat': before_units,
+        'vat_amount': vat_units,
+        'total_amount': total_units,
+        'entered_by': users,
+    })[valid].astype(object)
+    records = records.where(records.notna(), None)
+
+    if len(records):
+        # A list, so the insert can be replayed if the writer has to retry
+        params = list(records.itertuples(index=False, name=None))
+        _run_write(lambda conn: conn.executemany('''INSERT INTO expenses
+                                (date, category_id, subcategory_id, subsubcategory_id,
+                                 subsubsubcategory_id, description, amount_before_vat,
+                                 vat_amount, total_amount, entered_by)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', params))
+
+    rejected = df[~valid].assign(reason=reason[~valid])
+    return BulkResult(len(records), rejected)
+
+def _iter_csv_chunks(file, chunksize):
+    for chunk in pd.read_csv(file, chunksize=chunksize, dtype=str, skip_blank_lines=True):
+        chunk.index = chunk.index + 2  # spreadsheet row numbers (header is row 1)
+        yield chunk
+
+def _iter_xlsx_chunks(file, chunksize):
+    from openpyxl import load_workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        batch, row_numbers = [], []
+        for row_number, row in enumerate(rows, start=2):
+            if all(v is None for v in row):
+                continue
+            batch.append(row[:len(header)])
+            row_numbers.append(row_number)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header, index=row_numbers)
+                batch, row_numbers = [], []
+        if batch:
+            yield pd.DataFrame(batch, columns=header, index=row_numbers)
     finally:
-        conn.close()  # Ensure connection always closes
+        workbook.close()
+
+def import_expenses_file(file, filename, entered_by=None, chunksize=IMPORT_CHUNKSIZE):
+    """Import a CSV or XLSX file of expenses chunk by chunk via save_expenses_bulk.
+
+    Each chunk is committed in its own transaction. Returns
+    BulkResult(inserted, rejected) for the whole file; rejected rows are
+    indexed by their row number in the file.
+    """
+    if str(filename).lower().endswith((".xlsx", ".xlsm")):
+        chunks = _iter_xlsx_chunks(file, chunksize)
+    else:
+        chunks = _iter_csv_chunks(file, chunksize)
+
+    inserted = 0
+    rejected = []
+    for chunk in chunks:
+        result = save_expenses_bulk(chunk, entered_by=entered_by)
+        inserted += result.inserted
+        if not result.rejected.empty:
+            rejected.append(result.rejected)
+    rejected = pd.concat(rejected) if rejected else pd.DataFrame(columns=['reason'])
+    return BulkResult(inserted, rejected)
 
 def get_expenses(period=None, custom_dates=None):
-    conn = get_connection()
-    
-    query = '''SELECT e.id, e.date, 
-                      c1.name as category, 
-                      c2.name as subcategory, 
-                      c3.name as subsubcategory,
-                      e.description,
-                      e.amount_before_vat,
-                      e.vat_amount,
-                      e.total_amount,
-                      e.entered_by
-               FROM expenses e
-               LEFT JOIN categories c1 ON e.category_id = c1.id
-               LEFT JOIN categories c2 ON e.subcategory_id = c2.id
-               LEFT JOIN categories c3 ON e.subsubcategory_id = c3.id'''
-    
-    params = []
-    
     if custom_dates:
-        query += " WHERE date BETWEEN ? AND ?"
-        params.extend([custom_dates[0], custom_dates[1]])
-    elif period:
-        today = datetime.today().date()
-        if period == "1st-10th":
-            start_date = today.replace(day=1)
-            end_date = today.replace(day=10)
-        elif period == "11th-20th":
-            start_date = today.replace(day=11)
-            end_date = today.replace(day=20)
-        elif period == "21st-end":
-            start_date = today.replace(day=21)
-            next_month = today.replace(day=28) + timedelta(days=4)
-            end_date = next_month - timedelta(days=next_month.day)
-        elif period == "Current Month":
-            start_date = today.replace(day=1)
-            next_month = today.replace(day=28) + timedelta(days=4)
-            end_date = next_month - timedelta(days=next_month.day)
-        
-        if period != "All":
-            query += " WHERE date BETWEEN ? AND ?"
-            params.extend([start_date, end_date])
-    
-    query += " ORDER BY date DESC"
-    
-    df = pd.read_sql(query, conn, params=params)
-    conn.close()
-    return df
+        start_date, end_date = custom_dates[0], custom_dates[1]
+    else:
+        start_date, end_date = get_period_dates(period)
 
+    # Resolve relative periods first so cached results are keyed by real dates
+    return _get_expenses_between(start_date, end_date)
+
+@cached_query
+def _get_expenses_between(start_date, end_date):
+    return _read_expenses(start_date, end_date)
+
+@cached_query
 def get_expenses_by_user(username, start_date=None, end_date=None):
-    conn = get_connection()
-    
-    query = '''SELECT e.id, e.date, 
-                      c1.name as category, 
-                      c2.name as subcategory, 
+    return _read_expenses(start_date, end_date, entered_by=username).drop(columns="entered_by")
+
+_EXPENSE_COLUMNS_SQL = '''e.id, e.date,
+                      c1.name as category,
+                      c2.name as subcategory,
                       c3.name as subsubcategory,
                       e.description,
                       e.amount_before_vat,
                       e.vat_amount,
-                      e.total_amount
-               FROM expenses e
+                      e.total_amount,
+                      e.entered_by'''
+
+_EXPENSE_COLUMN_NAMES = ["id", "date", "category", "subcategory", "subsubcategory",
+                         "description", "amount_before_vat", "vat_amount", "total_amount",
+                         "entered_by"]
+
+# {schema} is "main" for the live table or the attached archive's schema
+_EXPENSE_JOINS_SQL = '''FROM {schema}.expenses e
                LEFT JOIN categories c1 ON e.category_id = c1.id
                LEFT JOIN categories c2 ON e.subcategory_id = c2.id
-               LEFT JOIN categories c3 ON e.subsubcategory_id = c3.id
-               WHERE e.entered_by = ?'''
-    
-    params = [username]
-    
+               LEFT JOIN categories c3 ON e.subsubcategory_id = c3.id'''
+
+ExpensePage = namedtuple("ExpensePage", ["rows", "next_cursor", "prev_cursor"])
+
+def _as_date(value):
+    """A date from a date, datetime, Timestamp or 'YYYY-MM-DD' string (raises ValueError)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def _date_param(value):
+    """Bind dates as 'YYYY-MM-DD' strings to match how they are stored"""
+    return _as_date(value).isoformat()
+
+def _day_number(value):
+    """Days since 1970-01-01, matching the expenses.day_number column"""
+    return _as_date(value).toordinal() - _EPOCH_ORDINAL
+
+def _expense_filters(start_date=None, end_date=None, entered_by=None,
+                     date_column="e.day_number", user_column="e.entered_by"):
+    """Build a WHERE clause (without the keyword) and params for the common filters.
+
+    Expense rows filter on their integer day_number; the rollup tables are
+    keyed by their TEXT day, so a date_column of r.day binds date strings.
+    """
+    clauses = []
+    params = []
     if start_date and end_date:
-        query += " AND date BETWEEN ? AND ?"
-        params.extend([start_date, end_date])
-    
-    query += " ORDER BY e.date DESC"
-    
-    df = pd.read_sql(query, conn, params=params)
-    conn.close()
-    return df
+        bind = _day_number if date_column.endswith("day_number") else _date_param
+        clauses.append(f"{date_column} BETWEEN ? AND ?")
+        params.extend([bind(start_date), bind(end_date)])
+    if entered_by:
+        clauses.append(f"{user_column} = ?")
+        params.append(entered_by)
+    return " AND ".join(clauses) or "1", params
+
+def _iter_expense_rows(conn, start_date=None, end_date=None, entered_by=None,
+                       after=None, before=None, limit=None):
+    """Yield matching expense rows from the live table and the archives, in order.
+
+    Rows come newest first by (date, id), or oldest first when paging back
+    with before. The date range is cut at archived month boundaries: each
+    archived month is attached only while it is read, and its rows are merged
+    with any live rows entered for that month after it was archived. limit
+    caps the rows read from each query, not the total.
+    """
+    newest_first = before is None
+    ranged = bool(start_date and end_date)
+    lo = _date_param(start_date) if ranged else _FIRST_DAY
+    hi = _date_param(end_date) if ranged else _LAST_DAY
+
+    where, params = _expense_filters(entered_by=entered_by)
+    if before is not None:
+        where += " AND (e.day_number, e.id) > (?, ?)"
+        params.extend([_day_number(before[0]), before[1]])
+    elif after is not None:
+        where += " AND (e.day_number, e.id) < (?, ?)"
+        params.extend([_day_number(after[0]), after[1]])
+    direction = "DESC" if newest_first else "ASC"
+    tail = f" ORDER BY e.day_number {direction}, e.id {direction}"
+    if limit is not None:
+        tail += f" LIMIT {int(limit)}"
+
+    def rows(schema, first, last):
+        date_where = "e.day_number BETWEEN ? AND ? AND " if (first, last) != (_FIRST_DAY, _LAST_DAY) else ""
+        date_params = [_day_number(first), _day_number(last)] if date_where else []
+        return conn.execute(f"SELECT {_EXPENSE_COLUMNS_SQL} {_EXPENSE_JOINS_SQL.format(schema=schema)} "
+                            f"WHERE {date_where}{where}{tail}", date_params + params)
+
+    # (first day, last day, archive file or None for live-only), newest first
+    segments = []
+    upper = hi
+    for month, path in _archived_months(conn, lo, hi):
+        first, last = _month_bounds(month)
+        if last < upper:
+            segments.append((max(_shift_day(last, 1), lo), upper, None))
+        segments.append((max(first, lo), min(last, upper), path))
+        upper = _shift_day(first, -1)
+    if upper >= lo:
+        segments.append((lo, upper, None))
+    if not newest_first:
+        segments.reverse()
+
+    for first, last, path in segments:
+        if path is None:
+            yield from rows("main", first, last)
+            continue
+        with _attached_archive(conn, path) as schema:
+            live, archived = rows("main", first, last), rows(schema, first, last)
+            try:
+                yield from heapq.merge(live, archived, key=lambda row: (row[1], row[0]),
+                                       reverse=newest_first)
+            finally:
+                # Open statements would keep the archive from detaching
+                live.close()
+                archived.close()
+
+# Column types of the expense frames returned by the read API. Category
+# names and users repeat on every row, so they are categoricals; amounts stay
+# float64 because float32 cannot hold four-decimal SAR amounts exactly.
+EXPENSE_DTYPES = {
+    "id": "int64",
+    "date": "datetime64[s]",
+    "category": "category",
+    "subcategory": "category",
+    "subsubcategory": "category",
+    "description": "object",
+    "amount_before_vat": "float64",
+    "vat_amount": "float64",
+    "total_amount": "float64",
+    "entered_by": "category",
+}
+
+def _expense_frame(rows, chunksize=READ_CHUNKSIZE):
+    """Build a compactly typed expense DataFrame from row tuples, a chunk at a time.
+
+    Repeated names are stored once as categorical codes while reading, so
+    peak memory stays close to the size of the result rather than to a full
+    list of Python row tuples.
+    """
+    categories = {name: {} for name, dtype in EXPENSE_DTYPES.items() if dtype == "category"}
+    parts = {name: [] for name in _EXPENSE_COLUMN_NAMES}
+    while True:
+        batch = list(islice(rows, chunksize))
+        if not batch:
+            break
+        for name, values in zip(_EXPENSE_COLUMN_NAMES, zip(*batch)):
+            if name in categories:
+                lookup = categories[name]
+                part = np.fromiter((-1 if v is None else lookup.setdefault(v, len(lookup))
+                                    for v in values), dtype=np.int32, count=len(values))
+            elif name == "date":
+                part = np.array(values, dtype="datetime64[D]")
+            elif name in MONEY_COLUMNS:
+                part = np.array(values, dtype=np.int64) / MONEY_SCALE
+            else:
+                part = np.array(values, dtype=EXPENSE_DTYPES[name])
+            parts[name].append(part)
+
+    columns = {}
+    for name in _EXPENSE_COLUMN_NAMES:
+        if name in categories:
+            codes = np.concatenate(parts[name]) if parts[name] else np.array([], dtype=np.int32)
+            columns[name] = pd.Categorical.from_codes(codes, categories=list(categories[name]))
+        elif name == "date":
+            days = np.concatenate(parts[name]) if parts[name] else np.array([], "datetime64[D]")
+            columns[name] = days.astype(EXPENSE_DTYPES["date"])
+        else:
+            columns[name] = (np.concatenate(parts[name]) if parts[name]
+                             else np.array([], dtype=EXPENSE_DTYPES[name]))
+    return pd.DataFrame(columns)
+
+def _read_expenses(start_date=None, end_date=None, entered_by=None):
+    """Matching expenses from live and archived months as one DataFrame, newest first"""
+    with get_connection() as conn:
+        with closing(_iter_expense_rows(conn, start_date, end_date, entered_by)) as rows:
+            return _expense_frame(rows)
+
+def _read_partitions(conn, query, params, start_date=None, end_date=None):
+    """Run query, which names its tables as {schema}.table, on every partition
+    overlapping the range and return one DataFrame per partition"""
+    return [pd.read_sql(query.format(schema=schema), conn, params=params)
+            for schema in _partitions(conn, start_date, end_date)]
+
+@cached_query
+def get_expenses_page(start_date=None, end_date=None, entered_by=None,
+                      after=None, before=None, page_size=EXPENSE_PAGE_SIZE):
+    """Return one page of expenses, newest first, using keyset pagination.
 
+    Pages seek on (date, id) instead of using OFFSET, so every page costs the
+    same however deep it is. Pass the previous page's next_cursor as after to
+    move forward, or its prev_cursor as before to move back. Cursors are
+    (date, id) tuples, or None when there is no page in that direction.
+    """
+    # One extra row tells us whether more exist
+    with get_connection() as conn:
+        with closing(_iter_expense_rows(conn, start_date, end_date, entered_by, after=after,
+                                        before=before, limit=page_size + 1)) as rows:
+            df = pd.DataFrame.from_records(list(islice(rows, page_size + 1)),
+                                           columns=_EXPENSE_COLUMN_NAMES)
+    df = _amounts_to_sar(df)
+
+    has_more = len(df) > page_size
+    df = df.iloc[:page_size]
+    if before is not None:
+        df = df.iloc[::-1].reset_index(drop=True)
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = after is not None, has_more
+
+    if df.empty:
+        return ExpensePage(df, None, None)
+    first = (df['date'].iloc[0], int(df['id'].iloc[0]))
+    last = (df['date'].iloc[-1], int(df['id'].iloc[-1]))
+    return ExpensePage(df, last if has_older else None, first if has_newer else None)
+
+@cached_query
+def get_expense_totals(start_date=None, end_date=None, entered_by=None):
+    """Count, total and average of matching expenses, from the daily rollups.
+
+    Amounts are summed as integer minor units and converted once.
+    """
+    where, params = _expense_filters(start_date, end_date, entered_by,
+                                     date_column="r.day", user_column="r.entered_by")
+    query = f'''SELECT IFNULL(SUM(r.expense_count), 0), IFNULL(SUM(r.total_amount), 0)
+                 FROM {{schema}}.expense_daily_rollup r WHERE {where}'''
+    count = total_units = 0
+    with get_connection() as conn:
+        for schema in _partitions(conn, start_date, end_date):
+            part_count, part_units = conn.execute(query.format(schema=schema), params).fetchall()[0]
+            count += part_count
+            total_units += part_units
+    return {
+        "count": count,
+        "total_amount": from_minor_units(total_units),
+        "average_amount": from_minor_units(total_units) / count if count else 0.0,
+    }
+
+def iter_expenses(start_date=None, end_date=None, entered_by=None, chunksize=5000):
+    """Yield matching expenses as DataFrame chunks, newest first, for streaming consumers"""
+    with get_connection() as conn:
+        with closing(_iter_expense_rows(conn, start_date, end_date, entered_by)) as rows:
+            while True:
+                batch = list(islice(rows, chunksize))
+                if not batch:
+                    break
+                yield _amounts_to_sar(pd.DataFrame.from_records(batch,
+                                                                columns=_EXPENSE_COLUMN_NAMES))
+
+def write_expenses_csv(sink, start_date=None, end_date=None, entered_by=None):
+    """Stream matching expenses as CSV text to a file-like sink"""
+    for i, chunk in enumerate(iter_expenses(start_date, end_date, entered_by)):
+        chunk.to_csv(sink, index=False, header=(i == 0))
+
+ChangeExport = namedtuple("ChangeExport", ["changes", "last_seq"])
+CHANGE_FORMATS = ("jsonl", "csv")
+
+_CHANGE_COLUMN_NAMES = ["seq", "op", "changed_at", "id", "date", "category", "subcategory",
+                        "subsubcategory", "subsubsubcategory", "description",
+                        "amount_before_vat", "vat_amount", "total_amount", "entered_by"]
+
+def get_change_watermark():
+    """Sequence number of the latest logged change (0 when the log is empty)"""
+    with get_connection() as conn:
+        return conn.execute("SELECT IFNULL(MAX(seq), 0) FROM expense_changes").fetchone()[0]
+
+def iter_changes(since_seq=0, until_seq=None, chunksize=5000):
+    """Yield logged expense changes with since_seq < seq <= until_seq as DataFrame chunks.
+
+    Changes come in sequence order. until_seq defaults to the watermark when
+    the call starts, so writes made while the chunks are read are left for
+    the next export. Each chunk is read with its own seek on seq.
+    """
+    if until_seq is None:
+        until_seq = get_change_watermark()
+    query = '''
+    SELECT l.seq, l.op, l.changed_at, l.expense_id AS id, l.date,
+           c1.name AS category, c2.name AS subcategory, c3.name AS subsubcategory,
+           c4.name AS subsubsubcategory, l.description,
+           l.amount_before_vat, l.vat_amount, l.total_amount, l.entered_by
+    FROM expense_changes l
+    LEFT JOIN categories c1 ON l.category_id = c1.id
+    LEFT JOIN categories c2 ON l.subcategory_id = c2.id
+    LEFT JOIN categories c3 ON l.subsubcategory_id = c3.id
+    LEFT JOIN categories c4 ON l.subsubsubcategory_id = c4.id
+    WHERE l.seq > ? AND l.seq <= ?
+    ORDER BY l.seq
+    LIMIT ?
+    '''
+    last = since_seq
+    while last < until_seq:
+        with get_connection() as conn:
+            rows = conn.execute(query, (last, until_seq, chunksize)).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+        yield _amounts_to_sar(pd.DataFrame.from_records(rows, columns=_CHANGE_COLUMN_NAMES))
+
+def export_changes(since_seq, sink, format="jsonl", chunksize=5000):
+    """Stream the expense changes after since_seq to a text sink as JSON Lines or CSV.
+
+    Each record carries the change's seq, op (insert, update or delete),
+    timestamp and the expense as written (for deletes, as it was). Returns
+    ChangeExport(changes, last_seq); pass last_seq as since_seq next time.
+    """
+    if format not in CHANGE_FORMATS:
+        raise ValueError(f"Unknown export format: {format}")
+    count = 0
+    last_seq = since_seq
+    for chunk in iter_changes(since_seq, chunksize=chunksize):
+        if format == "csv":
+            chunk.to_csv(sink, index=False, header=(count == 0))
+        else:
+            text = chunk.to_json(orient="records", lines=True, force_ascii=False)
+            sink.write(text if text.endswith("\n") else text + "\n")
+        count += len(chunk)
+        last_seq = int(chunk["seq"].iloc[-1])
+    if format == "csv" and count == 0:
+        sink.write(",".join(_CHANGE_COLUMN_NAMES) + "\n")
+    return ChangeExport(count, last_seq)
+
+def prune_changes(through_seq):
+    """Drop logged changes up to and including through_seq, once every consumer has them"""
+    return _run_write(lambda conn: conn.execute(
+        "DELETE FROM expense_changes WHERE seq <= ?", (int(through_seq),)).rowcount)
+
+@cached_query
 def get_category_summary(start_date=None, end_date=None):
     """Get category summary with optional date filtering"""
-    print(f"DEBUG: Running get_category_summary with {start_date} to {end_date}")  # Verification
-    
-    conn = get_connection()
-    
+    # Read the trigger-maintained daily rollup rather than every expense row
     query = '''
     SELECT 
         c1.name as category,
         c2.name as subcategory,
-        SUM(e.total_amount) as total_amount
-    FROM expenses e
-    JOIN categories c1 ON e.category_id = c1.id
-    LEFT JOIN categories c2 ON e.subcategory_id = c2.id
+        SUM(r.total_amount) as total_amount
+    FROM {schema}.expense_daily_rollup r
+    JOIN categories c1 ON r.category_id = c1.id
+    LEFT JOIN categories c2 ON r.subcategory_id = c2.id
     '''
     
-    params = []
+    where, params = _expense_filters(start_date, end_date, date_column="r.day")
+    query += f" WHERE {where} GROUP BY c1.name, c2.name ORDER BY total_amount DESC"
     
-    if start_date and end_date:
-        query += " WHERE date BETWEEN ? AND ?"
-        params.extend([start_date.strftime('%Y-%m-%d'), 
-                      end_date.strftime('%Y-%m-%d')])
-    
-    query += ' GROUP BY c1.name, c2.name ORDER BY total_amount DESC'
-    
-    df = pd.read_sql(query, conn, params=params)
-    conn.close()
+    with get_connection() as conn:
+        frames = _read_partitions(conn, query, params, start_date, end_date)
+    df = frames[0]
+    if len(frames) > 1:
+        # Archived months overlap the range: combine their totals with the live ones
+        df = (pd.concat(frames, ignore_index=True)
+              .groupby(['category', 'subcategory'], dropna=False, as_index=False, sort=False)
+              ['total_amount'].sum()
+              .sort_values('total_amount', ascending=False, ignore_index=True))
     
     if not df.empty:
+        # SUM() results are integer minor units; total them exactly before converting
         df = pd.concat([df, pd.DataFrame({
             'category': ['TOTAL'],
             'subcategory': [''],
-            'total_amount': [df['total_amount'].sum()]
+            'total_amount': [df['total_amount'].to_numpy(dtype=np.int64).sum()]
         })], ignore_index=True)
     
+    return _amounts_to_sar(df)
+
+# Breakdown columns accepted by get_period_totals, as read from the rollup
+_PERIOD_DIMENSIONS = {
+    "category": "c1.name",
+    "subcategory": "IFNULL(c2.name, '')",
+    "entered_by": "r.entered_by",
+}
+
+def _period_start_sql(grain, day_column="r.day"):
+    """SQL for the first day ('YYYY-MM-DD') of the dekad, month or quarter of day_column"""
+    if grain == "dekad":
+        day = f"substr({day_column}, 9, 2)"
+        return (f"substr({day_column}, 1, 8) || "
+                f"CASE WHEN {day} <= '10' THEN '01' WHEN {day} <= '20' THEN '11' ELSE '21' END")
+    if grain == "month":
+        return f"substr({day_column}, 1, 8) || '01'"
+    if grain == "quarter":
+        return (f"substr({day_column}, 1, 5) || printf('%02d', "
+                f"(CAST(substr({day_column}, 6, 2) AS INTEGER) - 1) / 3 * 3 + 1) || '-01'")
+    raise ValueError(f"Unknown period grain: {grain}")
+
+@cached_query
+def get_period_totals(grain="month", start_date=None, end_date=None, by=("category",)):
+    """Expense totals per dekad, month or quarter, with period-over-period change.
+
+    Days are bucketed into periods in SQL in one grouped pass over the daily
+    rollups (live and archived months). by is a tuple of breakdown columns
+    from "category", "subcategory" and "entered_by"; pass () for one total
+    per period. Periods without expenses are filled with zeros, so each
+    row's previous_total is the period just before it within its group.
+
+    Returns a tidy DataFrame: period, period_start, the by columns,
+    expense_count, total_amount, previous_total, delta and pct_change
+    (NaN for the first period, or when the previous total was zero).
+    """
+    if grain not in PERIOD_GRAINS:
+        raise ValueError(f"Unknown period grain: {grain}")
+    by = list(by)
+    unknown = set(by) - set(_PERIOD_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown breakdown columns: {', '.join(sorted(unknown))}")
+
+    keys = ["period_start"] + by
+    columns = [f"{_PERIOD_DIMENSIONS[name]} AS {name}" for name in by]
+    where, params = _expense_filters(start_date, end_date, date_column="r.day")
+    query = f'''
+    SELECT {_period_start_sql(grain)} AS period_start, {"".join(c + ", " for c in columns)}
+           SUM(r.expense_count) AS expense_count, SUM(r.total_amount) AS total_amount
+    FROM {{schema}}.expense_daily_rollup r
+    JOIN categories c1 ON r.category_id = c1.id
+    LEFT JOIN categories c2 ON r.subcategory_id = c2.id
+    WHERE {where}
+    GROUP BY {", ".join(keys)}
+    '''
+    with get_connection() as conn:
+        frames = _read_partitions(conn, query, params, start_date, end_date)
+    df = pd.concat(frames, ignore_index=True)
+    if len(frames) > 1:
+        df = df.groupby(keys, as_index=False)[["expense_count", "total_amount"]].sum()
+
+    # Every period of the range for every group, so gaps count as zero
+    if start_date and end_date:
+        first, last = pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()
+    elif not df.empty:
+        first, last = (pd.Timestamp(df["period_start"].min()).date(),
+                       pd.Timestamp(df["period_start"].max()).date())
+    else:
+        first = last = None
+    starts = period_starts(first, last, grain) if first else []
+    grid = pd.DataFrame({"period_start": [start.isoformat() for start in starts]})
+    if by:
+        grid = grid.merge(df[by].drop_duplicates(), how="cross")
+    df = grid.merge(df, on=keys, how="left")
+    df[["expense_count", "total_amount"]] = (df[["expense_count", "total_amount"]]
+                                             .fillna(0).astype(np.int64))
+    df = df.sort_values(by + ["period_start"], ignore_index=True)
+
+    # Deltas in minor units, converted to SAR once at the end
+    previous = df.groupby(by)["total_amount"].shift() if by else df["total_amount"].shift()
+    df["previous_total"] = previous
+    df["delta"] = df["total_amount"] - previous
+    df["pct_change"] = df["delta"] / previous.where(previous != 0) * 100
+    for col in ("total_amount", "previous_total", "delta"):
+        df[col] = df[col] / MONEY_SCALE
+    labels = {start.isoformat(): period_label(start, grain) for start in starts}
+    df.insert(0, "period", df["period_start"].map(labels))
     return df
 
+# Pivot dimensions as SQL label expressions over the daily rollup. Period
+# labels (2025-03 D2, 2025-03, 2025-Q1) sort in calendar order as text.
+PIVOT_DIMENSIONS = {
+    "category": "c1.name",
+    "subcategory": "IFNULL(c2.name, '')",
+    "entered_by": "r.entered_by",
+    "dekad": ("substr(r.day, 1, 7) || ' D' || "
+              "MIN((CAST(substr(r.day, 9, 2) AS INTEGER) - 1) / 10 + 1, 3)"),
+    "month": "substr(r.day, 1, 7)",
+    "quarter": "substr(r.day, 1, 4) || '-Q' || ((CAST(substr(r.day, 6, 2) AS INTEGER) + 2) / 3)",
+}
+PIVOT_VALUES = ("total_amount", "expense_count")
+PIVOT_TOTAL = "TOTAL"
+
+def _pivot_query(rows, columns, value, where):
+    """One statement computing every ROLLUP grouping set of rows, by columns and overall.
+
+    The filtered rollup is grouped once into a materialized CTE at the finest
+    level; each grouping set then re-aggregates that small result. Rolled-up
+    dimensions read TOTAL (the first one) or '' (the rest), and the pivot
+    column is the column labels joined with " / ", or TOTAL.
+    """
+    names = [f"d{i}" for i in range(len(rows) + len(columns))]
+    row_names, column_names = names[:len(rows)], names[len(rows):]
+    dims = [PIVOT_DIMENSIONS[dim] for dim in list(rows) + list(columns)]
+    column_label = " || ' / ' || ".join(column_names) if columns else None
+
+    selects = []
+    for depth in range(len(rows), -1, -1):
+        labels = row_names[:depth] + [f"'{PIVOT_TOTAL}'"] + ["''"] * len(rows)
+        labels = [f"{label} AS {name}" for label, name in zip(labels, row_names)]
+        for pivot in ([column_label] if columns else []) + [f"'{PIVOT_TOTAL}'"]:
+            group = row_names[:depth] + (column_names if pivot == column_label else [])
+            selects.append(
+                f"SELECT {', '.join(labels + [pivot + ' AS pivot_column'])}, "
+                f"SUM(value) AS value FROM base"
+                + (f" GROUP BY {', '.join(group)}" if group else "")
+            )
+    return f'''
+    WITH base AS MATERIALIZED (
+        SELECT {", ".join(f"{dim} AS {name}" for dim, name in zip(dims, names))},
+               SUM(r.{value}) AS value
+        FROM {{schema}}.expense_daily_rollup r
+        JOIN categories c1 ON r.category_id = c1.id
+        LEFT JOIN categories c2 ON r.subcategory_id = c2.id
+        WHERE {where}
+        GROUP BY {", ".join(names)}
+    )
+    {" UNION ALL ".join(selects)}
+    ''', row_names
+
+def pivot_expenses(rows=("category",), columns=(), values="total_amount", filters=None):
+    """Pivot expense totals with ROLLUP-style subtotals, in one query.
+
+    rows and columns are tuples of PIVOT_DIMENSIONS names; values is
+    "total_amount" (SAR) or "expense_count". filters may hold start_date,
+    end_date and entered_by. Rows are nested in the order given, with a
+    TOTAL subtotal row after each group and a grand TOTAL row last; the
+    TOTAL column holds each row's total across the pivot columns.
+    """
+    filters = filters or {}
+    unknown = set(filters) - {"start_date", "end_date", "entered_by"}
+    if unknown:
+        raise ValueError(f"Unknown pivot filters: {', '.join(sorted(unknown))}")
+    return _pivot_expenses(tuple(rows), tuple(columns), values, filters.get("start_date"),
+                           filters.get("end_date"), filters.get("entered_by"))
+
+@cached_query
+def _pivot_expenses(rows, columns, values, start_date, end_date, entered_by):
+    if not rows:
+        raise ValueError("A pivot needs at least one row dimension")
+    unknown = set(rows + columns) - set(PIVOT_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown pivot dimensions: {', '.join(sorted(unknown))}")
+    if len(set(rows + columns)) < len(rows + columns):
+        raise ValueError("A pivot dimension can only be used once")
+    if values not in PIVOT_VALUES:
+        raise ValueError(f"Unknown pivot value: {values}")
+
+    where, params = _expense_filters(start_date, end_date, entered_by,
+                                     date_column="r.day", user_column="r.entered_by")
+    query, row_names = _pivot_query(rows, columns, values, where)
+    with get_connection() as conn:
+        frames = _read_partitions(conn, query, params, start_date, end_date)
+    df = pd.concat(frames, ignore_index=True)
+    if len(frames) > 1:
+        df = df.groupby(row_names + ["pivot_column"], as_index=False)["value"].sum()
+    if df.empty or df["value"].isna().all():
+        # Only the empty grand total row came back
+        return pd.DataFrame(columns=list(rows) + [PIVOT_TOTAL])
+
+    pivot = df.pivot(index=row_names, columns="pivot_column", values="value")
+    labels = sorted(label for label in pivot.columns if label != PIVOT_TOTAL)
+    pivot = pivot[labels + [PIVOT_TOTAL]].fillna(0).astype(np.int64)
+    if values == "total_amount":
+        pivot = pivot / MONEY_SCALE
+
+    # Subtotal rows after their group: order each level with TOTAL last
+    pivot = pivot.reset_index()
+    order = pd.DataFrame({name: pivot[name].eq(PIVOT_TOTAL).astype(str) + pivot[name].astype(str)
+                          for name in row_names})
+    pivot = pivot.loc[order.sort_values(row_names).index].reset_index(drop=True)
+    pivot.columns.name = None
+    return pivot.rename(columns=dict(zip(row_names, rows)))
+
+SearchResult = namedtuple("SearchResult", ["rows", "total"])
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+@cached_query
+def search_expenses(query, start_date=None, end_date=None, entered_by=None,
+                    limit=EXPENSE_PAGE_SIZE, offset=0):
+    """Full-text search over expense descriptions and category names.
+
+    Results are ranked by bm25 (best first) and paginated with limit/offset;
+    total is the number of matches across all pages. Only live expenses are
+    indexed; archived months are not searched.
+    """
+    match = _fts_query(query)
+    if not match:
+        return SearchResult(pd.DataFrame(columns=_EXPENSE_COLUMN_NAMES + ["rank"]), 0)
+
+    where, params = _expense_filters(start_date, end_date, entered_by)
+    search_sql = f'''FROM expense_search s
+                     JOIN main.expenses e ON e.id = s.rowid
+                     LEFT JOIN categories c1 ON e.category_id = c1.id
+                     LEFT JOIN categories c2 ON e.subcategory_id = c2.id
+                     LEFT JOIN categories c3 ON e.subsubcategory_id = c3.id
+                     WHERE expense_search MATCH ? AND {where}'''
+    with get_connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) {search_sql}", [match] + params).fetchone()[0]
+        df = pd.read_sql(f"SELECT {_EXPENSE_COLUMNS_SQL}, bm25(expense_search) AS rank "
+                         f"{search_sql} ORDER BY rank LIMIT ? OFFSET ?",
+                         conn, params=[match] + params + [limit, offset])
+    return SearchResult(_amounts_to_sar(df), total)
+
+@cached_query
+def get_category_rollup(category_id, start_date=None, end_date=None, entered_by=None):
+    """Totals for a category including all of its descendants, at any depth.
+
+    Returns a dict with expense_count and the three amount sums in SAR.
+    """
+    where, params = _expense_filters(start_date, end_date, entered_by)
+    query = f'''SELECT COUNT(e.id), IFNULL(SUM(e.amount_before_vat), 0),
+                         IFNULL(SUM(e.vat_amount), 0), IFNULL(SUM(e.total_amount), 0)
+                  FROM category_closure cc
+                  JOIN {{schema}}.expenses e ON e.leaf_category_id = cc.descendant_id
+                  WHERE cc.ancestor_id = ? AND {where}'''
+    totals = [0, 0, 0, 0]
+    with get_connection() as conn:
+        for schema in _partitions(conn, start_date, end_date):
+            sums = conn.execute(query.format(schema=schema), [category_id] + params).fetchall()[0]
+            totals = [a + b for a, b in zip(totals, sums)]
+    count, before, vat, total = totals
+    return {
+        "expense_count": count,
+        "amount_before_vat": from_minor_units(before),
+        "vat_amount": from_minor_units(vat),
+        "total_amount": from_minor_units(total),
+    }
+
+@cached_query
+def get_category_drilldown(parent_id=None, start_date=None, end_date=None, entered_by=None):
+    """Subtree totals for each child of parent_id (main categories when None).
+
+    Each row covers the child and everything below it. Expenses booked
+    directly on parent_id itself, with no deeper category, appear as an extra
+    row with id = parent_id and name "(no subcategory)". has_children tells
+    the dashboard whether a row can be expanded further.
+    """
+    where, params = _expense_filters(start_date, end_date, entered_by)
+    query = f'''
+    SELECT c.id, c.name, c.level,
+           EXISTS (SELECT 1 FROM categories k WHERE k.parent_id = c.id) AS has_children,
+           COUNT(e.id) AS expense_count,
+           IFNULL(SUM(e.total_amount), 0) AS total_amount
+    FROM categories c
+    JOIN category_closure cc ON cc.ancestor_id = c.id
+    JOIN {{schema}}.expenses e ON e.leaf_category_id = cc.descendant_id
+    WHERE c.parent_id IS ? AND {where}
+    GROUP BY c.id
+    UNION ALL
+    SELECT ? AS id, '(no subcategory)' AS name, NULL AS level, 0 AS has_children,
+           COUNT(e.id), IFNULL(SUM(e.total_amount), 0)
+    FROM {{schema}}.expenses e
+    WHERE ? IS NOT NULL AND e.leaf_category_id = ? AND {where}
+    HAVING COUNT(e.id) > 0
+    ORDER BY total_amount DESC
+    '''
+    all_params = [parent_id] + params + [parent_id, parent_id, parent_id] + params
+    with get_connection() as conn:
+        frames = _read_partitions(conn, query, all_params, start_date, end_date)
+    df = frames[0]
+    if len(frames) > 1:
+        df = (pd.concat(frames, ignore_index=True)
+              .groupby(['id', 'name', 'level', 'has_children'], dropna=False, as_index=False,
+                       sort=False)[['expense_count', 'total_amount']].sum()
+              .sort_values('total_amount', ascending=False, ignore_index=True))
+    df['has_children'] = df['has_children'].astype(bool)
+    return _amounts_to_sar(df)
+
+@cached_query
 def get_expense_by_id(expense_id):
     """Get complete expense details by ID"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT e.*, 
-                        c1.name as category_name,
-                        c2.name as subcategory_name,
-                        c3.name as subsubcategory_name
-                 FROM expenses e
-                 LEFT JOIN categories c1 ON e.category_id = c1.id
-                 LEFT JOIN categories c2 ON e.subcategory_id = c2.id
-                 LEFT JOIN categories c3 ON e.subsubcategory_id = c3.id
-                 WHERE e.id = ?''', (expense_id,))
-    
-    result = c.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('''SELECT e.id, e.date, e.category_id, e.subcategory_id, e.subsubcategory_id,
+                            e.subsubsubcategory_id, e.description, e.amount_before_vat,
+                            e.vat_amount, e.total_amount, e.entered_by,
+                            c1.name as category_name,
+                            c2.name as subcategory_name,
+                            c3.name as subsubcategory_name
+                     FROM expenses e
+                     LEFT JOIN categories c1 ON e.category_id = c1.id
+                     LEFT JOIN categories c2 ON e.subcategory_id = c2.id
+                     LEFT JOIN categories c3 ON e.subsubcategory_id = c3.id
+                     WHERE e.id = ?''', (expense_id,))
+        result = c.fetchone()
     
     if result:
         columns = ['id', 'date', 'category_id', 'subcategory_id', 'subsubcategory_id',
                   'subsubsubcategory_id', 'description', 'amount_before_vat', 'vat_amount', 
                   'total_amount', 'entered_by', 'category_name', 'subcategory_name', 'subsubcategory_name']
-        return dict(zip(columns, result))
+        expense = dict(zip(columns, result))
+        for col in MONEY_COLUMNS:
+            expense[col] = from_minor_units(expense[col])
+        return expense
     return None
 
+def get_archived_expense_ids(expense_ids):
+    """The ids among expense_ids whose expenses are held in an archive file.
+
+    Archived expenses are read-only: the write functions below raise
+    ValueError for them rather than quietly changing nothing.
+    """
+    ids = {int(expense_id) for expense_id in expense_ids}
+    # One bound JSON array instead of a placeholder per id
+    query = "SELECT id FROM {schema}.expenses WHERE id IN (SELECT value FROM json_each(?))"
+    archived = set()
+    with get_connection() as conn, closing(_partitions(conn)) as partitions:
+        for schema in partitions:
+            if not ids:
+                break
+            found = {row[0] for row in conn.execute(query.format(schema=schema),
+                                                    (json.dumps(sorted(ids)),)).fetchall()}
+            if schema != "main":
+                archived |= found
+            ids -= found
+    return archived
+
+def _reject_archived(expense_ids):
+    archived = get_archived_expense_ids(expense_ids)
+    if archived:
+        raise ValueError(f"Archived expenses are read-only: {', '.join(map(str, sorted(archived)))}")
+
 def update_expense(expense_id, updates):
-    """Update an existing expense with the provided fields"""
-    conn = get_connection()
-    c = conn.cursor()
-    
+    """Update an existing expense with the provided fields.
+
+    A category_path entry (names as accepted by resolve_category_ids)
+    re-categorises the expense and sets all four category levels, so no
+    deeper level is left behind from the old category.
+    """
     try:
+        _reject_archived([expense_id])
         set_clauses = []
         values = []
         
         for field, value in updates.items():
-            if field in ['amount_before_vat', 'vat_amount', 'total_amount']:
-                # Ensure 4-decimal precision for amounts
-                value = round(float(value), 4)
+            if field == 'category_path':
+                category_ids = resolve_category_ids(*value)
+                if category_ids[0] is None:
+                    raise ValueError(f"Unknown category: {value[0]}")
+                set_clauses.append("category_id = ?, subcategory_id = ?, "
+                                   "subsubcategory_id = ?, subsubsubcategory_id = ?")
+                values.extend(category_ids)
+                continue
+            if field in MONEY_COLUMNS:
+                # Amounts are stored as integer ten-thousandths of a SAR
+                value = to_minor_units(value)
+            elif field == 'date':
+                value = _date_param(value)
             set_clauses.append(f"{field} = ?")
             values.append(value)
         
         values.append(expense_id)
         query = f"UPDATE expenses SET {', '.join(set_clauses)} WHERE id = ?"
         
-        c.execute(query, values)
-        conn.commit()
-        print(f"DEBUG: Expense {expense_id} updated successfully")
+        _run_write(lambda conn: conn.execute(query, values))
+        logger.debug("Updated expense %s", expense_id)
         
     except sqlite3.Error as e:
-        print(f"ERROR: Failed to update expense {expense_id} - {str(e)}")
-        conn.rollback()
+        logger.error("Failed to update expense %s: %s", expense_id, e)
         raise
     except ValueError as e:
-        print(f"ERROR: Invalid numeric value in update - {str(e)}")
-        conn.rollback()
+        logger.error("Invalid numeric value in update: %s", e)
         raise
-    finally:
-        conn.close()
 
+def delete_expense(expense_id):
+    """Delete a single expense by ID"""
+    _reject_archived([expense_id])
+    _run_write(lambda conn: conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,)))
+
+def delete_expenses(expense_ids):
+    """Delete many expenses in one transaction; returns the number deleted"""
+    params = [(int(expense_id),) for expense_id in expense_ids]
+    if not params:
+        return 0
+    _reject_archived(expense_ids)
+    return _run_write(
+        lambda conn: conn.executemany("DELETE FROM expenses WHERE id = ?", params).rowcount)
+
+def update_expenses(expense_ids, date=None, category_path=None, vat_rate=None):
+    """Apply one change to many expenses in a single transaction.
+
+    date moves the expenses to a new date, category_path (names as accepted
+    by resolve_category_ids) re-categorises them, and vat_rate recomputes
+    each expense's VAT and total from its amount before VAT, rounding half
+    up to the minor unit like calculate_vat(). Returns the number updated.
+    """
+    set_clauses = []
+    values = []
+    if date is not None:
+        set_clauses.append("date = ?")
+        values.append(_date_param(date))
+    if category_path is not None:
+        category_ids = resolve_category_ids(*category_path)
+        if category_ids[0] is None:
+            raise ValueError(f"Unknown category: {category_path[0]}")
+        set_clauses.append("category_id = ?, subcategory_id = ?, "
+                           "subsubcategory_id = ?, subsubsubcategory_id = ?")
+        values.extend(category_ids)
+    if vat_rate is not None:
+        # vat = before * rate, with the rate itself in minor units so the
+        # product stays an exact integer until the final rounding
+        vat_sql = f"CAST(ROUND(amount_before_vat * ? / {float(MONEY_SCALE)}) AS INTEGER)"
+        rate_units = to_minor_units(vat_rate)
+        set_clauses.append(f"vat_amount = {vat_sql}, total_amount = amount_before_vat + {vat_sql}")
+        values.extend([rate_units, rate_units])
+
+    params = [(*values, int(expense_id)) for expense_id in expense_ids]
+    if not set_clauses or not params:
+        return 0
+    _reject_archived(expense_ids)
+    query = f"UPDATE expenses SET {', '.join(set_clauses)} WHERE id = ?"
+    return _run_write(lambda conn: conn.executemany(query, params).rowcount)
+
+def update_expense_fields(changes):
+    """Write per-row edits in one transaction.
+
+    changes is a DataFrame with an id column plus the edited columns; only
+    cells that are set (not NaN) are written. Returns the number of rows
+    touched.
+    """
+    _reject_archived(changes["id"])
+    updates = []
+    changed_ids = set()
+    for field in changes.columns.drop("id"):
+        edited = changes.loc[changes[field].notna(), ["id", field]]
+        if edited.empty:
+            continue
+        ids = edited["id"].astype(int).tolist()
+        if field in MONEY_COLUMNS:
+            values = to_minor_units_array(edited[field]).tolist()
+        elif field == "date":
+            values = [_date_param(value) for value in edited[field]]
+        else:
+            values = edited[field].tolist()
+        updates.append((f"UPDATE expenses SET {field} = ? WHERE id = ?", list(zip(values, ids))))
+        changed_ids.update(ids)
+
+    def apply(conn):
+        for query, params in updates:
+            conn.executemany(query, params)
+    if updates:
+        _run_write(apply)
+    return len(changed_ids)
+
+@cached_query
 def get_all_expenses():
-    conn = get_connection()
-    query = '''SELECT e.id, e.date, 
-                      c1.name as category, 
-                      c2.name as subcategory, 
-                      c3.name as subsubcategory,
-                      e.description,
-                      e.amount_before_vat,
-                      e.vat_amount,
-                      e.total_amount,
-                      e.entered_by
-               FROM expenses e
-               LEFT JOIN categories c1 ON e.category_id = c1.id
-               LEFT JOIN categories c2 ON e.subcategory_id = c2.id
-               LEFT JOIN categories c3 ON e.subsubcategory_id = c3.id
-               ORDER BY e.date DESC'''
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    return _read_expenses()
+
+def iter_all_expenses(chunksize=5000):
+    """Yield all expenses as DataFrame chunks, newest first, for streaming consumers"""
+    return iter_expenses(chunksize=chunksize)
+
+def write_all_expenses_pdf(sink):
+    """Stream a PDF of every expense to a binary file-like sink"""
+    from pdf_generator import write_table_report
+    return write_table_report(iter_all_expenses(), "All Expense Records", sink)
 
 def get_all_expenses_pdf():
     """Get all expenses and return as PDF bytes"""
-    from pdf_generator import generate_pdf_report
-    df = get_all_expenses()
-    return generate_pdf_report(df, "All Expense Records")
+    buffer = io.BytesIO()
+    write_all_expenses_pdf(buffer)
+    return buffer.getvalue()
 
 def get_category_name(category_id):
     """Get category name from ID"""
     if category_id is None:
         return None
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT name FROM categories WHERE id = ?", (category_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
+    return get_category_index().name_of(category_id)
 
-def get_connection():
-    """Get a database connection"""
-    return sqlite3.connect(DB_PATH)
-
-# Initialize database if missing (with verification)
-if not DB_PATH.exists():
-    print(f"Initializing new database at {DB_PATH}")
-    initialize_database()
-else:
-    print(f"Using existing database at {DB_PATH}")
\ No newline at end of file
+def get_diagnostics():
+    """Instrumentation metrics and slow-query log, plus pool, writer and cache counters"""
+    data = instrumentation.snapshot()
+    data["pool"] = get_pool_stats()
+    data["writer"] = get_writer_stats()
+    data["snapshot"] = get_snapshot_status()
+    data["query_cache"] = get_cache_stats()
+    return data
+
+# Plumbing called from inside other database functions; timing it on its
+# own would only add noise
+_NOT_INSTRUMENTED = {
+    "cached_query", "get_pool", "get_connection", "get_pool_stats", "use_database",
+    "get_data_version", "get_cache_stats", "get_writer", "get_writer_stats",
+    "clear_query_cache", "get_schema_version", "get_category_index",
+    "invalidate_category_index", "archive_dir", "get_diagnostics",
+    "ensure_database", "snapshot_path", "use_snapshot", "start_snapshot_schedule",
+}
+
+def _instrument_public_functions():
+    """Record calls, latency, rows and errors for every public function here"""
+    module = globals()
+    for name, value in list(module.items()):
+        if (inspect.isfunction(value) and value.__module__ == __name__
+                and not name.startswith("_") and name not in _NOT_INSTRUMENTED):
+            module[name] = instrumentation.instrumented(value)
+
+_instrument_public_functions()
@@ -0,0 +1,322 @@
+"""Timing metrics and a slow-query log for the database layer.
+
+database.py wraps its public functions with instrumented() and opens its
+connections with InstrumentedConnection, so every call and every SQL
+statement is measured. Metrics are kept in memory per process; read them
+with snapshot().
+"""
+import functools
+import inspect
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("EXPENSE_TRACKER_SLOW_QUERY_MS", 250))
+SLOW_LOG_SIZE = 100
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    """Call latencies counted into fixed buckets, plus running totals"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms, rows=None, error=False):
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.calls += 1
+        self.errors += bool(error)
+        self.rows += rows or 0
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        if not self.calls:
+            return 0.0
+        target = fraction * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(float(bound), self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": dict(zip(labels, self.counts)),
+        }
+
+class MetricsRegistry:
+    """Thread-safe histograms by name and a bounded log of slow statements"""
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_log_size=SLOW_LOG_SIZE):
+        self.slow_query_ms = slow_query_ms
+        self._histograms = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+
+    def record(self, name, seconds, rows=None, error=False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(seconds * 1000, rows, error)
+
+    def record_slow(self, entry):
+        with self._lock:
+            self._slow.append(entry)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = {name: h.summary() for name, h in sorted(self._histograms.items())}
+            slow = list(self._slow)
+        return {
+            "since": self.started_at.isoformat(timespec="seconds"),
+            "slow_query_ms": self.slow_query_ms,
+            "metrics": metrics,
+            "slow_queries": slow[::-1],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._slow.clear()
+            self.started_at = datetime.now()
+
+registry = MetricsRegistry()
+
+def record(name, seconds, rows=None, error=False):
+    registry.record(name, seconds, rows, error)
+
+def snapshot():
+    """Current metrics and slow-query log as plain data"""
+    return registry.snapshot()
+
+def reset():
+    registry.reset()
+
+def set_slow_query_threshold(ms):
+    registry.slow_query_ms = float(ms)
+
+def count_rows(result):
+    """Best-effort row count of a database function's return value"""
+    if hasattr(result, "shape"):
+        return len(result)
+    rows = getattr(result, "rows", None)  # ExpensePage, SearchResult
+    if rows is not None and hasattr(rows, "__len__"):
+        return len(rows)
+    inserted = getattr(result, "inserted", None)  # BulkResult
+    if isinstance(inserted, int):
+        return inserted
+    if isinstance(result, list):
+        return len(result)
+    return None
+
+def instrumented(func, name=None):
+    """Wrap func so each call records latency, rows returned and errors.
+
+    Generator functions are timed only while they run, not while the
+    consumer works between chunks.
+    """
+    name = name or func.__name__
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            elapsed = 0.0
+            rows = 0
+            error = False
+            chunks = func(*args, **kwargs)
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        elapsed += time.perf_counter() - started
+                        break
+                    except BaseException:
+                        elapsed += time.perf_counter() - started
+                        error = True
+                        raise
+                    elapsed += time.perf_counter() - started
+                    rows += count_rows(chunk) or 0
+                    yield chunk
+            finally:
+                chunks.close()
+                record(name, elapsed, rows, error)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            record(name, time.perf_counter() - started, error=True)
+            raise
+        record(name, time.perf_counter() - started, count_rows(result))
+        return result
+    return wrapper
+
+def _format_plan(rows):
+    """EXPLAIN QUERY PLAN rows as an indented tree"""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+def _explain(connection, sql, parameters):
+    # A plain cursor, so the EXPLAIN itself is not measured
+    try:
+        cursor = sqlite3.Cursor(connection)
+        if isinstance(parameters, (list, tuple, dict)):
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        else:
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        return _format_plan(rows)
+    except sqlite3.Error as e:
+        return f"(plan unavailable: {e})"
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement from execute until its rows are read.
+
+    Only time spent inside SQLite calls counts, not the caller's work between
+    fetches. Statements slower than the registry threshold are added to the
+    slow-query log with their plan.
+    """
+
+    _statement = None
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is None:
+            return
+        sql, parameters, seconds, rows, many = statement
+        record("sql.executemany" if many else "sql.execute", seconds, rows)
+        ms = seconds * 1000
+        if ms >= registry.slow_query_ms:
+            text = re.sub(r"\s+", " ", sql).strip()
+            plan = "(executemany)" if many else _explain(self.connection, sql, parameters)
+            registry.record_slow({
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "ms": round(ms, 3),
+                "rows": rows,
+                "sql": text,
+                "params": repr(parameters)[:500],
+                "plan": plan,
+            })
+            logger.warning("Slow query (%.1f ms, %d rows): %s", ms, rows, text[:200])
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._statement is not None:
+                self._statement[2] += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._statement = [sql, parameters, time.perf_counter() - started, 0, False]
+        if self.description is None:
+            # Not a query: the statement has already run to completion
+            self._statement[3] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._statement = [sql, None, time.perf_counter() - started, max(self.rowcount, 0), True]
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._statement is not None:
+            self._statement[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, size or self.arraysize)
+        if self._statement is not None:
+            self._statement[3] += len(rows)
+            if not rows or len(rows) < (size or self.arraysize):
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._statement is not None:
+            self._statement[3] += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._statement is not None:
+            self._statement[3] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Statements abandoned before their last row (fetchone on an aggregate)
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including execute() shortcuts, are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
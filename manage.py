@@ -0,0 +1,146 @@
+"""Maintenance commands for the expense tracker database.
+
+Usage:
+    python manage.py migrate
+    python manage.py rollup verify
+    python manage.py rollup rebuild
+    python manage.py archive list
+    python manage.py archive month 2025-01
+    python manage.py archive before 2025-06
+    python manage.py changes status
+    python manage.py changes export --since 0 --format jsonl --output changes.jsonl
+    python manage.py changes prune --through 1200
+    python manage.py snapshot status
+    python manage.py snapshot refresh
+"""
+import argparse
+import logging
+import sys
+
+import database
+
+def cmd_migrate(args):
+    database.initialize_database()
+    with database.get_connection() as conn:
+        print(f"Schema version: {database.get_schema_version(conn)}")
+    return 0
+
+def cmd_rollup(args):
+    if args.action == "rebuild":
+        database.rebuild_rollup()
+        print("Rollup rebuilt from expenses")
+        return 0
+
+    mismatches = database.verify_rollup()
+    if mismatches.empty:
+        print("Rollup is consistent with expenses")
+        return 0
+    print(f"Rollup has {len(mismatches)} mismatched keys:")
+    print(mismatches.to_string(index=False))
+    return 1
+
+def cmd_archive(args):
+    if args.action == "list":
+        archived = database.get_archived_months()
+        pending = database.get_archivable_months()
+        print("Archived months:" if not archived.empty else "No archived months")
+        if not archived.empty:
+            print(archived.to_string(index=False))
+        print("Closed months still live:" if not pending.empty else "No closed months left to archive")
+        if not pending.empty:
+            print(pending.to_string(index=False))
+        return 0
+
+    if not args.month:
+        print("A month (YYYY-MM) is required")
+        return 2
+    if args.action == "month":
+        months = [args.month]
+    else:
+        pending = database.get_archivable_months()
+        months = pending.loc[pending["month"] < args.month, "month"].tolist()
+    for month in months:
+        database.archive_month(month)
+    print(f"Archived {len(months)} months")
+    return 0
+
+def cmd_changes(args):
+    if args.action == "status":
+        print(f"Latest change: {database.get_change_watermark()}")
+        return 0
+
+    if args.action == "prune":
+        if args.through is None:
+            print("--through SEQ is required")
+            return 2
+        print(f"Pruned {database.prune_changes(args.through)} changes")
+        return 0
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as sink:
+            result = database.export_changes(args.since, sink, args.format)
+    else:
+        result = database.export_changes(args.since, sys.stdout, args.format)
+    # Progress goes to stderr so stdout can be piped into the consumer
+    print(f"Exported {result.changes} changes; next export: --since {result.last_seq}",
+          file=sys.stderr)
+    return 0
+
+def cmd_snapshot(args):
+    if args.action == "refresh":
+        status = database.refresh_snapshot()
+        refresh = status["last_refresh"]
+        print(f"Snapshot refreshed: {refresh['pages']} pages in {refresh['seconds']}s "
+              f"({refresh['restarts']} restarts)")
+        return 0
+
+    status = database.get_snapshot_status()
+    if not status["exists"]:
+        print(f"No snapshot at {status['path']}")
+        return 1
+    state = "behind the live data" if status["behind"] else "up to date"
+    print(f"Snapshot taken {status['taken_at']} ({status['age_seconds']:.0f}s ago), {state}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="Create or upgrade the database schema")
+
+    rollup = commands.add_parser("rollup", help="Check or rebuild the daily expense rollup")
+    rollup.add_argument("action", choices=["verify", "rebuild"])
+
+    archive = commands.add_parser("archive", help="Move closed months to read-only archive files")
+    archive.add_argument("action", choices=["list", "month", "before"])
+    archive.add_argument("month", nargs="?", help="YYYY-MM: the month to archive, or archive "
+                                                  "every closed month before it")
+
+    changes = commands.add_parser("changes", help="Export or prune the expense change log")
+    changes.add_argument("action", choices=["status", "export", "prune"])
+    changes.add_argument("--since", type=int, default=0,
+                         help="Export changes after this sequence number")
+    changes.add_argument("--format", choices=database.CHANGE_FORMATS, default="jsonl")
+    changes.add_argument("--output", help="File to write (default: stdout)")
+    changes.add_argument("--through", type=int,
+                         help="Prune changes up to and including this sequence number")
+
+    snapshot = commands.add_parser("snapshot", help="Refresh or inspect the reporting snapshot")
+    snapshot.add_argument("action", choices=["status", "refresh"])
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command != "migrate":
+        database.ensure_database()
+    handlers = {
+        "migrate": cmd_migrate,
+        "rollup": cmd_rollup,
+        "archive": cmd_archive,
+        "changes": cmd_changes,
+        "snapshot": cmd_snapshot,
+    }
+    return handlers[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,94 +1,301 @@
-from fpdf import FPDF
+import io
+import sqlite3
+import zlib
+
+import numpy as np
 import pandas as pd
+from utils import from_minor_units, to_minor_units_array
+
+# Page geometry (A4, millimetres) matching the FPDF defaults the reports used
+PAGE_WIDTH = 210.0
+PAGE_HEIGHT = 297.0
+MARGIN = 10.0
+CELL_MARGIN = MARGIN / 10
+PAGE_BREAK_AT = PAGE_HEIGHT - 20.0
+MM = 72 / 25.4  # points per millimetre
+
+DEFAULT_CHUNKSIZE = 2000
+
+def _core_font_widths(style):
+    """Glyph widths (1/1000 em) of Helvetica for every Latin-1 character.
+
+    Read from FPDF's own metrics table when it has the one PyFPDF ships,
+    otherwise measured through the public get_string_width API, so a
+    different fpdf release can't break the report layout.
+    """
+    try:
+        from fpdf.fonts import fpdf_charwidths
+        return fpdf_charwidths["helvetica" + style]
+    except (ImportError, KeyError):
+        from fpdf import FPDF
+        pdf = FPDF(unit="pt")
+        # At 1000 pt a width in points is the width in 1/1000 em
+        pdf.set_font("Helvetica", style, 1000)
+        return {chr(code): pdf.get_string_width(chr(code)) for code in range(256)}
+
+FONTS = {
+    # key: (PDF resource name, base font, width table)
+    "regular": ("F1", "Helvetica", _core_font_widths("")),
+    "bold": ("F2", "Helvetica-Bold", _core_font_widths("B")),
+}
+
+EXPENSE_COLUMNS = [
+    # (column, header, width in mm, kind)
+    ("date", "Date", 25, "date"),
+    ("category", "Category", 35, "text"),
+    ("subcategory", "Subcategory", 35, "text"),
+    ("description", "Description", 35, "text"),
+    ("amount_before_vat", "Before VAT", 20, "money"),
+    ("vat_amount", "VAT", 20, "money"),
+    ("total_amount", "Total", 20, "money"),
+]
+
+CATEGORY_COLUMNS = [
+    ("category", "Category", 60, "text"),
+    ("subcategory", "Subcategory", 60, "text"),
+    ("total_amount", "Total Amount", 60, "money"),
+]
+
+def _pdf_text(text):
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").replace("\r", "")
+
+def _text_width(text, style, size):
+    widths = FONTS[style][2]
+    return sum(widths.get(ch, 556) for ch in text) * size / 1000 / MM
+
+def _fit_text(text, width, style, size):
+    """Truncate text so it fits inside a cell of the given width"""
+    room = width - 2 * CELL_MARGIN
+    if _text_width(text, style, size) <= room:
+        return text
+    widths = FONTS[style][2]
+    limit = (room - _text_width("...", style, size)) * MM * 1000 / size
+    used = 0
+    for i, ch in enumerate(text):
+        used += widths.get(ch, 556)
+        if used > limit:
+            return text[:i] + "..."
+    return text
+
+class StreamingPDFWriter:
+    """Write a PDF to a binary sink one page at a time.
+
+    Only object offsets and page references are kept in memory, so the cost
+    of a report grows with its page count on disk rather than in RAM.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self._pos = 0
+        self._offsets = {}
+        self._pages = []
+        self._next_obj = 1
+        self._pages_obj = self._reserve()
+        self._write(b"%PDF-1.3\n%\xe2\xe3\xcf\xd3\n")
+        self._font_objs = {}
+        for name, base, _ in FONTS.values():
+            self._font_objs[name] = self._object(
+                f"<< /Type /Font /BaseFont /{base} /Subtype /Type1 "
+                f"/Encoding /WinAnsiEncoding >>".encode())
+
+    def _write(self, data):
+        self.sink.write(data)
+        self._pos += len(data)
+
+    def _reserve(self):
+        number = self._next_obj
+        self._next_obj += 1
+        return number
+
+    def _object(self, body, number=None):
+        number = number or self._reserve()
+        self._offsets[number] = self._pos
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        return number
+
+    def add_page(self, content):
+        data = zlib.compress(content)
+        stream = self._object(b"<< /Filter /FlateDecode /Length %d >>\nstream\n" % len(data)
+                              + data + b"\nendstream")
+        fonts = " ".join(f"/{name} {obj} 0 R" for name, obj in self._font_objs.items())
+        page = self._object(
+            f"<< /Type /Page /Parent {self._pages_obj} 0 R "
+            f"/MediaBox [0 0 {PAGE_WIDTH * MM:.2f} {PAGE_HEIGHT * MM:.2f}] "
+            f"/Resources << /Font << {fonts} >> >> /Contents {stream} 0 R >>".encode())
+        self._pages.append(page)
+
+    def close(self):
+        kids = " ".join(f"{page} 0 R" for page in self._pages)
+        self._object(f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode(),
+                     number=self._pages_obj)
+        catalog = self._object(f"<< /Type /Catalog /Pages {self._pages_obj} 0 R >>".encode())
+
+        xref_at = self._pos
+        lines = [b"xref\n0 %d\n" % self._next_obj, b"0000000000 65535 f \n"]
+        lines += [b"%010d 00000 n \n" % self._offsets[n] for n in range(1, self._next_obj)]
+        self._write(b"".join(lines))
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (self._next_obj, catalog, xref_at))
+
+class _Page:
+    """Content stream for one page, drawn with FPDF-style cell geometry"""
+
+    def __init__(self):
+        self.ops = [b"0.57 w"]
+        self.y = MARGIN
+        self._font = None
+
+    def set_font(self, style, size):
+        self._font = (style, size)
+        self.ops.append(f"BT /{FONTS[style][0]} {size:.2f} Tf ET".encode())
+
+    def text_width(self, text):
+        return _text_width(text, *self._font)
+
+    def cell(self, x, width, height, text, border=True, align="L", escaped=False):
+        if border:
+            self.ops.append(f"{x * MM:.2f} {(PAGE_HEIGHT - self.y) * MM:.2f} "
+                            f"{width * MM:.2f} {-height * MM:.2f} re S".encode())
+        if text:
+            style, size = self._font
+            if align == "R":
+                dx = width - CELL_MARGIN - self.text_width(text)
+            elif align == "C":
+                dx = (width - self.text_width(text)) / 2
+            else:
+                dx = CELL_MARGIN
+            baseline = self.y + 0.5 * height + 0.3 * size / MM
+            self.ops.append(f"BT /{FONTS[style][0]} {size:.2f} Tf "
+                            f"{(x + dx) * MM:.2f} {(PAGE_HEIGHT - baseline) * MM:.2f} Td "
+                            f"({text if escaped else _pdf_text(text)}) Tj ET".encode("latin-1"))
+
+    def content(self):
+        return b"\n".join(self.ops)
+
+def _iter_chunks(source, chunksize):
+    """Yield DataFrame chunks from a DataFrame, a cursor or an iterable of frames"""
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize]
+    elif isinstance(source, sqlite3.Cursor):
+        names = [d[0] for d in source.description]
+        while True:
+            rows = source.fetchmany(chunksize)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=names)
+    else:
+        for chunk in source:
+            yield chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame(chunk)
+
+def _format_column(chunk, name, kind):
+    """Format a whole column to display strings at once"""
+    if name not in chunk.columns:
+        return np.full(len(chunk), "0.00" if kind == "money" else "", dtype=object)
+    values = chunk[name]
+    if kind == "money":
+        return np.char.mod("%.2f", values.fillna(0).to_numpy(dtype=np.float64))
+    text = values.astype(object).where(values.notna(), "").astype(str)
+    if kind == "date":
+        text = text.str[:10]
+    return text.to_numpy()
+
+def write_table_report(source, title, sink, columns=EXPENSE_COLUMNS, total_column="total_amount",
+                       font_size=8, chunksize=DEFAULT_CHUNKSIZE):
+    """Stream a tabular PDF report to sink.
+
+    source may be a DataFrame, a cursor or an iterable of DataFrame chunks;
+    rows are consumed chunk by chunk, so memory use does not grow with the
+    number of rows. The header row is repeated on every page and a TOTAL of
+    total_column (summed exactly in minor units) closes the report.
+    Returns the number of rows written.
+    """
+    writer = StreamingPDFWriter(sink)
+    widths = [width for _, _, width, _ in columns]
+    row_height = 10
+
+    def header(page):
+        page.set_font("bold", 10)
+        x = MARGIN
+        for (_, label, width, _) in columns:
+            page.cell(x, width, row_height, label)
+            x += width
+        page.y += row_height
+        page.set_font("regular", font_size)
+
+    page = _Page()
+    page.set_font("bold", 16)
+    page.cell(MARGIN, 200, 10, title, border=False, align="C")
+    page.y += 10 + 10
+    header(page)
+
+    total_units = 0
+    row_count = 0
+    for chunk in _iter_chunks(source, chunksize):
+        if chunk.empty:
+            continue
+        # Fit and escape each distinct value once per chunk; categories repeat a lot
+        cells = []
+        for name, _, width, kind in columns:
+            values = pd.Series(_format_column(chunk, name, kind))
+            fitted = {v: _pdf_text(_fit_text(v, width, "regular", font_size))
+                      for v in values.unique()}
+            cells.append(values.map(fitted).to_numpy())
+        if total_column and total_column in chunk.columns:
+            total_units += int(to_minor_units_array(chunk[total_column].fillna(0)).sum())
+        row_count += len(chunk)
+
+        for row in zip(*cells):
+            if page.y + row_height > PAGE_BREAK_AT:
+                writer.add_page(page.content())
+                page = _Page()
+                header(page)
+            x = MARGIN
+            for text, width in zip(row, widths):
+                page.cell(x, width, row_height, text, escaped=True)
+                x += width
+            page.y += row_height
+
+    if total_column and row_count:
+        page.y += 5
+        if page.y + row_height > PAGE_BREAK_AT:
+            writer.add_page(page.content())
+            page = _Page()
+        page.set_font("bold", 10)
+        page.cell(MARGIN, sum(widths[:-1]), row_height, "TOTAL:", border=False, align="R")
+        page.cell(MARGIN + sum(widths[:-1]), widths[-1], row_height,
+                  f"{from_minor_units(total_units):.2f}")
+
+    writer.add_page(page.content())
+    writer.close()
+    return row_count
 
 def generate_pdf_report(df, title):
-    """Generate PDF ensuring all required columns exist"""
-    # Ensure required columns are present
-    required_columns = ['date', 'category', 'subcategory', 'description',
-                       'amount_before_vat', 'vat_amount', 'total_amount']
-    
-    for col in required_columns:
-        if col not in df.columns:
-            df[col] = ""  # Add missing columns with empty values
-    
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    # Title
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(200, 10, txt=title, ln=1, align="C")
-    pdf.ln(10)
-    
-    # Column widths
-    col_widths = [25, 35, 35, 35, 20, 20, 20]
-    
-    # Table header
-    headers = ["Date", "Category", "Subcategory", "Description", 
-               "Before VAT", "VAT", "Total"]
-    pdf.set_font("Arial", 'B', 10)
-    for i, header in enumerate(headers):
-        pdf.cell(col_widths[i], 10, txt=header, border=1)
-    pdf.ln()
-    
-    # Table rows
-    pdf.set_font("Arial", size=8)
-    for _, row in df.iterrows():
-        pdf.cell(col_widths[0], 10, txt=str(row.get('date', ''))[:10], border=1)
-        pdf.cell(col_widths[1], 10, txt=str(row.get('category', '')), border=1)
-        pdf.cell(col_widths[2], 10, txt=str(row.get('subcategory', '')), border=1)
-        pdf.cell(col_widths[3], 10, txt=str(row.get('description', '')), border=1)
-        pdf.cell(col_widths[4], 10, txt=f"{row.get('amount_before_vat', 0):.2f}", border=1)
-        pdf.cell(col_widths[5], 10, txt=f"{row.get('vat_amount', 0):.2f}", border=1)
-        pdf.cell(col_widths[6], 10, txt=f"{row.get('total_amount', 0):.2f}", border=1)
-        pdf.ln()
-    
-    # Add total if applicable
-    if 'total_amount' in df.columns and len(df) > 0:
-        pdf.ln(5)
-        pdf.set_font("Arial", 'B', 10)
-        pdf.cell(sum(col_widths[:-1]), 10, txt="TOTAL:", align='R')
-        pdf.cell(col_widths[-1], 10, txt=f"{df['total_amount'].sum():.2f}", border=1)
-    
-    return pdf.output(dest='S').encode('latin-1')
+    """Generate an expense PDF report and return it as bytes"""
+    buffer = io.BytesIO()
+    write_table_report(df, title, buffer)
+    return buffer.getvalue()
+
+def pivot_columns(pivot, money=True, table_width=PAGE_WIDTH - 2 * MARGIN):
+    """Report columns for a pivot_expenses() frame: label columns get twice the width"""
+    labels = [name for name in pivot.columns if not pd.api.types.is_numeric_dtype(pivot[name])]
+    values = [name for name in pivot.columns if name not in labels]
+    unit = table_width / (2 * len(labels) + len(values))
+    return ([(name, name.replace("_", " ").title(), 2 * unit, "text") for name in labels]
+            + [(name, name, unit, "money" if money else "text") for name in values])
+
+def generate_pivot_pdf_report(pivot, title, money=True):
+    """Generate a PDF report of a pivot; its TOTAL rows and column are kept as is"""
+    columns = pivot_columns(pivot, money)
+    buffer = io.BytesIO()
+    write_table_report(pivot, title, buffer, columns=columns, total_column=None,
+                       font_size=8 if len(columns) <= 8 else 6)
+    return buffer.getvalue()
 
 def generate_category_pdf_report(df, title):
     """Generate a PDF report for category summaries"""
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    # Title
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(200, 10, txt=title, ln=1, align="C")
-    pdf.ln(10)
-    
-    # Column widths
-    col_widths = [60, 60, 60]
-    
-    # Table header
-    headers = ["Category", "Subcategory", "Total Amount"]
-    pdf.set_font("Arial", 'B', 10)
-    for i, header in enumerate(headers):
-        pdf.cell(col_widths[i], 10, txt=header, border=1)
-    pdf.ln()
-    
-    # Table rows
-    pdf.set_font("Arial", size=10)
-    for _, row in df.iterrows():
-        if row['category'] == 'TOTAL':
-            continue
-        pdf.cell(col_widths[0], 10, txt=str(row.get('category', '')), border=1)
-        pdf.cell(col_widths[1], 10, txt=str(row.get('subcategory', '')), border=1)
-        pdf.cell(col_widths[2], 10, txt=f"{row.get('total_amount', 0):.2f}", border=1)
-        pdf.ln()
-    
-    # Add total
-    if 'total_amount' in df.columns and len(df) > 0:
-        total = df[df['category'] == 'TOTAL']['total_amount'].values[0]
-        pdf.ln(5)
-        pdf.set_font("Arial", 'B', 10)
-        pdf.cell(sum(col_widths[:-1]), 10, txt="TOTAL:", align='R')
-        pdf.cell(col_widths[-1], 10, txt=f"{total:.2f}", border=1)
-    
-    return pdf.output(dest='S').encode('latin-1')
\ No newline at end of file
+    rows = df[df['category'] != 'TOTAL'] if 'category' in df.columns else df
+    buffer = io.BytesIO()
+    write_table_report(rows, title, buffer, columns=CATEGORY_COLUMNS, font_size=10)
+    return buffer.getvalue()
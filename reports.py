@@ -0,0 +1,179 @@
+"""On-demand PDF and CSV reports rendered in the background and cached.
+
+Pages call request_report() when the user asks for a download; rendering
+runs on a small thread pool so the script keeps responding, and reads the
+reporting snapshot so long builds never contend with writers. Finished
+reports are cached by (report type, parameters, data version) in a
+byte-bounded LRU store shared by every session.
+"""
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+REPORT_WORKERS = 2
+REPORT_CACHE_BYTES = 64 * 1024 * 1024
+# A report may read a snapshot up to this many seconds behind the live data
+# rather than copying the whole database again after every write
+REPORT_SNAPSHOT_MAX_AGE = 60
+
+def _build_expenses_report(title, start_date=None, end_date=None, entered_by=None):
+    from pdf_generator import write_table_report
+    buffer = io.BytesIO()
+    write_table_report(database.iter_expenses(start_date, end_date, entered_by), title, buffer)
+    return buffer.getvalue()
+
+def _build_expenses_csv(start_date=None, end_date=None, entered_by=None):
+    buffer = io.StringIO()
+    database.write_expenses_csv(buffer, start_date, end_date, entered_by)
+    return buffer.getvalue().encode('utf-8')
+
+def _build_pivot_report(title, rows=("category",), columns=(), values="total_amount",
+                        start_date=None, end_date=None, entered_by=None):
+    from pdf_generator import generate_pivot_pdf_report
+    pivot = database.pivot_expenses(rows, columns, values, {
+        "start_date": start_date, "end_date": end_date, "entered_by": entered_by})
+    return generate_pivot_pdf_report(pivot, title, money=values == "total_amount")
+
+def _build_category_report(title, start_date=None, end_date=None):
+    # Category and subcategory totals with per-category subtotals
+    return _build_pivot_report(title, ("category", "subcategory"),
+                               start_date=start_date, end_date=end_date)
+
+REPORT_BUILDERS = {
+    "expenses": _build_expenses_report,
+    "expenses_csv": _build_expenses_csv,
+    "category_summary": _build_category_report,
+    "pivot": _build_pivot_report,
+}
+
+class ReportStore:
+    """LRU store of rendered reports, bounded by total size in bytes"""
+
+    def __init__(self, max_bytes=REPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._reports = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            data = self._reports.get(key)
+            if data is None:
+                self._stats["misses"] += 1
+                return None
+            self._reports.move_to_end(key)
+            self._stats["hits"] += 1
+            return data
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._reports
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._reports:
+                self._size -= len(self._reports.pop(key))
+            self._reports[key] = data
+            self._size += len(data)
+            # Always keep the newest report, even if it alone exceeds the budget
+            while self._size > self.max_bytes and len(self._reports) > 1:
+                _, evicted = self._reports.popitem(last=False)
+                self._size -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, reports=len(self._reports), bytes=self._size,
+                        max_bytes=self.max_bytes)
+
+_store = ReportStore()
+_jobs = {}
+_jobs_lock = threading.Lock()
+_executor = None
+
+def _get_executor():
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS,
+                                           thread_name_prefix="report")
+        return _executor
+
+def report_key(report_type, **params):
+    """Cache key for a report: type, sorted parameters and current data version"""
+    if report_type not in REPORT_BUILDERS:
+        raise ValueError(f"Unknown report type: {report_type}")
+    return (report_type, tuple(sorted(params.items())), database.get_data_version())
+
+def _render(key, report_type, params):
+    with database.use_snapshot(max_age=REPORT_SNAPSHOT_MAX_AGE):
+        data = REPORT_BUILDERS[report_type](**params)
+    _store.put(key, data)
+    # The store holds the result now; only failed jobs stay in _jobs
+    with _jobs_lock:
+        _jobs.pop(key, None)
+    return key
+
+def _prune_jobs(data_version):
+    """Drop finished jobs for older data versions; their keys can never be requested again.
+
+    Call with _jobs_lock held.
+    """
+    for key in [key for key, job in _jobs.items() if key[2] != data_version and job.done()]:
+        del _jobs[key]
+
+def request_report(report_type, **params):
+    """Start rendering a report unless it is cached or already in progress.
+
+    Returns the report key to poll with report_status() / get_report().
+    """
+    key = report_key(report_type, **params)
+    if key in _store:
+        return key
+    executor = _get_executor()
+    with _jobs_lock:
+        _prune_jobs(key[2])
+        job = _jobs.get(key)
+        if job is None or (job.done() and job.exception() is not None):
+            _jobs[key] = executor.submit(_render, key, report_type, params)
+    return key
+
+def report_status(key):
+    """One of 'ready', 'running', 'failed' or 'missing'"""
+    if key in _store:
+        return "ready"
+    with _jobs_lock:
+        job = _jobs.get(key)
+    if job is None:
+        return "missing"
+    if not job.done():
+        return "running"
+    if job.exception() is not None:
+        return "failed"
+    # Rendered but already evicted from the store
+    with _jobs_lock:
+        _jobs.pop(key, None)
+    return "missing"
+
+def report_error(key):
+    with _jobs_lock:
+        job = _jobs.get(key)
+    return job.exception() if job is not None and job.done() else None
+
+def get_report(key):
+    """The rendered PDF bytes for key, or None if it is not ready"""
+    data = _store.get(key)
+    if data is not None:
+        with _jobs_lock:
+            _jobs.pop(key, None)
+    return data
+
+def get_report_stats():
+    stats = _store.stats()
+    with _jobs_lock:
+        stats["running"] = sum(1 for job in _jobs.values() if not job.done())
+    return stats
@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh, migrated database file for the test; the module points back afterwards"""
+    previous = database.DB_PATH
+    database.use_database(tmp_path / "expense_tracker.db")
+    database.ensure_database()
+    yield database
+    database.use_database(previous)
@@ -0,0 +1,78 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+
+def save(db, day, description):
+    return db.save_expense(day, "Food", None, None, None, description, 10, 1.5, 11.5, "tester")
+
+
+def test_expense_saved_after_archiving_gets_a_new_id(db):
+    older = save(db, "2025-02-10", "february")
+    archived = [save(db, "2025-03-01", "march"), save(db, "2025-03-02", "march")]
+    watermark = db.get_change_watermark()
+
+    assert db.archive_month("2025-03") == 2
+    new_id = save(db, "2025-04-01", "april")
+    assert new_id > max(archived + [older])
+
+    rows = db.get_expenses(None, custom_dates=(date(2025, 1, 1), date(2025, 12, 31)))
+    assert sorted(rows["id"]) == sorted([older, *archived, new_id])
+
+    changes = pd.concat(db.iter_changes(watermark))
+    assert changes[["op", "id"]].values.tolist() == [["insert", new_id]]
+
+
+def test_upgraded_database_continues_above_archived_ids(db):
+    save(db, "2025-02-10", "february")
+    archived = save(db, "2025-03-01", "march")
+    db.archive_month("2025-03")
+    with db.get_connection() as conn:
+        # As if the archive had been made before ids were AUTOINCREMENT
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'expenses'")
+        conn.execute("DELETE FROM expense_changes")
+        db._migration_autoincrement_ids(conn)
+        conn.commit()
+    assert save(db, "2025-04-01", "april") > archived
+
+
+def test_archived_expenses_are_read_only(db):
+    archived = save(db, "2025-03-01", "march")
+    live = save(db, "2025-04-01", "april")
+    db.archive_month("2025-03")
+    assert db.get_archived_expense_ids([archived, live]) == {archived}
+
+    writes = [
+        lambda: db.delete_expense(archived),
+        lambda: db.delete_expenses([live, archived]),
+        lambda: db.update_expenses([live, archived], vat_rate=0.05),
+        lambda: db.update_expense(archived, {"description": "changed"}),
+        lambda: db.update_expense_fields(pd.DataFrame({"id": [archived],
+                                                       "description": ["changed"]})),
+    ]
+    for write in writes:
+        with pytest.raises(ValueError, match="read-only"):
+            write()
+    assert db.get_expense_by_id(live)["vat_amount"] == 1.5
+    assert db.delete_expenses([live]) == 1
+
+
+def test_archived_rows_are_shown_locked(db):
+    save(db, "2025-03-01", "march")
+    save(db, "2025-04-01", "april")
+    db.archive_month("2025-03")
+
+    def page():
+        import streamlit as st
+        import app
+        st.session_state.current_user = "tester"
+        app.employee_view_page()
+
+    at = AppTest.from_function(page, default_timeout=60).run()
+    assert not at.exception
+    editor, locked = at.dataframe
+    assert "april" in editor.value["description"].tolist()
+    assert locked.value["description"].tolist() == ["march"]
+    assert "select" not in locked.value.columns
@@ -0,0 +1,45 @@
+import database
+
+
+def traced(db, monkeypatch):
+    statements = []
+    open_connection = database._open_connection
+
+    def open_traced(*args):
+        conn = open_connection(*args)
+        conn.set_trace_callback(statements.append)
+        return conn
+    monkeypatch.setattr(database, "_open_connection", open_traced)
+    db.use_database(db.DB_PATH)
+    return statements
+
+
+def category_queries(statements):
+    # Trigger bodies are traced as "-- TRIGGER ..." lines; only count our own statements
+    return [sql for sql in statements
+            if not sql.startswith("--") and ("categories" in sql or "category_generation" in sql)]
+
+
+def test_saving_expenses_makes_no_category_queries(db, monkeypatch):
+    statements = traced(db, monkeypatch)
+    db.get_categories(level=1)
+    assert category_queries(statements)
+
+    statements.clear()
+    for day in range(1, 6):
+        db.resolve_category_ids("Food", "Worker Tea")
+        db.save_expense(f"2025-03-0{day}", "Food", "Worker Tea", None, None,
+                        "tea", 10, 1.5, 11.5, "tester")
+        db.get_categories(level=2, parent_id=db.get_category_id("Food"))
+    assert category_queries(statements) == []
+
+
+def test_category_changes_from_another_process_are_picked_up(db, monkeypatch):
+    assert "Stationery" not in db.get_categories(level=1)
+    with database.sqlite3.connect(db.DB_PATH) as other:
+        other.execute("INSERT INTO categories (name, level) VALUES ('Stationery', 1)")
+    other.close()
+    assert "Stationery" not in db.get_categories(level=1)
+
+    monkeypatch.setattr(database, "CATEGORY_CHECK_INTERVAL", 0)
+    assert "Stationery" in db.get_categories(level=1)
@@ -0,0 +1,59 @@
+import io
+import json
+
+import pandas as pd
+
+
+def save(db, day, description):
+    return db.save_expense(day, "Food", None, None, None, description, 10, 1.5, 11.5, "tester")
+
+
+def changes_since(db, seq):
+    chunks = list(db.iter_changes(seq))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=["op", "id"])
+
+
+def test_writes_are_logged_in_order(db):
+    watermark = db.get_change_watermark()
+    expense_id = save(db, "2025-03-01", "tea")
+    db.update_expense(expense_id, {"description": "green tea"})
+    db.delete_expense(expense_id)
+
+    changes = changes_since(db, watermark)
+    assert changes[["op", "id"]].values.tolist() == [
+        ["insert", expense_id], ["update", expense_id], ["delete", expense_id]]
+    assert changes["description"].tolist() == ["tea", "green tea", "green tea"]
+    assert changes["category"].tolist() == ["Food"] * 3
+
+    sink = io.StringIO()
+    exported = db.export_changes(watermark, sink)
+    assert exported == (3, db.get_change_watermark())
+    assert [json.loads(line)["op"] for line in sink.getvalue().splitlines()] == [
+        "insert", "update", "delete"]
+
+
+def test_archiving_is_not_logged_as_deletes(db):
+    save(db, "2025-03-01", "march")
+    watermark = db.get_change_watermark()
+    assert db.archive_month("2025-03") == 1
+    assert changes_since(db, watermark).empty
+
+    with db.get_connection() as conn:
+        capture = conn.execute(
+            "SELECT value FROM db_meta WHERE key = 'capture_changes'").fetchone()[0]
+    assert capture == 1
+    april = save(db, "2025-04-01", "april")
+    assert changes_since(db, watermark)[["op", "id"]].values.tolist() == [["insert", april]]
+
+
+def test_pruned_changes_are_gone_and_seq_is_not_reused(db):
+    save(db, "2025-03-01", "first")
+    save(db, "2025-03-02", "second")
+    through = db.get_change_watermark()
+    assert db.prune_changes(through) == 2
+    assert changes_since(db, 0).empty
+
+    third = save(db, "2025-03-03", "third")
+    changes = changes_since(db, 0)
+    assert changes[["op", "id"]].values.tolist() == [["insert", third]]
+    assert changes["seq"].iloc[0] > through
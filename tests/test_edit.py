@@ -0,0 +1,48 @@
+from datetime import date
+
+PICKUP = ("Fuel", "Diesel", "Pickup", "9431 - Pickup")
+
+
+def summary_categories(db):
+    summary = db.get_category_summary(date(2025, 3, 1), date(2025, 3, 31))
+    return set(summary.loc[summary["category"] != "TOTAL", "category"])
+
+
+def drilldown_names(db):
+    drilldown = db.get_category_drilldown(None, date(2025, 3, 1), date(2025, 3, 31))
+    return set(drilldown.loc[drilldown["expense_count"] > 0, "name"])
+
+
+def test_edit_to_a_shallower_category_clears_the_deeper_levels(db):
+    expense_id = db.save_expense("2025-03-01", *PICKUP, "diesel", 100, 15, 115, "tester")
+    db.update_expense(expense_id, {"category_path": ("Food", "Worker Tea", None)})
+
+    expense = db.get_expense_by_id(expense_id)
+    assert expense["category_name"] == "Food"
+    assert expense["subcategory_name"] == "Worker Tea"
+    assert expense["subsubcategory_id"] is None and expense["subsubsubcategory_id"] is None
+    assert summary_categories(db) == drilldown_names(db) == {"Food"}
+
+
+def test_edit_to_a_deeper_category_sets_every_level(db):
+    expense_id = db.save_expense("2025-03-01", "Food", "Worker Tea", None, None,
+                                 "tea", 10, 1.5, 11.5, "tester")
+    db.update_expense(expense_id, {"category_path": PICKUP, "description": "diesel"})
+
+    expense = db.get_expense_by_id(expense_id)
+    assert db.get_category_name(expense["subsubsubcategory_id"]) == PICKUP[3]
+    assert summary_categories(db) == drilldown_names(db) == {"Fuel"}
+
+
+def test_migration_clears_fourth_levels_left_by_old_edits(db):
+    stale = db.save_expense("2025-03-01", *PICKUP, "diesel", 100, 15, 115, "tester")
+    kept = db.save_expense("2025-03-02", *PICKUP, "diesel", 100, 15, 115, "tester")
+    food, tea, _, _ = db.resolve_category_ids("Food", "Worker Tea")
+    with db.get_connection() as conn:
+        # What the edit form used to write: three levels, the fourth untouched
+        conn.execute("UPDATE expenses SET category_id = ?, subcategory_id = ?, "
+                     "subsubcategory_id = NULL WHERE id = ?", (food, tea, stale))
+        db._migration_stale_leaf_categories(conn)
+        conn.commit()
+    assert db.get_expense_by_id(stale)["subsubsubcategory_id"] is None
+    assert db.get_expense_by_id(kept)["subsubsubcategory_id"] is not None
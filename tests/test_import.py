@@ -0,0 +1,30 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+
+def import_rows(db, dates):
+    return db.save_expenses_bulk(pd.DataFrame({
+        "date": dates,
+        "category": "Food",
+        "description": [f"row {i}" for i in range(len(dates))],
+        "amount_before_vat": 10,
+        "entered_by": "tester",
+    }))
+
+
+def test_iso_text_and_date_cells_are_imported(db):
+    result = import_rows(db, ["2025-03-02", " 2025-03-04 ", "2025-03-05 10:30:00",
+                              date(2025, 3, 6), datetime(2025, 3, 7, 9, 0)])
+    assert result.inserted == 5 and result.rejected.empty
+    with db.get_connection() as conn:
+        stored = [row[0] for row in conn.execute("SELECT date FROM expenses ORDER BY id")]
+    assert stored == ["2025-03-02", "2025-03-04", "2025-03-05", "2025-03-06", "2025-03-07"]
+
+
+def test_ambiguous_and_invalid_dates_are_rejected_not_guessed(db):
+    result = import_rows(db, ["03/02/2025", "2025-02-30", "", None, "2025-03-02"])
+    assert result.inserted == 1
+    assert result.rejected["reason"].tolist() == [
+        "date must be YYYY-MM-DD", "invalid or missing date",
+        "invalid or missing date", "invalid or missing date"]
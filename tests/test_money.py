@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from utils import MONEY_SCALE, to_minor_units, to_minor_units_array
+
+
+def half_way_amounts():
+    """Amounts exactly half-way between two ten-thousandths, as typed by a user"""
+    units = np.arange(0, 200_000)
+    amounts = [float(f"{u / MONEY_SCALE:.4f}5") for u in units]
+    return amounts + [-a for a in amounts[1:]] + [123456.78905, 0.00015, 1.00005]
+
+
+def test_array_rounding_matches_decimal_rounding_at_half_way_values():
+    amounts = half_way_amounts()
+    expected = [to_minor_units(a) for a in amounts]
+    assert to_minor_units_array(amounts).tolist() == expected
+
+
+def test_array_rounding_matches_decimal_rounding_for_typical_amounts():
+    rng = np.random.default_rng(7)
+    amounts = np.round(rng.lognormal(4, 2, 50_000), int(rng.integers(0, 6)))
+    expected = [to_minor_units(a) for a in amounts]
+    assert to_minor_units_array(pd.Series(amounts)).tolist() == expected
+
+
+def test_bulk_import_stores_the_same_units_as_save_expense(db):
+    amount = 0.00015
+    single = db.save_expense("2025-03-01", "Food", None, None, None, "single",
+                             amount, 0, amount, "tester")
+    db.save_expenses_bulk(pd.DataFrame({
+        "date": ["2025-03-01"], "category": ["Food"], "description": ["bulk"],
+        "amount_before_vat": [amount], "vat_amount": [0], "entered_by": ["tester"],
+    }))
+    with db.get_connection() as conn:
+        stored = dict(conn.execute("SELECT description, amount_before_vat FROM expenses"
+                                   ).fetchall())
+    assert stored["single"] == stored["bulk"] == to_minor_units(amount)
+    assert db.get_expense_by_id(single)["amount_before_vat"] == 0.0002
@@ -0,0 +1,47 @@
+def save(db, day, description, entered_by="tester"):
+    return db.save_expense(day, "Food", None, None, None, description, 10, 1.5, 11.5, entered_by)
+
+
+def walk(db, page_size, **filters):
+    """Every page from newest to oldest, then back again from the oldest"""
+    pages = [db.get_expenses_page(page_size=page_size, **filters)]
+    while pages[-1].next_cursor is not None:
+        pages.append(db.get_expenses_page(after=pages[-1].next_cursor, page_size=page_size,
+                                          **filters))
+    back = [pages[-1]]
+    while back[-1].prev_cursor is not None:
+        back.append(db.get_expenses_page(before=back[-1].prev_cursor, page_size=page_size,
+                                         **filters))
+    return pages, back[::-1]
+
+
+def ids(pages):
+    return [page.rows["id"].tolist() for page in pages]
+
+
+def test_pages_walk_forward_and_back_across_archived_and_live_rows(db):
+    expenses = [(save(db, day, day), day)
+                for day in ["2025-02-03", "2025-02-10", "2025-02-10", "2025-02-20"]]
+    db.archive_month("2025-02")
+    # Entered for the archived month afterwards, so it stays live
+    expenses.append((save(db, "2025-02-10", "late"), "2025-02-10"))
+    expenses += [(save(db, day, day), day) for day in ["2025-03-01", "2025-03-05"]]
+    newest_first = [expense_id for expense_id, day in sorted(expenses, key=lambda e: (e[1], e[0]),
+                                                              reverse=True)]
+
+    forward, back = walk(db, page_size=3)
+    assert ids(forward) == [newest_first[0:3], newest_first[3:6], newest_first[6:]]
+    assert ids(back) == ids(forward)
+    assert forward[0].prev_cursor is None and forward[-1].next_cursor is None
+
+
+def test_pages_follow_the_filters(db):
+    mine = [save(db, f"2025-03-0{day}", "tea") for day in range(1, 6)]
+    theirs = save(db, "2025-03-03", "coffee", entered_by="someone else")
+
+    forward, back = walk(db, page_size=2, entered_by="tester")
+    assert ids(forward) == [mine[4:2:-1], mine[2:0:-1], mine[:1]]
+    assert ids(back) == ids(forward)
+
+    ranged, _ = walk(db, page_size=10, start_date="2025-03-02", end_date="2025-03-03")
+    assert sorted(ranged[0].rows["id"]) == sorted(mine[1:3] + [theirs])
@@ -0,0 +1,20 @@
+import io
+import sys
+
+import pdf_generator
+
+
+def test_font_widths_fall_back_to_fpdf_measurements(monkeypatch):
+    expected = pdf_generator._core_font_widths("B")
+    monkeypatch.setitem(sys.modules, "fpdf.fonts", None)
+    measured = pdf_generator._core_font_widths("B")
+    assert measured == expected
+    assert pdf_generator._core_font_widths("")["W"] > measured["i"]
+
+
+def test_expense_report_is_a_complete_pdf(db):
+    db.save_expense("2025-03-01", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    sink = io.BytesIO()
+    db.write_all_expenses_pdf(sink)
+    data = sink.getvalue()
+    assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
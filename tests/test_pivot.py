@@ -0,0 +1,51 @@
+import pytest
+
+
+@pytest.fixture
+def expenses(db):
+    db.save_expense("2025-03-01", "Food", "Worker Tea", None, None, "a", 10, 1.5, 11.5, "ann")
+    db.save_expense("2025-03-15", "Food", "Worker Water", None, None, "b", 20, 3, 23, "bob")
+    db.save_expense("2025-04-02", "Food", "Worker Tea", None, None, "c", 100, 15, 115, "ann")
+    db.save_expense("2025-04-03", "Fuel", "Diesel", None, None, "d", 40, 6, 46, "bob")
+    return db
+
+
+CATEGORY_BY_MONTH = [
+    ["Food", "Worker Tea", 11.5, 115.0, 126.5],
+    ["Food", "Worker Water", 23.0, 0.0, 23.0],
+    ["Food", "TOTAL", 34.5, 115.0, 149.5],
+    ["Fuel", "Diesel", 0.0, 46.0, 46.0],
+    ["Fuel", "TOTAL", 0.0, 46.0, 46.0],
+    ["TOTAL", "", 34.5, 161.0, 195.5],
+]
+
+
+def test_subtotals_follow_their_group_and_grand_total_is_last(expenses):
+    pivot = expenses.pivot_expenses(("category", "subcategory"), ("month",))
+    assert pivot.columns.tolist() == ["category", "subcategory", "2025-03", "2025-04", "TOTAL"]
+    assert pivot.values.tolist() == CATEGORY_BY_MONTH
+
+
+def test_counts_by_user_and_quarter_with_filters(expenses):
+    pivot = expenses.pivot_expenses(("entered_by",), ("quarter",), "expense_count")
+    assert pivot.values.tolist() == [["ann", 1, 1, 2], ["bob", 1, 1, 2], ["TOTAL", 2, 2, 4]]
+
+    march = expenses.pivot_expenses(("entered_by",), values="expense_count",
+                                    filters={"start_date": "2025-03-01",
+                                             "end_date": "2025-03-31", "entered_by": "ann"})
+    assert march.values.tolist() == [["ann", 1], ["TOTAL", 1]]
+
+
+def test_archived_months_are_included(expenses):
+    expenses.archive_month("2025-03")
+    pivot = expenses.pivot_expenses(("category", "subcategory"), ("month",))
+    assert pivot.values.tolist() == CATEGORY_BY_MONTH
+
+
+def test_bad_arguments_are_rejected(expenses):
+    with pytest.raises(ValueError):
+        expenses.pivot_expenses(("category",), ("category",))
+    with pytest.raises(ValueError):
+        expenses.pivot_expenses(("colour",))
+    with pytest.raises(ValueError):
+        expenses.pivot_expenses(filters={"vendor": "x"})
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+import database
+
+
+def frame(rows):
+    return pd.DataFrame({"total_amount": np.arange(rows, dtype=np.float64)})
+
+
+def test_cache_is_bounded_by_bytes_and_skips_large_results():
+    cache = database.QueryCache(max_bytes=20_000, max_result_bytes=10_000)
+    for key in range(5):
+        cache.put(key, frame(1_000))    # 8 kB each
+    cache.put("large", frame(2_000))    # 16 kB: over the per-result limit
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= 20_000
+    assert stats["evictions"] == 3 and stats["too_large"] == 1
+    assert cache.get("large") is database._MISSING
+    assert cache.get(4) is not database._MISSING
+
+
+def test_cache_hits_do_not_share_edits_with_the_cached_frame(db):
+    db.save_expense("2025-03-01", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    first = db.get_all_expenses()
+    first.insert(0, "select", True)
+    first["total_amount"] = 0.0
+    first.loc[0, "description"] = "changed"
+    second = db.get_all_expenses()
+    assert "select" not in second.columns
+    assert second.loc[0, "total_amount"] == 11.5
+    assert second.loc[0, "description"] == "tea"
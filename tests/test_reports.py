@@ -0,0 +1,60 @@
+import time
+
+import reports
+
+
+def wait_for(key, timeout=30):
+    deadline = time.monotonic() + timeout
+    while reports.report_status(key) == "running" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return reports.report_status(key)
+
+
+def test_finished_and_stale_jobs_are_dropped(db, monkeypatch):
+    db.save_expense("2025-03-01", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    key = reports.request_report("category_summary", title="Summary")
+    assert wait_for(key) == "ready"
+    assert key not in reports._jobs
+
+    def fail(**params):
+        raise RuntimeError("no fonts")
+    monkeypatch.setitem(reports.REPORT_BUILDERS, "pivot", fail)
+    failed = reports.request_report("pivot", title="Pivot")
+    assert wait_for(failed) == "failed"
+    assert failed in reports._jobs
+
+    # A write moves the data version on; the failed job can never be polled again
+    db.save_expense("2025-03-02", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    key = reports.request_report("category_summary", title="Summary")
+    assert failed not in reports._jobs
+    assert wait_for(key) == "ready"
+    assert not reports._jobs
+
+
+def test_expenses_csv_is_built_on_request(db):
+    db.save_expense("2025-03-01", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    db.save_expense("2025-03-01", "Food", None, None, None, "coffee", 20, 3, 23, "someone")
+    key = reports.report_key("expenses_csv", entered_by="tester")
+    assert reports.report_status(key) == "missing"
+    assert reports.request_report("expenses_csv", entered_by="tester") == key
+    assert wait_for(key) == "ready"
+    lines = reports.get_report(key).decode("utf-8").splitlines()
+    assert len(lines) == 2
+    assert "tea" in lines[1]
+
+
+def test_reports_after_a_write_reuse_a_recent_snapshot(db, monkeypatch):
+    db.save_expense("2025-03-01", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    refreshes = []
+    refresh_snapshot = db.refresh_snapshot
+    monkeypatch.setattr(db, "refresh_snapshot", lambda: refreshes.append(1) or refresh_snapshot())
+
+    assert wait_for(reports.request_report("category_summary", title="Reused snapshot")) == "ready"
+    db.save_expense("2025-03-02", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    assert wait_for(reports.request_report("category_summary", title="Reused snapshot")) == "ready"
+    assert len(refreshes) == 1
+
+    monkeypatch.setattr(reports, "REPORT_SNAPSHOT_MAX_AGE", -1)
+    db.save_expense("2025-03-03", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    assert wait_for(reports.request_report("category_summary", title="Reused snapshot")) == "ready"
+    assert len(refreshes) == 2
@@ -0,0 +1,24 @@
+from streamlit.testing.v1 import AppTest
+
+
+def test_punctuation_only_search_gives_an_empty_page_with_columns(db):
+    db.save_expense("2025-03-01", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+    result = db.search_expenses("--")
+    assert result.total == 0
+    assert result.rows.empty
+    assert "id" in result.rows.columns
+
+
+def test_expense_grid_survives_a_search_with_no_words(db):
+    db.save_expense("2025-03-01", "Food", None, None, None, "tea", 10, 1.5, 11.5, "tester")
+
+    def page():
+        import streamlit as st
+        import app
+        st.session_state.current_user = "tester"
+        st.session_state.employee_search = "--"
+        app.employee_view_page()
+
+    at = AppTest.from_function(page, default_timeout=60).run()
+    assert not at.exception
+    assert "No editable expenses on this page." in [c.value for c in at.caption]
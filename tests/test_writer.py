@@ -0,0 +1,32 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+
+
+def test_writer_that_cannot_start_fails_writes_and_restarts(tmp_path, monkeypatch):
+    open_connection = database._open_connection
+    attempts = []
+
+    def flaky_open(path):
+        attempts.append(path)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError("unable to open database file")
+        return open_connection(path)
+    monkeypatch.setattr(database, "_open_connection", flaky_open)
+
+    writer = database.WriteQueue(str(tmp_path / "writer.db"))
+    try:
+        with ThreadPoolExecutor(1) as pool:
+            failed = pool.submit(writer.submit, lambda conn: conn.execute("CREATE TABLE t (x)"))
+            with pytest.raises(sqlite3.OperationalError, match="unable to open"):
+                failed.result(timeout=10)
+            done = pool.submit(writer.submit,
+                               lambda conn: conn.execute("CREATE TABLE t (x)").rowcount)
+            assert done.result(timeout=10) == -1
+        assert len(attempts) == 2
+        assert writer.stats()["failed"] == 1
+    finally:
+        writer.close()
@@ -1,20 +1,97 @@
 from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+
+# Money is stored as integer ten-thousandths of a SAR (4 decimal places)
+MONEY_DECIMALS = 4
+MONEY_SCALE = 10 ** MONEY_DECIMALS
+MONEY_COLUMNS = ['amount_before_vat', 'vat_amount', 'total_amount']
+
+def to_minor_units(amount):
+    """Convert a SAR amount to integer ten-thousandths, rounding half up"""
+    scaled = Decimal(str(amount)) * MONEY_SCALE
+    return int(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_minor_units(units):
+    """Convert integer ten-thousandths back to a SAR amount for display"""
+    return units / MONEY_SCALE
+
+def to_minor_units_array(amounts):
+    """Vectorized to_minor_units for arrays/Series of SAR amounts (int64 result).
+
+    Rounds exactly like to_minor_units. Float scaling only goes wrong next to
+    a half-way point (0.00015 * 10000 is 1.4999...), so those values are
+    rounded half up from their decimal string form instead.
+    """
+    values = np.asarray(amounts, dtype=np.float64)
+    scaled = np.abs(values) * MONEY_SCALE
+    units = np.copysign(np.floor(scaled + 0.5), values).astype(np.int64)
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6 + scaled * 1e-12
+    for i in np.flatnonzero(near_half & np.isfinite(values)):
+        units.flat[i] = to_minor_units(values.flat[i])
+    return units
 
 def calculate_vat(amount_before_vat, vat_rate=0.15):
     """Calculate VAT and total amount based on before VAT amount"""
-    vat_amount = round(amount_before_vat * vat_rate, 2)
-    total_amount = round(amount_before_vat + vat_amount, 2)
+    before_units = to_minor_units(amount_before_vat)
+    vat_units = to_minor_units(Decimal(before_units) * Decimal(str(vat_rate)) / MONEY_SCALE)
+    vat_amount = from_minor_units(vat_units)
+    total_amount = from_minor_units(before_units + vat_units)
     return vat_amount, total_amount
 
-def get_period_dates(period):
-    today = datetime.today().date()
-    if period == "1st-10th":
-        return today.replace(day=1), today.replace(day=10)
-    elif period == "11th-20th":
-        return today.replace(day=11), today.replace(day=20)
-    elif period == "21st-end":
-        start_date = today.replace(day=21)
-        next_month = today.replace(day=28) + timedelta(days=4)
-        end_date = next_month - timedelta(days=next_month.day)
-        return start_date, end_date
-    return None, None
\ No newline at end of file
+# Dekads split each month into the 1st-10th, 11th-20th and 21st-end
+DEKAD_PERIODS = {"1st-10th": (1, 10), "11th-20th": (11, 20), "21st-end": (21, None)}
+PERIOD_GRAINS = ("dekad", "month", "quarter")
+
+def month_end(day):
+    """Last day of the month containing day"""
+    next_month = day.replace(day=28) + timedelta(days=4)
+    return next_month - timedelta(days=next_month.day)
+
+def get_period_dates(period, today=None):
+    """Start and end of a named period of the current month.
+
+    period is one of the DEKAD_PERIODS names or "Current Month"; anything
+    else returns (None, None), meaning no date filter.
+    """
+    today = today or datetime.today().date()
+    if period == "Current Month":
+        return today.replace(day=1), month_end(today)
+    if period in DEKAD_PERIODS:
+        first, last = DEKAD_PERIODS[period]
+        return today.replace(day=first), today.replace(day=last) if last else month_end(today)
+    return None, None
+
+def period_start(day, grain):
+    """First day of the dekad, month or quarter containing day"""
+    if grain == "dekad":
+        return day.replace(day=1 if day.day <= 10 else 11 if day.day <= 20 else 21)
+    if grain == "month":
+        return day.replace(day=1)
+    if grain == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    raise ValueError(f"Unknown period grain: {grain}")
+
+def next_period_start(start, grain):
+    """First day of the period after the one starting on start"""
+    if grain == "dekad" and start.day < 21:
+        return start.replace(day=start.day + 10)
+    month = start.month - 1 + (3 if grain == "quarter" else 1)
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1, day=1)
+
+def period_starts(start_date, end_date, grain):
+    """Start dates of every period of the grain overlapping [start_date, end_date]"""
+    starts = []
+    current = period_start(start_date, grain)
+    while current <= end_date:
+        starts.append(current)
+        current = next_period_start(current, grain)
+    return starts
+
+def period_label(start, grain):
+    """Display label for the period starting on start, e.g. 2025-03 D2, 2025-03, 2025-Q1"""
+    if grain == "dekad":
+        return f"{start:%Y-%m} D{start.day // 10 + 1}"
+    if grain == "quarter":
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    return f"{start:%Y-%m}"